@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from agenda.occupancy import rebuild_occupancy
+from reserve import slot_cache
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the per-day occupancy bitmaps from the Agenda table.
+    Meant for repair after bulk imports or manual edits made outside the ORM.
+    """
+
+    help = "Rebuilds the hairdresser occupancy bitmaps from the agenda"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hairdresser", type=int, action="append", dest="hairdressers",
+            help="Only rebuild this hairdresser (can be repeated)",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            days = rebuild_occupancy(options["hairdressers"])
+            slot_cache.invalidate_all()
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt occupancy for {days} hairdresser-days"))
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.20 on 2026-10-18 13:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_occupancy(apps, schema_editor):
+    from agenda.occupancy import encode, span_masks
+
+    Agenda = apps.get_model('agenda', 'Agenda')
+    DayOccupancy = apps.get_model('agenda', 'DayOccupancy')
+
+    masks = {}
+    for hairdresser_id, start, end in Agenda.objects.values_list('hairdresser_id', 'start_time', 'end_time'):
+        for day, mask in span_masks(start, end):
+            masks[(hairdresser_id, day)] = masks.get((hairdresser_id, day), 0) | mask
+
+    DayOccupancy.objects.bulk_create(
+        DayOccupancy(hairdresser_id=hairdresser_id, date=day, cells=encode(mask))
+        for (hairdresser_id, day), mask in masks.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_profile_picture'),
+        ('agenda', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DayOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('cells', models.BinaryField()),
+                ('hairdresser', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='users.hairdresser')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dayoccupancy',
+            constraint=models.UniqueConstraint(fields=('hairdresser', 'date'), name='unique_hairdresser_day_occupancy'),
+        ),
+        migrations.RunPython(build_occupancy, migrations.RunPython.noop),
+    ]
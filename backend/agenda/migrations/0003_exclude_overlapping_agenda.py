@@ -0,0 +1,79 @@
+# Generated by Django 4.2.20 on 2026-10-18 13:14
+
+import logging
+
+import agenda.models
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations
+from django.db.models import Exists, F, OuterRef
+
+
+logger = logging.getLogger(__name__)
+
+SET_ASIDE_TABLE = 'agenda_agenda_set_aside'
+
+
+def set_aside_overlapping_agenda(apps, schema_editor):
+    """
+    The constraint cannot be added while overlapping entries exist, which the
+    check-then-insert bookings it replaces could create. Of each overlap the
+    first booked entry (lowest id) is kept. The later ones, and the entries
+    ending before they start, are copied as they are to SET_ASIDE_TABLE, then
+    emptied (ended at their start), which no range overlaps. Nothing is
+    deleted: their reservations are left for the salon to reschedule, and the
+    occupancy keeps their cells busy until rebuild_occupancy runs.
+    """
+    Agenda = apps.get_model('agenda', 'Agenda')
+
+    # TSTZRANGE rejects spans ending before they start
+    conflicting = {
+        entry_id: (hairdresser_id, start, end, 'ends before it starts')
+        for entry_id, hairdresser_id, start, end in Agenda.objects.filter(end_time__lt=F('start_time')).values_list(
+            'id', 'hairdresser_id', 'start_time', 'end_time'
+        )
+    }
+
+    spans = Agenda.objects.filter(end_time__gt=F('start_time'))
+    overlapping = spans.filter(Exists(
+        spans.filter(
+            hairdresser=OuterRef('hairdresser'), start_time__lt=OuterRef('end_time'), end_time__gt=OuterRef('start_time'),
+        ).exclude(id=OuterRef('id'))
+    ))
+    kept = {}
+    for entry_id, hairdresser_id, start, end in overlapping.order_by('id').values_list('id', 'hairdresser_id', 'start_time', 'end_time'):
+        if any(kept_start < end and start < kept_end for kept_start, kept_end in kept.get(hairdresser_id, [])):
+            conflicting[entry_id] = (hairdresser_id, start, end, 'overlaps an earlier booking')
+        else:
+            kept.setdefault(hairdresser_id, []).append((start, end))
+    if not conflicting:
+        return
+
+    set_aside_table, agenda_table = schema_editor.quote_name(SET_ASIDE_TABLE), schema_editor.quote_name(Agenda._meta.db_table)
+    # Kept from an earlier run when the migration was reversed and applied again
+    schema_editor.execute(f'CREATE TABLE IF NOT EXISTS {set_aside_table} AS SELECT * FROM {agenda_table} WITH NO DATA')
+    schema_editor.execute(f'INSERT INTO {set_aside_table} SELECT * FROM {agenda_table} WHERE id = ANY(%s)', [sorted(conflicting)])
+    Agenda.objects.filter(id__in=conflicting).update(end_time=F('start_time'))
+
+    for entry_id, (hairdresser_id, start, end, reason) in sorted(conflicting.items()):
+        logger.warning(
+            "Agenda %s of hairdresser %s (%s - %s) %s, emptied and copied to %s",
+            entry_id, hairdresser_id, start, end, reason, SET_ASIDE_TABLE,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0002_dayoccupancy'),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.RunPython(set_aside_overlapping_agenda, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='agenda',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(expressions=[(agenda.models.TsTzRange('start_time', 'end_time', django.contrib.postgres.fields.ranges.RangeBoundary()), '&&'), ('hairdresser', '=')], name='exclude_overlapping_agenda'),
+        ),
+    ]
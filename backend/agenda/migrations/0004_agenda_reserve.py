@@ -0,0 +1,41 @@
+# Generated by Django 4.2.20 on 2026-10-18 13:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def link_reserves(apps, schema_editor):
+    Agenda = apps.get_model('agenda', 'Agenda')
+    Reserve = apps.get_model('reserve', 'Reserve')
+
+    # Reserves used to be matched to agenda items by (service, start_time);
+    # pair them one to one in creation order so duplicates are not shared
+    reserves_by_key = {}
+    for reserve_id, service_id, start_time in Reserve.objects.order_by('id').values_list('id', 'service_id', 'start_time'):
+        reserves_by_key.setdefault((service_id, start_time), []).append(reserve_id)
+
+    agenda_items = []
+    for agenda in Agenda.objects.filter(reserve__isnull=True).order_by('id'):
+        candidates = reserves_by_key.get((agenda.service_id, agenda.start_time))
+        if candidates:
+            agenda.reserve_id = candidates.pop(0)
+            agenda_items.append(agenda)
+
+    Agenda.objects.bulk_update(agenda_items, ['reserve'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reserve', '0003_reserve_end_time'),
+        ('agenda', '0003_exclude_overlapping_agenda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agenda',
+            name='reserve',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='agenda_items', to='reserve.reserve'),
+        ),
+        migrations.RunPython(link_reserves, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,55 @@
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeBoundary, RangeOperators
 from django.db import models
+from django.db.models import Func
 from users.models import Hairdresser
 from django.utils import timezone
 from service.models import Service
 
+# SQLSTATE raised by Postgres when a row violates an exclusion constraint
+EXCLUSION_VIOLATION = '23P01'
+
+class TsTzRange(Func):
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
+
 class Agenda(models.Model):
     start_time = models.DateTimeField(default=timezone.now, null=False, blank=False, unique=False)
     end_time = models.DateTimeField(default=timezone.now, null=False, blank=False, unique=False)
     hairdresser = models.ForeignKey(Hairdresser, on_delete=models.DO_NOTHING,null=False, blank=False)
-    service = models.ForeignKey(Service, on_delete=models.DO_NOTHING,null=False, blank=False)
\ No newline at end of file
+    service = models.ForeignKey(Service, on_delete=models.DO_NOTHING,null=False, blank=False)
+    # Set for slots booked by a customer, empty for entries the hairdresser blocks directly
+    reserve = models.ForeignKey('reserve.Reserve', on_delete=models.CASCADE, null=True, blank=True, related_name='agenda_items')
+
+    class Meta:
+        constraints = [
+            # The database itself rejects two overlapping [start_time, end_time) spans
+            # for the same hairdresser, so concurrent bookings cannot both succeed
+            ExclusionConstraint(
+                name='exclude_overlapping_agenda',
+                expressions=[
+                    (TsTzRange('start_time', 'end_time', RangeBoundary()), RangeOperators.OVERLAPS),
+                    ('hairdresser', RangeOperators.EQUAL),
+                ],
+            ),
+        ]
+
+def is_agenda_overlap_error(error):
+    """
+    Tells whether an IntegrityError was raised by the agenda exclusion constraint.
+    """
+    return getattr(error.__cause__, 'pgcode', None) == EXCLUSION_VIOLATION
+
+class DayOccupancy(models.Model):
+    """
+    Busy cells of a hairdresser's local day, one bit per 5-minute cell
+    (bit 0 is 00:00-00:05). Derived from Agenda by agenda.occupancy.
+    """
+    hairdresser = models.ForeignKey(Hairdresser, on_delete=models.CASCADE, related_name='occupancy')
+    date = models.DateField(null=False, blank=False)
+    cells = models.BinaryField(null=False, blank=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hairdresser', 'date'], name='unique_hairdresser_day_occupancy'),
+        ]
@@ -0,0 +1,258 @@
+"""
+Per hairdresser-day occupancy bitmaps.
+
+Each local day is split in 288 cells of 5 minutes and a DayOccupancy row keeps
+one bit per cell, set when any Agenda entry touches the cell. The rows are kept
+in sync by the Agenda signals (see agenda.signals) inside the same transaction
+as the Agenda write, so slot lookups and overlap checks work on a couple of
+integers instead of rebuilding the day from Agenda rows.
+
+Working hours are not stored: they are turned into a mask of the same shape
+at read time (see working_mask), so editing an Availability never has to
+rewrite the stored days.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+from agenda.models import Agenda, DayOccupancy
+
+LOCAL_TIMEZONE = ZoneInfo('America/Manaus')
+CELL_MINUTES = 5
+CELLS_PER_DAY = 24 * 60 // CELL_MINUTES
+CELL_DURATION = timedelta(minutes=CELL_MINUTES)
+BYTES_PER_DAY = CELLS_PER_DAY // 8
+
+
+def local_day_start(day):
+    return datetime.combine(day, time.min).replace(tzinfo=LOCAL_TIMEZONE)
+
+def encode(mask):
+    return mask.to_bytes(BYTES_PER_DAY, 'little')
+
+def decode(cells):
+    return int.from_bytes(bytes(cells), 'little') if cells else 0
+
+def cell_range_mask(first_cell, last_cell):
+    """Mask with the cells in [first_cell, last_cell) set."""
+    first_cell = max(first_cell, 0)
+    last_cell = min(last_cell, CELLS_PER_DAY)
+    if last_cell <= first_cell:
+        return 0
+    return ((1 << (last_cell - first_cell)) - 1) << first_cell
+
+def _minutes_since(day_start, moment):
+    return (moment - day_start) / timedelta(minutes=1)
+
+def _time_minutes(value):
+    return value.hour * 60 + value.minute + value.second / 60
+
+def span_masks(start, end, inner=False):
+    """
+    Splits the [start, end) span in local days and yields a (day, mask) pair
+    for each of them.
+
+    By default a cell is set when the span touches it. With inner=True only the
+    cells fully covered by the span are set.
+    """
+    day = start.astimezone(LOCAL_TIMEZONE).date()
+    last_day = (end - timedelta(microseconds=1)).astimezone(LOCAL_TIMEZONE).date()
+
+    while day <= last_day:
+        day_start = local_day_start(day)
+        start_minutes = _minutes_since(day_start, start)
+        end_minutes = _minutes_since(day_start, end)
+        if inner:
+            first_cell = -int(-start_minutes // CELL_MINUTES)
+            last_cell = int(end_minutes // CELL_MINUTES)
+        else:
+            first_cell = int(start_minutes // CELL_MINUTES)
+            last_cell = -int(-end_minutes // CELL_MINUTES)
+        yield day, cell_range_mask(first_cell, last_cell)
+        day += timedelta(days=1)
+
+@lru_cache(maxsize=1024)
+def working_mask(start_time, end_time, break_start=None, break_end=None):
+    """
+    Mask of the cells fully inside the working hours and outside the break.
+    """
+    mask = cell_range_mask(
+        -int(-_time_minutes(start_time) // CELL_MINUTES),
+        int(_time_minutes(end_time) // CELL_MINUTES)
+    )
+    if break_start and break_end:
+        mask &= ~cell_range_mask(
+            int(_time_minutes(break_start) // CELL_MINUTES),
+            -int(-_time_minutes(break_end) // CELL_MINUTES)
+        )
+    return mask
+
+def free_intervals_from_mask(day, free_mask):
+    """
+    Turns the runs of set bits of a day mask into (start, end) datetimes.
+    """
+    day_start = local_day_start(day)
+    intervals = []
+    while free_mask:
+        first_cell = (free_mask & -free_mask).bit_length() - 1
+        shifted = free_mask >> first_cell
+        run_length = (~shifted & (shifted + 1)).bit_length() - 1
+        intervals.append((
+            day_start + first_cell * CELL_DURATION,
+            day_start + (first_cell + run_length) * CELL_DURATION,
+        ))
+        free_mask &= ~cell_range_mask(first_cell, first_cell + run_length)
+    return intervals
+
+def load_busy_masks(hairdresser_ids, date_from, date_to):
+    """
+    Reads the occupancy of several hairdressers over a window in one query.
+
+    Args:
+        hairdresser_ids: Hairdresser ids, or a queryset of them.
+        date_from: First local day of the window.
+        date_to: Last local day of the window.
+
+    Returns:
+        A dict mapping (hairdresser_id, date) to the busy mask of that day.
+        Days without any booking are missing from the dict.
+    """
+    return {
+        (hairdresser_id, day): decode(cells)
+        for hairdresser_id, day, cells in DayOccupancy.objects.filter(
+            hairdresser_id__in=hairdresser_ids,
+            date__range=(date_from, date_to)
+        ).values_list('hairdresser_id', 'date', 'cells')
+    }
+
+def load_day_masks(hairdresser_id, days):
+    """
+    Reads the busy masks of one hairdresser on an arbitrary set of days in one
+    query. Returns a dict mapping each booked day to its mask.
+    """
+    return {
+        day: decode(cells)
+        for day, cells in DayOccupancy.objects.filter(
+            hairdresser_id=hairdresser_id,
+            date__in=days
+        ).values_list('date', 'cells')
+    }
+
+def is_hairdresser_free(hairdresser_id, start, end):
+    """
+    Tells whether the hairdresser has no Agenda entry overlapping [start, end).
+
+    Cells fully covered by the span decide on their own. Only when a booking
+    touches one of the partially covered edge cells is the Agenda queried,
+    since the bitmap cannot tell on which side of the cell the booking lies.
+    """
+    outer = dict(span_masks(start, end))
+    inner = dict(span_masks(start, end, inner=True))
+    busy = load_busy_masks([hairdresser_id], min(outer), max(outer))
+
+    needs_exact_check = False
+    for day, outer_mask in outer.items():
+        busy_mask = busy.get((hairdresser_id, day), 0)
+        if busy_mask & inner[day]:
+            return False
+        if busy_mask & outer_mask:
+            needs_exact_check = True
+
+    if needs_exact_check:
+        return not Agenda.objects.filter(
+            hairdresser_id=hairdresser_id,
+            start_time__lt=end,
+            end_time__gt=start
+        ).exists()
+    return True
+
+def mark_busy(hairdresser_id, start, end):
+    """
+    Sets the cells of a new booking. Must run in the transaction that creates it.
+    """
+    for day, mask in span_masks(start, end):
+        occupancy, _ = DayOccupancy.objects.select_for_update().get_or_create(
+            hairdresser_id=hairdresser_id,
+            date=day,
+            defaults={'cells': encode(0)}
+        )
+        occupancy.cells = encode(decode(occupancy.cells) | mask)
+        occupancy.save(update_fields=['cells'])
+
+def mark_busy_many(hairdresser_id, spans):
+    """
+    Sets the cells of several new bookings of one hairdresser with a fixed number
+    of queries, whatever the number of bookings. Must run in the transaction
+    that creates them.
+    """
+    masks = defaultdict(int)
+    for start, end in spans:
+        for day, mask in span_masks(start, end):
+            masks[day] |= mask
+    if not masks:
+        return
+
+    DayOccupancy.objects.bulk_create(
+        [DayOccupancy(hairdresser_id=hairdresser_id, date=day, cells=encode(0)) for day in masks],
+        ignore_conflicts=True
+    )
+    occupancies = list(DayOccupancy.objects.select_for_update().filter(
+        hairdresser_id=hairdresser_id,
+        date__in=list(masks)
+    ))
+    for occupancy in occupancies:
+        occupancy.cells = encode(decode(occupancy.cells) | masks[occupancy.date])
+    DayOccupancy.objects.bulk_update(occupancies, ['cells'])
+
+def rebuild_span(hairdresser_id, start, end):
+    """
+    Recomputes, from Agenda, every day touched by [start, end).
+
+    Used when bookings are removed or moved: a cell may be shared with another
+    booking, so clearing bits blindly could free it by mistake.
+    """
+    for day, _ in span_masks(start, end):
+        day_start = local_day_start(day)
+        mask = 0
+        for booking_start, booking_end in Agenda.objects.filter(
+            hairdresser_id=hairdresser_id,
+            start_time__lt=day_start + timedelta(days=1),
+            end_time__gt=day_start
+        ).values_list('start_time', 'end_time'):
+            mask |= dict(span_masks(booking_start, booking_end)).get(day, 0)
+
+        if mask:
+            DayOccupancy.objects.update_or_create(
+                hairdresser_id=hairdresser_id,
+                date=day,
+                defaults={'cells': encode(mask)}
+            )
+        else:
+            DayOccupancy.objects.filter(hairdresser_id=hairdresser_id, date=day).delete()
+
+def rebuild_occupancy(hairdresser_ids=None):
+    """
+    Recomputes the occupancy of the given hairdressers (all of them by default)
+    from their Agenda entries. Returns the number of days written.
+    """
+    bookings = Agenda.objects.all()
+    occupancies = DayOccupancy.objects.all()
+    if hairdresser_ids is not None:
+        bookings = bookings.filter(hairdresser_id__in=hairdresser_ids)
+        occupancies = occupancies.filter(hairdresser_id__in=hairdresser_ids)
+
+    masks = defaultdict(int)
+    for hairdresser_id, start, end in bookings.values_list('hairdresser_id', 'start_time', 'end_time').iterator():
+        for day, mask in span_masks(start, end):
+            masks[(hairdresser_id, day)] |= mask
+
+    occupancies.delete()
+    DayOccupancy.objects.bulk_create(
+        (
+            DayOccupancy(hairdresser_id=hairdresser_id, date=day, cells=encode(mask))
+            for (hairdresser_id, day), mask in masks.items()
+        ),
+        batch_size=1000
+    )
+    return len(masks)
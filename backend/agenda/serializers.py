@@ -31,21 +31,9 @@ class AgendaSerializer(serializers.ModelSerializer):
 
     def get_customer(self, obj: Agenda):
         """
-        Looks for a customer in the pre-fetched data passed through the context.
-        This avoids hitting the database for every single agenda item.
+        Serializes the customer of the reserve behind this agenda item.
+        Callers listing many items should select_related('reserve__customer__user').
         """
-        # Create a unique key for the current agenda item
-        lookup_key = (obj.service_id, obj.start_time)
-        
-        # Get the reserve_map we created in the view from the context
-        reserve_map = self.context.get('reserve_map', {})
-        
-        # Find the matching reserve in our map
-        matching_reserve = reserve_map.get(lookup_key)
-
-        if matching_reserve:
-            # If we found a match, serialize its customer
-            return SimpleCustomerSerializer(matching_reserve.customer).data
-        
-        # Return null if no corresponding reserve was found
-        return None
\ No newline at end of file
+        if obj.reserve_id is None:
+            return None
+        return SimpleCustomerSerializer(obj.reserve.customer).data
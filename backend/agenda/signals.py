@@ -0,0 +1,29 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from agenda.models import Agenda
+from agenda.occupancy import mark_busy, rebuild_span
+
+
+@receiver(pre_save, sender=Agenda)
+def remember_previous_span(sender, instance, **kwargs):
+    # Moving a booking has to free the cells of its previous span
+    instance._previous_span = None
+    if instance.pk:
+        instance._previous_span = Agenda.objects.filter(pk=instance.pk).values_list(
+            'hairdresser_id', 'start_time', 'end_time'
+        ).first()
+
+@receiver(post_save, sender=Agenda)
+def update_occupancy_on_save(sender, instance, created, **kwargs):
+    if created:
+        mark_busy(instance.hairdresser_id, instance.start_time, instance.end_time)
+        return
+
+    if instance._previous_span:
+        rebuild_span(*instance._previous_span)
+    rebuild_span(instance.hairdresser_id, instance.start_time, instance.end_time)
+
+@receiver(post_delete, sender=Agenda)
+def update_occupancy_on_delete(sender, instance, **kwargs):
+    rebuild_span(instance.hairdresser_id, instance.start_time, instance.end_time)
@@ -6,9 +6,13 @@ import json
 from datetime import datetime, timedelta
 from django.utils import timezone
 
-from users.models import User, Hairdresser
+from users.models import User, Hairdresser, Customer
+from reserve.models import Reserve
 from service.models import Service
-from agenda.models import Agenda
+from agenda.models import Agenda, DayOccupancy
+from agenda.occupancy import CELL_MINUTES, LOCAL_TIMEZONE, cell_range_mask, decode, is_hairdresser_free
+from django.core.management import call_command
+from io import StringIO
 
 
 class AgendaTestCase(TestCase):
@@ -116,6 +120,41 @@ class CreateAgendaTest(AgendaTestCase):
         self.assertEqual(response.json()['message'], 'Agenda register created successfully')
         self.assertEqual(Agenda.objects.count(), 2)  # 1 from setup + 1 new
         
+    def test_create_agenda_overlap_conflict(self):
+        """Test that an overlapping agenda entry is rejected by the database with a 409"""
+        agenda_data = {
+            'start_time': (self.agenda_start_time + timedelta(minutes=30)).isoformat(),
+            'end_time': (self.agenda_end_time + timedelta(minutes=30)).isoformat(),
+            'hairdresser': self.hairdresser.id,
+            'service': self.service.id
+        }
+
+        response = self.client.post(
+            self.create_url,
+            data=json.dumps(agenda_data),
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Agenda.objects.count(), 1)
+
+    def test_create_agenda_same_time_other_hairdresser(self):
+        """Test that the overlap rule only applies within the same hairdresser"""
+        agenda_data = {
+            'start_time': self.agenda_start_time.isoformat(),
+            'end_time': self.agenda_end_time.isoformat(),
+            'hairdresser': self.hairdresser2.id,
+            'service': self.service.id
+        }
+
+        response = self.client.post(
+            self.create_url,
+            data=json.dumps(agenda_data),
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
     def test_create_agenda_invalid_hairdresser(self):
         """Test agenda creation with non-existent hairdresser"""
         new_start_time = self.agenda_start_time + timedelta(hours=2)
@@ -214,6 +253,74 @@ class ListAgendaTest(AgendaTestCase):
         response = self.client.get(list_hairdresser_url)
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
+    def test_list_hairdresser_agendas_customer(self):
+        """Test that booked items carry their reserve's customer and blocked items carry none"""
+        customer = Customer.objects.create(
+            user=User.objects.create(
+                email="customer@example.com",
+                first_name="Test",
+                last_name="Customer",
+                phone="+5592984501111",
+                neighborhood="Downtown",
+                city="Manaus",
+                state="AM",
+                address="Customer Street",
+                postal_code="69050750",
+                role="customer"
+            ),
+            cpf="12345678901"
+        )
+        booked_start = self.agenda_start_time + timedelta(hours=2)
+        reserve = Reserve.objects.create(start_time=booked_start, customer=customer, service=self.service)
+        Agenda.objects.create(
+            start_time=booked_start,
+            end_time=booked_start + timedelta(minutes=self.service.duration),
+            hairdresser=self.hairdresser,
+            service=self.service,
+            reserve=reserve
+        )
+
+        response = self.client.get(reverse('list_agenda', args=[self.hairdresser.id]))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        customers = {item['id']: item['customer'] for item in response.json()['data']}
+        self.assertIsNone(customers[self.agenda.id])
+        booked = [item for item in customers.values() if item is not None]
+        self.assertEqual(booked, [{'id': customer.id, 'user': {'first_name': 'Test', 'last_name': 'Customer'}}])
+
+    def test_list_hairdresser_agendas_query_count(self):
+        """Test that listing a long agenda does not issue more queries than a short one"""
+        customer = Customer.objects.create(
+            user=User.objects.create(
+                email="customer@example.com",
+                first_name="Test",
+                last_name="Customer",
+                phone="+5592984501111",
+                neighborhood="Downtown",
+                city="Manaus",
+                state="AM",
+                address="Customer Street",
+                postal_code="69050750",
+                role="customer"
+            ),
+            cpf="12345678901"
+        )
+        for day in range(2, 52):
+            start = self.agenda_start_time + timedelta(days=day)
+            reserve = Reserve.objects.create(start_time=start, customer=customer, service=self.service)
+            Agenda.objects.create(
+                start_time=start,
+                end_time=start + timedelta(minutes=self.service.duration),
+                hairdresser=self.hairdresser,
+                service=self.service,
+                reserve=reserve
+            )
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('list_agenda', args=[self.hairdresser.id]))
+
+        self.assertEqual(len(response.json()['data']), 51)
+
 class RemoveAgendaTest(AgendaTestCase):
     def test_remove_agenda_success(self):
         """Test successful agenda removal"""
@@ -226,4 +333,79 @@ class RemoveAgendaTest(AgendaTestCase):
     def test_remove_nonexistent_agenda(self):
         """Test removing a non-existent agenda"""        
         response = self.client.delete(self.remove_url(9999))  # Non-existent ID
-        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class DayOccupancyTest(AgendaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.day = self.agenda_start_time.astimezone(LOCAL_TIMEZONE).date()
+
+    def local(self, hour, minute=0):
+        return datetime.combine(self.day, datetime.min.time()).replace(hour=hour, minute=minute, tzinfo=LOCAL_TIMEZONE)
+
+    def busy_mask(self, hairdresser=None):
+        hairdresser = hairdresser or self.hairdresser
+        occupancy = DayOccupancy.objects.filter(hairdresser=hairdresser, date=self.day).first()
+        return decode(occupancy.cells) if occupancy else 0
+
+    def test_create_marks_cells(self):
+        """Test that creating an agenda entry sets the cells it covers"""
+        Agenda.objects.create(
+            start_time=self.local(14),
+            end_time=self.local(14, 30),
+            hairdresser=self.hairdresser2,
+            service=self.service
+        )
+
+        first_cell = 14 * 60 // CELL_MINUTES
+        self.assertEqual(self.busy_mask(self.hairdresser2), cell_range_mask(first_cell, first_cell + 6))
+
+    def test_delete_keeps_shared_cells(self):
+        """Test that removing a booking does not free a cell shared with another one"""
+        first = Agenda.objects.create(
+            start_time=self.local(14),
+            end_time=self.local(14, 32),
+            hairdresser=self.hairdresser2,
+            service=self.service
+        )
+        Agenda.objects.create(
+            start_time=self.local(14, 32),
+            end_time=self.local(15),
+            hairdresser=self.hairdresser2,
+            service=self.service
+        )
+
+        first.delete()
+
+        shared_cell = (14 * 60 + 30) // CELL_MINUTES
+        self.assertEqual(self.busy_mask(self.hairdresser2), cell_range_mask(shared_cell, shared_cell + 6))
+
+    def test_delete_last_booking_removes_day(self):
+        """Test that a day without bookings has no occupancy row"""
+        self.agenda.delete()
+
+        self.assertFalse(DayOccupancy.objects.filter(hairdresser=self.hairdresser).exists())
+
+    def test_is_hairdresser_free(self):
+        """Test overlap checks against the bitmap, including partially covered cells"""
+        Agenda.objects.create(
+            start_time=self.local(14),
+            end_time=self.local(14, 32),
+            hairdresser=self.hairdresser2,
+            service=self.service
+        )
+
+        self.assertFalse(is_hairdresser_free(self.hairdresser2.id, self.local(13, 30), self.local(14, 30)))
+        self.assertFalse(is_hairdresser_free(self.hairdresser2.id, self.local(14, 31), self.local(15)))
+        self.assertTrue(is_hairdresser_free(self.hairdresser2.id, self.local(14, 32), self.local(15)))
+        self.assertTrue(is_hairdresser_free(self.hairdresser2.id, self.local(13), self.local(14)))
+
+    def test_rebuild_command(self):
+        """Test that the rebuild command restores missing or corrupted bitmaps"""
+        expected = self.busy_mask()
+        DayOccupancy.objects.all().update(cells=b'')
+
+        call_command('rebuild_occupancy', stdout=StringIO())
+
+        self.assertEqual(self.busy_mask(), expected)
+        self.assertNotEqual(expected, 0)
@@ -1,5 +1,5 @@
 from django.shortcuts import render
-from agenda.models import Agenda
+from agenda.models import Agenda, is_agenda_overlap_error
 from agenda.serializers import AgendaSerializer
 from users.models import User, Hairdresser
 from service.models import Service
@@ -7,8 +7,8 @@ from rest_framework.views import APIView
 from django.http import JsonResponse
 import json
 from datetime import timedelta, datetime
-from reserve.models import Reserve
-from django.db.models import Q
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 # Create your views here.
 
 class CreateAgenda(APIView):
@@ -40,28 +40,29 @@ class CreateAgenda(APIView):
             except ValueError:
                 return JsonResponse({'error': 'Invalid end_time format'}, status=400)
         
-        # Verificação completa de sobreposição:
-        # Verifica se existem agendamentos que se sobrepõem ao novo agendamento
-        overlapping_agendas = Agenda.objects.filter(
-            hairdresser=data['hairdresser'],
-            # O start_time do agendamento existente é antes do end_time do novo
-            start_time__lt=end_time,
-            # E o end_time do agendamento existente é depois do start_time do novo
-            end_time__gt=start_time
-        )
-        
-        if overlapping_agendas.exists():
-            return JsonResponse({
-                'error': 'This time slot overlaps with an existing appointment'
-            }, status=400)
-        
-        # Agora é seguro criar o agendamento
-        Agenda.objects.create(
-            service=service_instance,
-            hairdresser=hairdresser_instance,
-            start_time=start_time,
-            end_time=end_time
-        )
+        if timezone.is_naive(start_time):
+            start_time = timezone.make_aware(start_time)
+        if timezone.is_naive(end_time):
+            end_time = timezone.make_aware(end_time)
+
+        if end_time <= start_time:
+            return JsonResponse({'error': 'end_time must be after start_time'}, status=400)
+
+        # A sobreposição com outros agendamentos é rejeitada pela constraint de exclusão do banco
+        try:
+            with transaction.atomic():
+                Agenda.objects.create(
+                    service=service_instance,
+                    hairdresser=hairdresser_instance,
+                    start_time=start_time,
+                    end_time=end_time
+                )
+        except IntegrityError as e:
+            if is_agenda_overlap_error(e):
+                return JsonResponse({
+                    'error': 'This time slot overlaps with an existing appointment'
+                }, status=409)
+            raise
 
         return JsonResponse({'message': 'Agenda register created successfully'}, status=201)
 
@@ -70,30 +71,15 @@ class ListAgenda(APIView):
         if hairdresser_id:
             try:
                 hairdresser = Hairdresser.objects.get(id=hairdresser_id)
-                agenda_items = Agenda.objects.filter(hairdresser=hairdresser).select_related('service')
-                if not agenda_items.exists():
-                    return JsonResponse({'data': []}, status=200)
-                reserve_identifiers = set()
-                for item in agenda_items:
-                    reserve_identifiers.add((item.service_id, item.start_time))
-
-                q_objects = Q()
-                for service_id, start_time in reserve_identifiers:
-                    q_objects |= Q(service_id=service_id, start_time=start_time)
-                matching_reserves = Reserve.objects.filter(q_objects).select_related('customer__user')
-                reserve_map = {
-                    (reserve.service_id, reserve.start_time): reserve
-                    for reserve in matching_reserves
-                }
-                serializer_context = {'reserve_map': reserve_map}
-                serializer = AgendaSerializer(agenda_items, many=True, context=serializer_context)
+                agenda_items = Agenda.objects.filter(hairdresser=hairdresser).select_related('service', 'reserve__customer__user')
+                serializer = AgendaSerializer(agenda_items, many=True)
                 
                 return JsonResponse({'data': serializer.data}, status=200)
 
             except Hairdresser.DoesNotExist:
                 return JsonResponse({'error': 'Hairdresser not found'}, status=404)
             
-        agendas = Agenda.objects.all()
+        agendas = Agenda.objects.select_related('service', 'reserve__customer__user')
         result = AgendaSerializer(agendas, many=True).data 
         return JsonResponse({'data': result}, status=200)
     
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.20 on 2026-10-18 13:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_profile_picture'),
+        ('availability', '0003_availability_break_end_availability_break_start'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilityOverride',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('is_closed', models.BooleanField(default=False)),
+                ('start_time', models.TimeField(blank=True, null=True)),
+                ('end_time', models.TimeField(blank=True, null=True)),
+                ('break_start', models.TimeField(blank=True, null=True)),
+                ('break_end', models.TimeField(blank=True, null=True)),
+                ('hairdresser', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_overrides', to='users.hairdresser')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='availabilityoverride',
+            constraint=models.UniqueConstraint(fields=('hairdresser', 'date'), name='unique_hairdresser_availability_override'),
+        ),
+    ]
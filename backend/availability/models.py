@@ -11,3 +11,21 @@ class Availability(models.Model):
     end_time = models.TimeField(blank=False, null=False)
     break_start = models.TimeField(null=True, blank=True)
     break_end = models.TimeField(null=True, blank=True)
+
+class AvailabilityOverride(models.Model):
+    """
+    Replaces the weekly availability of a hairdresser on one date: either the
+    whole day is closed (holidays, vacations) or it uses its own hours and break.
+    """
+    hairdresser = models.ForeignKey(Hairdresser, on_delete=models.CASCADE, related_name='availability_overrides')
+    date = models.DateField(blank=False, null=False)
+    is_closed = models.BooleanField(default=False)
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+    break_start = models.TimeField(null=True, blank=True)
+    break_end = models.TimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hairdresser', 'date'], name='unique_hairdresser_availability_override'),
+        ]
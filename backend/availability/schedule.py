@@ -0,0 +1,95 @@
+"""
+Compiled working calendars.
+
+A hairdresser's effective hours on a date come from their weekly Availability
+rows unless an AvailabilityOverride exists for that date. compile_calendars
+reads both for a window of dates with one query each and folds them into a
+HairdresserCalendar, on which resolving any date is a list index or a dict
+lookup.
+"""
+import calendar
+from collections import namedtuple
+
+from availability.models import Availability, AvailabilityOverride
+
+WorkingHours = namedtuple('WorkingHours', ['start_time', 'end_time', 'break_start', 'break_end'])
+
+WEEKDAY_NAMES = [name.lower() for name in calendar.day_name]
+
+
+class HairdresserCalendar:
+    """
+    Effective working hours of one hairdresser. `weekly` holds the WorkingHours
+    of each weekday (Monday first) or None on days off; `overrides` maps dates
+    to their WorkingHours, or to None when the date is closed.
+    """
+    __slots__ = ('weekly', 'overrides')
+
+    def __init__(self, weekly=None, overrides=None):
+        self.weekly = weekly or [None] * 7
+        self.overrides = overrides or {}
+
+    def hours_on(self, day):
+        if day in self.overrides:
+            return self.overrides[day]
+        return self.weekly[day.weekday()]
+
+    def works_on(self, day):
+        return self.hours_on(day) is not None
+
+    def non_working_weekdays(self):
+        """Weekdays off in the weekly schedule, Monday being 0."""
+        return [weekday for weekday, hours in enumerate(self.weekly) if hours is None]
+
+    def closed_dates(self):
+        """Dates of the compiled window closed by an override."""
+        return sorted(day for day, hours in self.overrides.items() if hours is None)
+
+    def extra_working_dates(self):
+        """Dates of the compiled window opened by an override on a weekday off."""
+        return sorted(
+            day for day, hours in self.overrides.items()
+            if hours is not None and self.weekly[day.weekday()] is None
+        )
+
+
+def compile_calendars(hairdresser_ids, date_from, date_to):
+    """
+    Compiles the calendars of several hairdressers for [date_from, date_to].
+
+    Args:
+        hairdresser_ids: Hairdresser ids, or a queryset of them.
+        date_from: First date the calendars must resolve.
+        date_to: Last date the calendars must resolve.
+
+    Returns:
+        A dict mapping every hairdresser id given to its HairdresserCalendar.
+        Hairdressers without any row get an empty calendar (never working).
+        The weekly hours are complete; overrides only cover the window.
+    """
+    # Every weekday is compiled, whatever the window, so the weekly schedule
+    # stays complete for callers resolving dates outside of it
+    availabilities = Availability.objects.filter(hairdresser_id__in=hairdresser_ids)
+
+    calendars = {}
+    if isinstance(hairdresser_ids, (list, tuple, set)):
+        calendars = {hairdresser_id: HairdresserCalendar() for hairdresser_id in hairdresser_ids}
+
+    for hairdresser_id, weekday, *hours in availabilities.values_list(
+        'hairdresser_id', 'weekday', 'start_time', 'end_time', 'break_start', 'break_end'
+    ):
+        hairdresser_calendar = calendars.setdefault(hairdresser_id, HairdresserCalendar())
+        if weekday.lower() in WEEKDAY_NAMES:
+            hairdresser_calendar.weekly[WEEKDAY_NAMES.index(weekday.lower())] = WorkingHours(*hours)
+
+    for hairdresser_id, day, is_closed, *hours in AvailabilityOverride.objects.filter(
+        hairdresser_id__in=hairdresser_ids,
+        date__range=(date_from, date_to)
+    ).values_list('hairdresser_id', 'date', 'is_closed', 'start_time', 'end_time', 'break_start', 'break_end'):
+        hairdresser_calendar = calendars.setdefault(hairdresser_id, HairdresserCalendar())
+        hairdresser_calendar.overrides[day] = None if is_closed else WorkingHours(*hours)
+
+    return calendars
+
+def compile_calendar(hairdresser_id, date_from, date_to):
+    return compile_calendars([hairdresser_id], date_from, date_to)[hairdresser_id]
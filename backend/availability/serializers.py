@@ -1,7 +1,12 @@
 from rest_framework import serializers
-from .models import Availability
+from .models import Availability, AvailabilityOverride
 
 class AvailabilitySerializer(serializers.ModelSerializer):
     class Meta:
         model = Availability
-        fields = ['id', 'weekday', 'start_time', 'end_time', 'break_start', 'break_end']
\ No newline at end of file
+        fields = ['id', 'weekday', 'start_time', 'end_time', 'break_start', 'break_end']
+
+class AvailabilityOverrideSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AvailabilityOverride
+        fields = ['id', 'date', 'is_closed', 'start_time', 'end_time', 'break_start', 'break_end']
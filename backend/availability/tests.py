@@ -3,7 +3,10 @@ from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from users.models import User, Hairdresser
-from availability.models import Availability
+from availability.models import Availability, AvailabilityOverride
+from availability.schedule import compile_calendar, WorkingHours
+from django.utils import timezone
+from zoneinfo import ZoneInfo
 from datetime import time, datetime, timedelta
 import jwt
 import json
@@ -440,6 +443,21 @@ class ListAvailabilityTest(TestCase):
         data = json.loads(response.content)
         self.assertEqual(data['error'], 'Hairdresser not found')
 
+    def test_list_availability_reports_overrides(self):
+        today = timezone.now().astimezone(ZoneInfo("America/Manaus")).date()
+        next_monday = today + timedelta(days=7 - today.weekday())
+        next_sunday = next_monday + timedelta(days=6)
+        AvailabilityOverride.objects.create(hairdresser=self.hairdresser, date=next_monday, is_closed=True)
+        AvailabilityOverride.objects.create(
+            hairdresser=self.hairdresser, date=next_sunday, start_time=time(9, 0), end_time=time(12, 0)
+        )
+
+        response = self.client.get(self.list_url)
+
+        data = json.loads(response.content)
+        self.assertEqual(data['non_working_days'], [0, 3, 4, 5, 6])
+        self.assertEqual(data['closed_dates'], [next_monday.isoformat()])
+        self.assertEqual(data['extra_working_dates'], [next_sunday.isoformat()])
 
 class RemoveAvailabilityTest(TestCase):
     def setUp(self):
@@ -619,6 +637,147 @@ class UpdateAvailabilityTest(TestCase):
         self.assertEqual(str(self.availability.end_time), '17:00:00')
 
 
+class AvailabilityOverrideTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create(
+            first_name="Test",
+            last_name="User",
+            email="test@example.com",
+            password="testpassword",
+            phone="1234567890",
+            address="Test Street",
+            number="42",
+            postal_code="54321",
+            role="hairdresser"
+        )
+        self.hairdresser = Hairdresser.objects.create(
+            user=self.user,
+            experience_years=3,
+            resume="Test resume",
+            cnpj="12345678901234"
+        )
+        Availability.objects.create(
+            hairdresser=self.hairdresser,
+            weekday='monday',
+            start_time=time(9, 0),
+            end_time=time(17, 0),
+            break_start=time(12, 0),
+            break_end=time(13, 0)
+        )
+        today = timezone.now().astimezone(ZoneInfo("America/Manaus")).date()
+        self.next_monday = today + timedelta(days=7 - today.weekday())
+        self.create_url = reverse('create_availability_override', args=[self.hairdresser.id])
+
+    def test_calendar_resolves_overrides_before_weekly_hours(self):
+        following_monday = self.next_monday + timedelta(days=7)
+        AvailabilityOverride.objects.create(hairdresser=self.hairdresser, date=self.next_monday, is_closed=True)
+        AvailabilityOverride.objects.create(
+            hairdresser=self.hairdresser, date=self.next_monday + timedelta(days=1), start_time=time(10, 0), end_time=time(14, 0)
+        )
+
+        calendar = compile_calendar(self.hairdresser.id, self.next_monday, following_monday)
+
+        self.assertIsNone(calendar.hours_on(self.next_monday))
+        self.assertEqual(calendar.hours_on(self.next_monday + timedelta(days=1)), WorkingHours(time(10, 0), time(14, 0), None, None))
+        self.assertIsNone(calendar.hours_on(self.next_monday + timedelta(days=2)))
+        self.assertEqual(calendar.hours_on(following_monday), WorkingHours(time(9, 0), time(17, 0), time(12, 0), time(13, 0)))
+
+    def test_create_closed_day(self):
+        response = self.client.post(
+            self.create_url,
+            data=json.dumps({'date': self.next_monday.isoformat(), 'is_closed': True}),
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(AvailabilityOverride.objects.get(hairdresser=self.hairdresser, date=self.next_monday).is_closed)
+
+    def test_create_override_replaces_existing_date(self):
+        self.client.post(
+            self.create_url,
+            data=json.dumps({'date': self.next_monday.isoformat(), 'is_closed': True}),
+            content_type='application/json'
+        )
+        response = self.client.post(
+            self.create_url,
+            data=json.dumps({'date': self.next_monday.isoformat(), 'start_time': '08:00', 'end_time': '20:00'}),
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        override = AvailabilityOverride.objects.get(hairdresser=self.hairdresser, date=self.next_monday)
+        self.assertFalse(override.is_closed)
+        self.assertEqual(override.end_time, time(20, 0))
+
+    def test_create_override_invalid_hours(self):
+        response = self.client.post(
+            self.create_url,
+            data=json.dumps({'date': self.next_monday.isoformat(), 'start_time': '18:00', 'end_time': '09:00'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(
+            self.create_url,
+            data=json.dumps({'date': self.next_monday.isoformat()}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_override_non_string_values(self):
+        for data in (
+            {'date': self.next_monday.isoformat(), 'start_time': 900, 'end_time': '18:00'},
+            {'date': 20250101, 'is_closed': True},
+        ):
+            response = self.client.post(self.create_url, data=json.dumps(data), content_type='application/json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, data)
+            self.assertIn('error', response.json())
+
+    def test_create_override_parses_is_closed_strictly(self):
+        response = self.client.post(
+            self.create_url,
+            data=json.dumps({'date': self.next_monday.isoformat(), 'is_closed': 'false', 'start_time': '08:00', 'end_time': '12:00'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(AvailabilityOverride.objects.get(hairdresser=self.hairdresser, date=self.next_monday).is_closed)
+
+        response = self.client.post(
+            self.create_url,
+            data=json.dumps({'date': self.next_monday.isoformat(), 'is_closed': 'True'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(AvailabilityOverride.objects.get(hairdresser=self.hairdresser, date=self.next_monday).is_closed)
+
+        for is_closed in ('no', 1, None, []):
+            response = self.client.post(
+                self.create_url,
+                data=json.dumps({'date': self.next_monday.isoformat(), 'is_closed': is_closed}),
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, is_closed)
+
+    def test_short_window_calendar_keeps_the_whole_week(self):
+        Availability.objects.create(hairdresser=self.hairdresser, weekday='friday', start_time=time(8, 0), end_time=time(12, 0))
+
+        calendar = compile_calendar(self.hairdresser.id, self.next_monday, self.next_monday)
+
+        self.assertEqual(calendar.non_working_weekdays(), [1, 2, 3, 5, 6])
+        self.assertEqual(calendar.hours_on(self.next_monday + timedelta(days=4)), WorkingHours(time(8, 0), time(12, 0), None, None))
+
+    def test_list_and_remove_override(self):
+        override = AvailabilityOverride.objects.create(hairdresser=self.hairdresser, date=self.next_monday, is_closed=True)
+
+        response = self.client.get(reverse('list_availability_override', args=[self.hairdresser.id]))
+        self.assertEqual([item['id'] for item in response.json()['data']], [override.id])
+
+        response = self.client.delete(reverse('remove_availability_override', args=[override.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(AvailabilityOverride.objects.exists())
+
+
 class AvailabilityModelTest(TestCase):
     def setUp(self):
         # Create a user with hairdresser role
@@ -1,5 +1,8 @@
 from django.urls import path
-from .views import CreateAvailability, CreateMultipleAvailability,ListAvailability, RemoveAvailability, UpdateAvailability, UpdateMultipleAvailability
+from .views import (
+    CreateAvailability, CreateMultipleAvailability,ListAvailability, RemoveAvailability, UpdateAvailability, UpdateMultipleAvailability,
+    CreateAvailabilityOverride, ListAvailabilityOverride, RemoveAvailabilityOverride
+)
 
 urlpatterns = [
     path('create', CreateAvailability.as_view(), name='create_availability'),
@@ -8,4 +11,7 @@ urlpatterns = [
     path('remove/<int:id>', RemoveAvailability.as_view(), name='remove_availability'),
     path('update/multiple/<int:hairdresser_id>', UpdateMultipleAvailability.as_view(), name='update_multiple_availability'),
     path('update/<int:id>', UpdateAvailability.as_view(), name='update_availability'),
+    path('override/create/<int:hairdresser_id>', CreateAvailabilityOverride.as_view(), name='create_availability_override'),
+    path('override/list/<int:hairdresser_id>', ListAvailabilityOverride.as_view(), name='list_availability_override'),
+    path('override/remove/<int:id>', RemoveAvailabilityOverride.as_view(), name='remove_availability_override'),
 ]
\ No newline at end of file
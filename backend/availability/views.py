@@ -1,11 +1,17 @@
 from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .models import Availability
+from .models import Availability, AvailabilityOverride
+from .schedule import compile_calendar
 from users.models import Hairdresser
-from .serializers import AvailabilitySerializer
+from .serializers import AvailabilitySerializer, AvailabilityOverrideSerializer
+from agenda.occupancy import LOCAL_TIMEZONE
 from django.http import JsonResponse
+from django.utils import timezone
 import jwt, json, datetime
+
+# How far ahead ListAvailability reports date overrides
+OVERRIDE_HORIZON_DAYS = 90
 # Create your views here.
 
 class CreateAvailability(APIView):
@@ -105,48 +111,99 @@ class ListAvailability(APIView):
             return JsonResponse({'error': 'Hairdresser not found'}, status=404)
         
         serialized_data = result['availabilities']
-        working_days = [avail['weekday'].lower() for avail in serialized_data]
-            
-        # Convert to numerical representation (days the hairdresser does NOT work)
-        non_working_day_numbers = self.get_non_working_days(working_days)
+
+        today = timezone.now().astimezone(LOCAL_TIMEZONE).date()
+        hairdresser_calendar = compile_calendar(
+            hairdresser_id, today, today + datetime.timedelta(days=OVERRIDE_HORIZON_DAYS)
+        )
         
         response_data = {
             'data': serialized_data,
-            'non_working_days': non_working_day_numbers
+            'non_working_days': self.get_non_working_days(hairdresser_calendar),
+            'closed_dates': [day.isoformat() for day in hairdresser_calendar.closed_dates()],
+            'extra_working_dates': [day.isoformat() for day in hairdresser_calendar.extra_working_dates()]
         }
         
         return JsonResponse(response_data, status=200)
     
-    def get_non_working_days(self, working_days):
+    def get_non_working_days(self, hairdresser_calendar):
         """
-        Convert nominal weekdays to their numerical representation (0-6)
-        and return the days the hairdresser doesn't work
+        Return the weekdays the hairdresser doesn't work in their weekly schedule
         
         Args:
-            working_days: List of weekday names that the hairdresser works
+            hairdresser_calendar: The compiled HairdresserCalendar of the hairdresser
             
         Returns:
             List of integers representing days the hairdresser does NOT work (0=Sunday, 1=Monday, etc.)
         """
-        weekday_map = {
-            'sunday': 0,
-            'monday': 1,
-            'tuesday': 2,
-            'wednesday': 3,
-            'thursday': 4,
-            'friday': 5,
-            'saturday': 6
-        }
-        
-        # Get all days the hairdresser doesn't work
-        all_days = set(range(7))  # 0-6
-        working_day_numbers = set(weekday_map.get(day.lower(), -1) for day in working_days)
-        
-        # Remove invalid mappings if any
-        working_day_numbers.discard(-1)
-        
-        # Return days the hairdresser doesn't work
-        return list(all_days - working_day_numbers)
+        # The calendar numbers weekdays from Monday, the frontend from Sunday
+        return sorted((weekday + 1) % 7 for weekday in hairdresser_calendar.non_working_weekdays())
+
+class CreateAvailabilityOverride(APIView):
+    def post(self, request, hairdresser_id):
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+        hairdresser = Hairdresser.objects.filter(id=hairdresser_id).first()
+        if not hairdresser:
+            return JsonResponse({'error': 'Hairdresser not found'}, status=404)
+
+        if not data.get('date'):
+            return JsonResponse({'error': 'The following field is required: date'}, status=400)
+        # Form payloads send booleans as text, and "false" must not close the day
+        is_closed = data.get('is_closed', False)
+        if isinstance(is_closed, str) and is_closed.lower() in ('true', 'false'):
+            is_closed = is_closed.lower() == 'true'
+        if not isinstance(is_closed, bool):
+            return JsonResponse({'error': 'is_closed must be true or false'}, status=400)
+        if not is_closed and (not data.get('start_time') or not data.get('end_time')):
+            return JsonResponse({'error': 'start_time and end_time are required unless the day is closed'}, status=400)
+        if bool(data.get('break_start')) != bool(data.get('break_end')):
+            return JsonResponse({'error': 'break_start and break_end must be given together'}, status=400)
+
+        try:
+            date = datetime.datetime.strptime(data['date'], '%Y-%m-%d').date()
+            hours = {
+                field: datetime.time.fromisoformat(data[field]) if data.get(field) and not is_closed else None
+                for field in ('start_time', 'end_time', 'break_start', 'break_end')
+            }
+        except (TypeError, ValueError):
+            return JsonResponse({'error': 'Invalid format. Use YYYY-MM-DD for the date and HH:MM for times.'}, status=400)
+
+        if not is_closed:
+            if hours['end_time'] <= hours['start_time']:
+                return JsonResponse({'error': 'end_time must be after start_time'}, status=400)
+            if hours['break_start'] and not hours['start_time'] <= hours['break_start'] < hours['break_end'] <= hours['end_time']:
+                return JsonResponse({'error': 'The break must be inside the working hours'}, status=400)
+
+        override, created = AvailabilityOverride.objects.update_or_create(
+            hairdresser=hairdresser,
+            date=date,
+            defaults={'is_closed': is_closed, **hours}
+        )
+        return JsonResponse(
+            {'data': AvailabilityOverrideSerializer(override).data},
+            status=201 if created else 200
+        )
+
+class ListAvailabilityOverride(APIView):
+    def get(self, request, hairdresser_id):
+        if not Hairdresser.objects.filter(id=hairdresser_id).exists():
+            return JsonResponse({'error': 'Hairdresser not found'}, status=404)
+
+        today = timezone.now().astimezone(LOCAL_TIMEZONE).date()
+        overrides = AvailabilityOverride.objects.filter(hairdresser_id=hairdresser_id, date__gte=today).order_by('date')
+        return JsonResponse({'data': AvailabilityOverrideSerializer(overrides, many=True).data}, status=200)
+
+class RemoveAvailabilityOverride(APIView):
+    def delete(self, request, id):
+        try:
+            AvailabilityOverride.objects.get(id=id).delete()
+            return JsonResponse({'message': 'Availability override removed successfully'}, status=200)
+        except AvailabilityOverride.DoesNotExist:
+            return JsonResponse({'error': 'Availability override not found'}, status=404)
 
 class RemoveAvailability(APIView):
     def delete(self, request, id):
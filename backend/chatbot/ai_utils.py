@@ -76,6 +76,10 @@ class AiUtils():
         try:
             from preferences.models import Preferences 
             from django.db.models import Q, Count 
+            from review.ratings import rating_expression
+
+            # Review average, the profile rating until the first review
+            hairdresser_rating = rating_expression('hairdresser__rating_avg', 'rating')
             
             if not preferences_list:
                 return UserFullInfoSerializer(
@@ -91,7 +95,7 @@ class AiUtils():
             if not matching_preferences.exists():
                 print("No matching preferences found, returning top-rated hairdressers")
                 return UserFullInfoSerializer(
-                    User.objects.filter(role='hairdresser').order_by('-rating')[:limit], 
+                    User.objects.filter(role='hairdresser').order_by(hairdresser_rating.desc(nulls_last=True))[:limit], 
                     many=True
                 ).data
             
@@ -100,7 +104,7 @@ class AiUtils():
                 preferences__in=matching_preferences
             ).annotate(
                 preference_match_count=Count('preferences', filter=Q(preferences__in=matching_preferences))
-            ).order_by('-preference_match_count', '-rating')[:limit]
+            ).order_by('-preference_match_count', hairdresser_rating.desc(nulls_last=True))[:limit]
             
             return UserFullInfoSerializer(matching_hairdressers, many=True).data
             
@@ -110,6 +114,18 @@ class AiUtils():
                 many=True
             ).data
 
+    @staticmethod
+    def get_recommended_hairdressers(phone, limit=3):
+        """
+        Hairdressers booked by customers with the same booking history as the
+        customer with this phone, stored by the recommend_hairdressers command
+        """
+        recommended = User.objects.filter(
+            role='hairdresser',
+            hairdresser__recommended_to__customer__user__phone=phone,
+        ).order_by('hairdresser__recommended_to__rank')[:limit]
+        return UserFullInfoSerializer(recommended, many=True).data
+
     @staticmethod
     def create_gemini_model_for_preference_collection():
         """Create Gemini model for collecting user preferences"""
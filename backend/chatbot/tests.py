@@ -5,7 +5,8 @@ from datetime import date, timedelta
 from unittest.mock import patch, MagicMock, call
 from django.test import TestCase, override_settings
 
-from users.models import User, Hairdresser
+from users.models import User, Customer, Hairdresser
+from reserve.models import CustomerRecommendation
 from preferences.models import Preferences
 from chatbot.ai_utils import AiUtils
 from users.serializers import UserFullInfoSerializer
@@ -118,6 +119,25 @@ class AiUtilsTest(TestCase):
         self.assertEqual(len(matches), 1)
         self.assertEqual(matches[0]['hairdresser']['user']['first_name'], 'Pedro') # Pedro has a 5.0 rating
 
+    def test_get_hairdressers_by_preferences_ranks_by_reviews(self):
+        """Test that the review average outranks the profile rating."""
+        Hairdresser.objects.filter(id=self.hairdresser2.id).update(rating_sum=6, rating_count=2, rating_avg=3)
+        matches = AiUtils.get_hairdressers_by_preferences(['luzes'], limit=1)
+        self.assertEqual(matches[0]['hairdresser']['user']['first_name'], 'Joana')
+        self.assertEqual(matches[0]['hairdresser']['rating_count'], 0)
+
+    def test_get_recommended_hairdressers(self):
+        customer_user = User.objects.create(
+            email="customer@example.com", phone="+5592984504444", postal_code="69050750", role="customer",
+        )
+        customer = Customer.objects.create(user=customer_user, cpf="12345678901")
+        CustomerRecommendation.objects.create(customer=customer, hairdresser=self.hairdresser2, rank=1, score=0.9)
+        CustomerRecommendation.objects.create(customer=customer, hairdresser=self.hairdresser1, rank=2, score=0.4)
+
+        recommended = AiUtils.get_recommended_hairdressers("+5592984504444")
+        self.assertEqual([h['hairdresser']['id'] for h in recommended], [self.hairdresser2.id, self.hairdresser1.id])
+        self.assertEqual(AiUtils.get_recommended_hairdressers("+5592900000000"), [])
+
     @patch('chatbot.ai_utils.requests.post')
     def test_send_whatsapp_message_success(self, mock_post):
         """Test successful sending of a WhatsApp message."""
@@ -194,7 +214,7 @@ from django.conf import settings
 from users.models import User, Hairdresser, Customer
 from preferences.models import Preferences
 from service.models import Service
-from chatbot.views import user_states, user_chats, user_preferences, recommended_or_searched_hairdressers, chosen_hairdresser, show_services, chosen_service, chosen_date
+from chatbot.views import user_states, user_chats, user_preferences, recommended_or_searched_hairdressers, chosen_hairdresser, show_services, chosen_service, chosen_date, chosen_time
 from chatbot.response_messages import ResponseMessage
 
 
@@ -312,6 +332,7 @@ class ChatbotViewTest(TestCase):
         show_services.clear()
         chosen_service.clear()
         chosen_date.clear()
+        chosen_time.clear()
 
     def _create_webhook_payload(self, message_text):
         """Helper to create a valid JSON payload for the POST request."""
@@ -366,9 +387,10 @@ class ChatbotViewTest(TestCase):
 
     @patch('chatbot.views.AiUtils.send_whatsapp_message')
     @patch('chatbot.views.get_available_slots')
+    @patch('chatbot.views.hold_chosen_slot')
     @patch('chatbot.views.create_new_reserve')
     @patch('chatbot.views.get_hairdresser_availability')
-    def test_full_booking_flow(self, mock_get_availability, mock_create_reserve, mock_get_slots, mock_send_message):
+    def test_full_booking_flow(self, mock_get_availability, mock_create_reserve, mock_hold_slot, mock_get_slots, mock_send_message):
         """Test a full, successful booking flow from service selection to confirmation."""
         # --- State 1: Select a hairdresser ---
         user_states[self.sender_number] = 'hairdresser_service_selection'
@@ -404,12 +426,26 @@ class ChatbotViewTest(TestCase):
         self.assertIn(self.sender_number, chosen_date)
         self.assertIn("Horários disponíveis para", mock_send_message.call_args[0][1])
         
-        # --- State 4: Confirm time and booking ---
-        mock_create_reserve.return_value = {'success': True}
+        # --- State 4: Pick a time, which is held ---
+        mock_hold_slot.return_value = {'success': True}
         payload = self._create_webhook_payload("14:00")
         response = self.client.post(self.evolution_api_url, data=payload, content_type='application/json')
 
         self.assertEqual(response.status_code, 200)
+        self.assertEqual(user_states[self.sender_number], 'confirm_booking')
+        self.assertEqual(mock_hold_slot.call_args.kwargs['start_time_dt'].strftime('%H:%M'), '14:00')
+        self.assertIn("Digite *sim* para confirmar", mock_send_message.call_args[0][1])
+        mock_create_reserve.assert_not_called()
+
+        # --- State 5: Confirm the held time ---
+        mock_create_reserve.return_value = {'success': True}
+        payload = self._create_webhook_payload("sim")
+        response = self.client.post(self.evolution_api_url, data=payload, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            mock_create_reserve.call_args.kwargs['start_time_dt'], mock_hold_slot.call_args.kwargs['start_time_dt']
+        )
         self.assertIn("✅ *Agendamento Confirmado!* ✅", mock_send_message.call_args[0][1])
         self.assertNotIn(self.sender_number, user_states) # State should be cleared
         
@@ -428,3 +464,28 @@ class ChatbotViewTest(TestCase):
         self.assertNotIn(self.sender_number, user_chats)
 
 
+
+    @patch('chatbot.views.AiUtils.send_whatsapp_message')
+    def test_find_specific_hairdresser_tolerates_typos_and_full_names(self, mock_send_message):
+        """Test the hairdresser name search matches typos, accents and full names."""
+        for typed_name in ["Joanna Sliva", "joana", "JOANA SILVA SANTOS", "Pédro"]:
+            user_states[self.sender_number] = 'find_specific_hairdresser'
+            payload = self._create_webhook_payload(typed_name)
+            response = self.client.post(self.evolution_api_url, data=payload, content_type='application/json')
+
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("Encontrei estes profissionais", mock_send_message.call_args[0][1])
+            self.assertEqual(user_states[self.sender_number], 'hairdresser_service_selection')
+
+        self.assertEqual(recommended_or_searched_hairdressers[self.sender_number], [self.hairdresser2.id])
+
+    @patch('chatbot.views.AiUtils.send_whatsapp_message')
+    def test_find_specific_hairdresser_no_match(self, mock_send_message):
+        """Test an unrelated name keeps the user in the search state."""
+        user_states[self.sender_number] = 'find_specific_hairdresser'
+        payload = self._create_webhook_payload("Xavier")
+        response = self.client.post(self.evolution_api_url, data=payload, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Não encontrei nenhum cabeleireiro", mock_send_message.call_args[0][1])
+        self.assertEqual(user_states[self.sender_number], 'find_specific_hairdresser')
@@ -4,7 +4,6 @@ import json
 import os
 import google.generativeai as genai
 from datetime import datetime
-from django.db.models import Q
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.views import APIView
@@ -13,9 +12,12 @@ from django.utils import timezone
 
 from users.models import User, Hairdresser, Customer
 from users.serializers import UserFullInfoSerializer
+from users.search import match_hairdresser_names
 from service.models import Service
 from reserve.models import Reserve
-from reserve.views import get_available_slots, create_new_reserve
+from reserve.views import get_available_slots, create_new_reserve, hold_chosen_slot
+from reserve.holds import HOLD_TTL, release_holds, whatsapp_holder
+from agenda.occupancy import LOCAL_TIMEZONE
 from availability.views import get_hairdresser_availability
 from .ai_utils import AiUtils
 from .response_messages import ResponseMessage
@@ -33,6 +35,10 @@ chosen_hairdresser = {}
 show_services= {}
 chosen_service = {}
 chosen_date = {}
+chosen_time = {}
+
+# Answers confirming the held slot
+CONFIRM_WORDS = ['sim', 's', 'confirmar', 'confirmo']
 
 class EvolutionApi(APIView):
     def post(self, request):
@@ -56,6 +62,8 @@ class EvolutionApi(APIView):
                     user_states.pop(sender_number, None)
                     user_chats.pop(sender_number, None)
                     user_preferences.pop(sender_number,None)
+                    chosen_time.pop(sender_number, None)
+                    release_holds(whatsapp_holder(sender_number))
                     AiUtils.send_whatsapp_message(sender_number, response_message)
                     return JsonResponse({"status": "ok"}, status=200)
 
@@ -67,6 +75,12 @@ class EvolutionApi(APIView):
                         if preferences:
                             user_preferences[sender_number] = preferences
                             matching_hairdressers = AiUtils.get_hairdressers_by_preferences(preferences, limit=5)
+                            # Returning customers also get what customers with the same bookings chose
+                            matching_ids = {h['hairdresser']['id'] for h in matching_hairdressers if h.get('hairdresser')}
+                            matching_hairdressers = list(matching_hairdressers) + [
+                                h for h in AiUtils.get_recommended_hairdressers(sender_number)
+                                if h['hairdresser']['id'] not in matching_ids
+                            ]
                             if matching_hairdressers:
                                 recommendation_model = AiUtils.create_gemini_model_for_recommendation(matching_hairdressers)
                                 recommendation_chat = recommendation_model.start_chat(history=[])
@@ -152,16 +166,11 @@ class EvolutionApi(APIView):
                 elif current_state == 'find_specific_hairdresser':
                     hairdresser_name = incoming_text.lower()
                     try:
-                        hairdressers = User.objects.filter(
-                            role='hairdresser'
-                        ).filter(
-                            Q(hairdresser__isnull=False) & (
-                                Q(first_name__icontains=hairdresser_name) |
-                                Q(last_name__icontains=hairdresser_name)
-                            )
-                         ).distinct()
+                        # Best fuzzy matches first, so typos and full names still find them
+                        matches = match_hairdresser_names(Hairdresser.objects.select_related('user'), incoming_text)
+                        hairdressers = [hairdresser.user for hairdresser in matches]
 
-                        if hairdressers.exists(): 
+                        if hairdressers: 
                             serialized_hairdressers = UserFullInfoSerializer(hairdressers, many=True).data 
                             response_message = "Encontrei estes profissionais:\n\n"
                             hairdresser_ids_for_next_state = [h['hairdresser']['id'] for h in serialized_hairdressers]
@@ -283,7 +292,11 @@ class EvolutionApi(APIView):
                         hairdresser_id = chosen_hairdresser[sender_number]
                         service_id = chosen_service[sender_number]
                         if hairdresser_id and service_id:
-                            result = get_available_slots(hairdresser_id,service_id,date_str_formatted)
+                            # Nothing is held yet, the slot the customer picks is held while they confirm it
+                            result = get_available_slots(
+                                hairdresser_id, service_id, date_str_formatted,
+                                holder=whatsapp_holder(sender_number)
+                            )
                             if "error" in result:
                                 response_message = f"Desculpe, ocorreu um erro: {result['error']}"
                             else:
@@ -306,46 +319,70 @@ class EvolutionApi(APIView):
                         hairdresser_id = chosen_hairdresser[sender_number]
                         service_id = chosen_service[sender_number]
                         selected_date_str = chosen_date[sender_number]
-                        selected_time_str = incoming_text
 
                         user = User.objects.get(phone=sender_number)
                         customer = Customer.objects.get(user=user)
 
-                        booking_datetime_naive = datetime.strptime(
-                            f"{selected_date_str} {selected_time_str}",
-                            '%Y-%m-%d %H:%M' 
-                        )
-                        booking_datetime_aware = timezone.make_aware(booking_datetime_naive)
-                        result = create_new_reserve(
-                            customer_id=customer.id,
-                            service_id=service_id,
-                            hairdresser_id=hairdresser_id,
-                            start_time_dt=booking_datetime_aware
-                        )
-                        if result.get('success'):
-                            service_info = Service.objects.get(id=service_id)
-                            hairdresser_info = Hairdresser.objects.get(id=hairdresser_id)
-                            
-                            response_message = (
-                                "✅ *Agendamento Confirmado!* ✅\n\n"
-                                f"Serviço: *{service_info.name}*\n"
-                                f"Profissional: *{hairdresser_info.user.first_name}*\n"
-                                f"Data: *{booking_datetime_aware.strftime('%d/%m/%Y')}*\n"
-                                f"Horário: *{booking_datetime_aware.strftime('%H:%M')}*\n\n"
-                                "Obrigado por usar o Hairmatch! O que mais posso fazer por você?"
+                        if incoming_text.lower() in CONFIRM_WORDS and sender_number in chosen_time:
+                            booking_datetime_aware = chosen_time[sender_number]
+                            result = create_new_reserve(
+                                customer_id=customer.id,
+                                service_id=service_id,
+                                hairdresser_id=hairdresser_id,
+                                start_time_dt=booking_datetime_aware
                             )
-                            # Cleanup state for the user
-                            user_states.pop(sender_number, None)
-                            chosen_hairdresser.pop(sender_number, None)
-                            show_services.pop(sender_number, None)
-                            chosen_service.pop(sender_number, None)
-                            chosen_date.pop(sender_number, None)
+                            if result.get('success'):
+                                service_info = Service.objects.get(id=service_id)
+                                hairdresser_info = Hairdresser.objects.get(id=hairdresser_id)
+
+                                response_message = (
+                                    "✅ *Agendamento Confirmado!* ✅\n\n"
+                                    f"Serviço: *{service_info.name}*\n"
+                                    f"Profissional: *{hairdresser_info.user.first_name}*\n"
+                                    f"Data: *{booking_datetime_aware.strftime('%d/%m/%Y')}*\n"
+                                    f"Horário: *{booking_datetime_aware.strftime('%H:%M')}*\n\n"
+                                    "Obrigado por usar o Hairmatch! O que mais posso fazer por você?"
+                                )
+                                # Cleanup state for the user
+                                user_states.pop(sender_number, None)
+                                chosen_hairdresser.pop(sender_number, None)
+                                show_services.pop(sender_number, None)
+                                chosen_service.pop(sender_number, None)
+                                chosen_date.pop(sender_number, None)
+                                chosen_time.pop(sender_number, None)
+                            else:
+                                # If booking failed (e.g., slot taken), inform the user
+                                chosen_time.pop(sender_number, None)
+                                response_message = result.get('error', 'Ocorreu um erro desconhecido.')
+                                response_message += "\n\nPor favor, escolha outro horário da lista, ou digite 'cancelar' para voltar."
+                                # Keep user in the same state to allow another attempt
                         else:
-                            # If booking failed (e.g., slot taken), inform the user
-                            response_message = result.get('error', 'Ocorreu um erro desconhecido.')
-                            response_message += "\n\nPor favor, escolha outro horário da lista, ou digite 'cancelar' para voltar."
-                            # Keep user in the same state to allow another attempt
-                     
+                            booking_datetime_naive = datetime.strptime(
+                                f"{selected_date_str} {incoming_text}",
+                                '%Y-%m-%d %H:%M' 
+                            )
+                            # Slots are listed in the salon's local time, so the typed time is local too
+                            booking_datetime_aware = booking_datetime_naive.replace(tzinfo=LOCAL_TIMEZONE)
+                            # The picked slot is held while the customer confirms it,
+                            # so nobody else can book it in between
+                            result = hold_chosen_slot(
+                                customer_id=customer.id,
+                                service_id=service_id,
+                                hairdresser_id=hairdresser_id,
+                                start_time_dt=booking_datetime_aware
+                            )
+                            if result.get('success'):
+                                chosen_time[sender_number] = booking_datetime_aware
+                                response_message = (
+                                    f"Reservei o horário *{booking_datetime_aware.strftime('%H:%M')}* de "
+                                    f"*{booking_datetime_aware.strftime('%d/%m/%Y')}* para você por "
+                                    f"{int(HOLD_TTL.total_seconds() // 60)} minutos.\n\n"
+                                    "Digite *sim* para confirmar o agendamento ou outro horário da lista."
+                                )
+                            else:
+                                chosen_time.pop(sender_number, None)
+                                response_message = result.get('error', 'Ocorreu um erro desconhecido.')
+                                response_message += "\n\nPor favor, escolha outro horário da lista, ou digite 'cancelar' para voltar."
                     except (ValueError, TypeError):
                         response_message = "Formato de hora inválido. Por favor, digite a hora como aparece na lista (ex: 14:30)."
                     except User.DoesNotExist:
@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hairmatch.settings')
 
 application = get_asgi_application()
+
+# Global search answers from an in-memory index and the home screen from the
+# rails snapshot, build them before the first request
+from users import home_feed, search_index  # noqa: E402
+search_index.warm()
+home_feed.warm()
@@ -35,6 +35,11 @@ EVOLUTION_API_URL=os.getenv('EVOLUTION_API_URL')
 EVOLUTION_API_KEY=os.getenv('EVOLUTION_API_KEY')
 EVOLUTION_INSTANCE_NAME=os.getenv('EVOLUTION_INSTANCE_NAME')
 
+# Preferences shown as rails on the customer home screen, comma separated
+HOME_FEED_RAILS = [name.strip() for name in os.getenv('HOME_FEED_RAILS', 'Coloração,Cachos,Barbearia,Tranças').split(',') if name.strip()]
+# Seconds after which a home screen request refreshes the rails in the background
+HOME_FEED_MAX_AGE = int(os.getenv('HOME_FEED_MAX_AGE', 300))
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -49,6 +54,7 @@ INSTALLED_APPS = [
     'rest_framework',
     'corsheaders',
     'django.contrib.admin',
+    'django.contrib.postgres',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
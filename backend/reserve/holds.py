@@ -0,0 +1,128 @@
+"""
+Temporary slot holds.
+
+While a customer is confirming a time, the slot they picked is held for
+HOLD_TTL, whether they picked it in the app (HoldSlot) or in the WhatsApp chat. Slot queries and bookings of anybody else
+treat active holds as busy time, and a booking made by the holder consumes the
+holds in the same transaction. Holds are never extended: an expired hold is
+simply ignored by every query and removed later by sweep_expired_holds.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from agenda.occupancy import local_day_start, span_masks
+from reserve.models import SlotHold
+from users.models import Customer, Hairdresser
+
+HOLD_TTL = timedelta(minutes=5)
+
+
+def customer_holder(customer_id):
+    return f'customer:{customer_id}'
+
+def whatsapp_holder(phone_number):
+    """
+    Holder of a WhatsApp conversation. A registered customer holds as
+    themselves, so their holds from the app and from the chat never block
+    each other; an unknown number holds under its own name.
+    """
+    customer_id = Customer.objects.filter(user__phone=phone_number).values_list('id', flat=True).first()
+    if customer_id is None:
+        return f'whatsapp:{phone_number}'
+    return customer_holder(customer_id)
+
+def active_holds(hairdresser_ids, window_start, window_end, exclude_holder=None):
+    """
+    Active holds of the given hairdressers overlapping [window_start, window_end).
+    Holds of exclude_holder are left out, since nobody is blocked by their own holds.
+    """
+    holds = SlotHold.objects.filter(
+        hairdresser_id__in=hairdresser_ids,
+        start_time__lt=window_end,
+        end_time__gt=window_start,
+        expires_at__gt=timezone.now()
+    )
+    if exclude_holder:
+        holds = holds.exclude(holder=exclude_holder)
+    return holds
+
+def held_spans(hairdresser_ids, window_start, window_end, exclude_holder=None):
+    """
+    Reads the active holds overlapping a window in one query.
+
+    Returns:
+        A dict mapping each hairdresser id to a list of (start, end) tuples.
+    """
+    spans = defaultdict(list)
+    for hairdresser_id, start, end in active_holds(
+        hairdresser_ids, window_start, window_end, exclude_holder
+    ).values_list('hairdresser_id', 'start_time', 'end_time'):
+        spans[hairdresser_id].append((start, end))
+    return spans
+
+def load_held_masks(hairdresser_ids, date_from, date_to, exclude_holder=None):
+    """
+    Reads the active holds of several hairdressers over a window of local days
+    in one query, as cells in the shape returned by load_busy_masks.
+    """
+    masks = defaultdict(int)
+    for hairdresser_id, spans in held_spans(
+        hairdresser_ids,
+        local_day_start(date_from),
+        local_day_start(date_to + timedelta(days=1)),
+        exclude_holder
+    ).items():
+        for start, end in spans:
+            for day, mask in span_masks(start, end):
+                masks[(hairdresser_id, day)] |= mask
+    return masks
+
+def is_held_by_others(hairdresser_id, start, end, holder=None):
+    return active_holds([hairdresser_id], start, end, exclude_holder=holder).exists()
+
+def place_holds(holder, hairdresser_id, service, start_times):
+    """
+    Replaces the holder's holds with one hold per start time. Start times
+    already held by somebody else are skipped.
+
+    Placement is serialized per hairdresser by locking its row, so two holders
+    cannot grab the same slot at once. Must run inside a transaction.
+
+    Returns:
+        The list of created SlotHold objects.
+    """
+    Hairdresser.objects.select_for_update().filter(id=hairdresser_id).first()
+
+    now = timezone.now()
+    SlotHold.objects.filter(Q(holder=holder) | Q(hairdresser_id=hairdresser_id, expires_at__lte=now)).delete()
+    if not start_times:
+        return []
+
+    duration = timedelta(minutes=service.duration)
+    spans = sorted((start, start + duration) for start in start_times)
+    taken = held_spans([hairdresser_id], spans[0][0], spans[-1][1]).get(hairdresser_id, [])
+
+    return SlotHold.objects.bulk_create([
+        SlotHold(
+            holder=holder,
+            hairdresser_id=hairdresser_id,
+            service=service,
+            start_time=start,
+            end_time=end,
+            expires_at=now + HOLD_TTL
+        )
+        for start, end in spans
+        if not any(taken_start < end and start < taken_end for taken_start, taken_end in taken)
+    ])
+
+def release_holds(holder):
+    return SlotHold.objects.filter(holder=holder).delete()[0]
+
+def sweep_expired_holds():
+    """
+    Deletes the expired holds. Returns the number of rows removed.
+    """
+    return SlotHold.objects.filter(expires_at__lte=timezone.now()).delete()[0]
@@ -0,0 +1,134 @@
+import random
+import statistics
+import time as timer
+from datetime import date, time, timedelta, datetime
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from agenda.models import Agenda, DayOccupancy
+from agenda.occupancy import rebuild_occupancy
+from availability.models import Availability
+from reserve.views import LOCAL_TIMEZONE, find_earliest_slots
+from service.models import Service
+from users.models import Hairdresser, User
+
+
+class Command(BaseCommand):
+    """
+    Seeds a throwaway catalogue of hairdressers inside a transaction that is
+    rolled back at the end and measures how long the earliest available slot
+    search takes to answer across all of them.
+    """
+
+    help = "Benchmarks the cross-hairdresser earliest available slot search"
+
+    WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+    SERVICE_NAMES = ["Corte de Cabelo", "Coloração", "Box Braids", "Hidratação", "Escova"]
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hairdressers", type=int, default=5000)
+        parser.add_argument("--bookings-per-hairdresser", type=int, default=4)
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--limit", type=int, default=10)
+
+    def handle(self, *args, **options):
+        target_date = date.today() + timedelta(days=1)
+
+        with transaction.atomic():
+            self.stdout.write(f"Seeding {options['hairdressers']} hairdressers...")
+            self.seed(options["hairdressers"], options["bookings_per_hairdresser"], target_date)
+            self.analyze()
+
+            services = Service.objects.filter(name__icontains="box braids")
+
+            timings = []
+            for _ in range(options["runs"]):
+                started_at = timer.perf_counter()
+                results = find_earliest_slots(
+                    services, target_date, time(8, 0), time(12, 0), options["limit"]
+                )
+                timings.append(timer.perf_counter() - started_at)
+
+            transaction.set_rollback(True)
+
+        median = statistics.median(timings)
+        self.stdout.write(
+            f"{len(results)} results | min {min(timings) * 1000:.1f}ms | "
+            f"median {median * 1000:.1f}ms | max {max(timings) * 1000:.1f}ms"
+        )
+        if median < 1:
+            self.stdout.write(self.style.SUCCESS("Earliest slot search stays under one second."))
+        else:
+            self.stdout.write(self.style.ERROR("Earliest slot search took more than one second."))
+
+    def analyze(self):
+        # Refresh the planner statistics so the seeded rows are planned like production data
+        with connection.cursor() as cursor:
+            for model in (User, Hairdresser, Availability, Service, Agenda, DayOccupancy):
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+    def seed(self, hairdresser_count, bookings_per_hairdresser, target_date):
+        users = User.objects.bulk_create(
+            User(
+                email=f"benchmark-{i}@hairmatch.test",
+                first_name="Benchmark",
+                last_name=str(i),
+                phone=f"55929{i:08d}",
+                neighborhood="Centro",
+                city="Manaus",
+                state="AM",
+                address="Rua do Benchmark",
+                postal_code="69000000",
+                role="hairdresser",
+            )
+            for i in range(hairdresser_count)
+        )
+        hairdressers = Hairdresser.objects.bulk_create(
+            Hairdresser(user=user, cnpj="00000000000000") for user in users
+        )
+
+        Availability.objects.bulk_create(
+            Availability(
+                hairdresser=hairdresser,
+                weekday=weekday,
+                start_time=time(random.choice([8, 9, 10]), 0),
+                end_time=time(18, 0),
+                break_start=time(12, 0),
+                break_end=time(13, 0),
+            )
+            for hairdresser in hairdressers
+            for weekday in self.WEEKDAYS
+        )
+
+        services = Service.objects.bulk_create(
+            Service(
+                name=name,
+                price=random.randint(40, 200),
+                duration=random.choice([30, 60, 90, 120]),
+                hairdresser=hairdresser,
+            )
+            for hairdresser in hairdressers
+            for name in self.SERVICE_NAMES
+        )
+
+        # Bookings start on distinct two-hour blocks so they never overlap (services last up to 2h)
+        day_start = datetime.combine(target_date, time(8, 0)).replace(tzinfo=LOCAL_TIMEZONE)
+        services_by_hairdresser = {}
+        for service in services:
+            services_by_hairdresser.setdefault(service.hairdresser_id, []).append(service)
+
+        agenda = []
+        for hairdresser_id, hairdresser_services in services_by_hairdresser.items():
+            for block in random.sample(range(5), min(bookings_per_hairdresser, 5)):
+                service = random.choice(hairdresser_services)
+                start_time = day_start + timedelta(hours=2 * block)
+                agenda.append(Agenda(
+                    start_time=start_time,
+                    end_time=start_time + timedelta(minutes=service.duration),
+                    hairdresser_id=hairdresser_id,
+                    service=service,
+                ))
+        Agenda.objects.bulk_create(agenda)
+        # bulk_create skips the Agenda signals, so the bitmaps are built in one go
+        rebuild_occupancy([hairdresser.id for hairdresser in hairdressers])
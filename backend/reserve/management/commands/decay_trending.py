@@ -0,0 +1,24 @@
+import time as timer
+
+from django.core.management.base import BaseCommand
+
+from reserve.trending import rebase
+
+
+class Command(BaseCommand):
+    """
+    Decays the trending scores of hairdressers and services to the present
+    and moves their epoch forward (reserve.trending). Scores stay correctly
+    ordered between runs; schedule it daily so the stored values stay close
+    to the decayed ones.
+    """
+
+    help = "Decays the trending scores and moves their epoch to now"
+
+    def handle(self, *args, **options):
+        started_at = timer.perf_counter()
+        hairdressers, services = rebase()
+        elapsed = timer.perf_counter() - started_at
+        self.stdout.write(self.style.SUCCESS(
+            f"Decayed the trending scores of {hairdressers} hairdressers and {services} services in {elapsed * 1000:.0f}ms"
+        ))
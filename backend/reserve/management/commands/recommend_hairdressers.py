@@ -0,0 +1,26 @@
+import time as timer
+
+from django.core.management.base import BaseCommand
+
+from reserve.recommendations import refresh_recommendations
+
+
+class Command(BaseCommand):
+    """
+    Adds the reservations made since the last run to the booking history and
+    recomputes the collaborative filtering recommendations of their
+    customers. Schedule it every few minutes, and with --full nightly.
+    """
+
+    help = "Refreshes the hairdressers recommended from the booking history"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Rebuild the booking history and recompute every customer")
+
+    def handle(self, *args, **options):
+        started_at = timer.perf_counter()
+        processed, customers = refresh_recommendations(full=options["full"])
+        elapsed = timer.perf_counter() - started_at
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {processed} reservations and recommended hairdressers to {customers} customers in {elapsed * 1000:.0f}ms"
+        ))
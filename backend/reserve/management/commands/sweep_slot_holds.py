@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from reserve.holds import sweep_expired_holds
+
+
+class Command(BaseCommand):
+    """
+    Deletes expired slot holds. Expired holds are already ignored by every
+    query, so this only keeps the table small; schedule it every few minutes.
+    """
+
+    help = "Deletes expired slot holds"
+
+    def handle(self, *args, **options):
+        removed = sweep_expired_holds()
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} expired slot holds"))
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.20 on 2026-10-18 13:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0002_service_description'),
+        ('users', '0004_user_profile_picture'),
+        ('reserve', '0003_reserve_end_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('holder', models.CharField(max_length=64)),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('expires_at', models.DateTimeField()),
+                ('hairdresser', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_holds', to='users.hairdresser')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_holds', to='service.service')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hairdresser', 'start_time'], name='slothold_hairdresser_start_idx'), models.Index(fields=['holder'], name='slothold_holder_idx'), models.Index(fields=['expires_at'], name='slothold_expires_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.20 on 2026-10-18 15:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_similar_hairdressers'),
+        ('reserve', '0004_slothold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommenderWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('last_reserve_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CustomerRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='users.customer')),
+                ('hairdresser', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_to', to='users.hairdresser')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CustomerHairdresserBookings',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bookings', models.PositiveIntegerField(default=0)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.customer')),
+                ('hairdresser', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.hairdresser')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='customerrecommendation',
+            constraint=models.UniqueConstraint(fields=('customer', 'rank'), name='customer_recommendation_rank_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='customerhairdresserbookings',
+            constraint=models.UniqueConstraint(fields=('customer', 'hairdresser'), name='customer_hairdresser_bookings_unique'),
+        ),
+    ]
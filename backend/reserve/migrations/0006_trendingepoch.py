@@ -0,0 +1,20 @@
+# Generated by Django 4.2.20 on 2026-10-18 15:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reserve', '0005_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingEpoch',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('epoch', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -1,7 +1,8 @@
 from django.db import models
+from datetime import timedelta
 from django.utils import timezone
 from review.models import Review
-from users.models import Customer
+from users.models import Customer, Hairdresser
 from service.models import Service
 
 # Create your models here.
@@ -10,4 +11,91 @@ class Reserve(models.Model):
     review = models.OneToOneField(Review, on_delete=models.DO_NOTHING, null=True, blank=True)
     customer = models.ForeignKey(Customer, on_delete=models.DO_NOTHING, null=False, blank=False)
     service = models.ForeignKey(Service,on_delete=models.DO_NOTHING, null=False, blank=False)
-    #user = models.ForeignKey(User, related_name='reserves', null=False, blank=False)
\ No newline at end of file
+    end_time = models.DateTimeField(null=True, blank=True)
+    #user = models.ForeignKey(User, related_name='reserves', null=False, blank=False)
+
+    class Meta:
+        indexes = [
+            # Serves the customer double-booking check, which only needs the
+            # reservations of one customer overlapping a given span
+            models.Index(fields=['customer', 'start_time', 'end_time'], name='reserve_customer_span_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.end_time is None and self.start_time is not None:
+            self.end_time = self.start_time + timedelta(minutes=self.service.duration)
+        super().save(*args, **kwargs)
+
+class SlotHold(models.Model):
+    """
+    A short-lived claim on a hairdresser's time placed while a customer is
+    picking a slot. Active holds of other holders count as busy time for slot
+    queries and bookings; expired rows are ignored and swept periodically.
+    """
+    holder = models.CharField(max_length=64, null=False, blank=False)
+    hairdresser = models.ForeignKey(Hairdresser, on_delete=models.CASCADE, related_name='slot_holds')
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='slot_holds')
+    start_time = models.DateTimeField(null=False, blank=False)
+    end_time = models.DateTimeField(null=False, blank=False)
+    expires_at = models.DateTimeField(null=False, blank=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hairdresser', 'start_time'], name='slothold_hairdresser_start_idx'),
+            models.Index(fields=['holder'], name='slothold_holder_idx'),
+            models.Index(fields=['expires_at'], name='slothold_expires_idx'),
+        ]
+
+class CustomerHairdresserBookings(models.Model):
+    """
+    Reservations of a customer with a hairdresser, accumulated from Reserve by
+    the recommend_hairdressers command (reserve.recommendations) up to its
+    watermark. Deleted reservations are subtracted by the reserve signals.
+    """
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='+')
+    hairdresser = models.ForeignKey(Hairdresser, on_delete=models.CASCADE, related_name='+')
+    bookings = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'hairdresser'], name='customer_hairdresser_bookings_unique'),
+        ]
+
+class CustomerRecommendation(models.Model):
+    """
+    A hairdresser recommended to a customer from the booking history of
+    customers who booked the same hairdressers. `rank` 1 is the best.
+    """
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='recommendations')
+    hairdresser = models.ForeignKey(Hairdresser, on_delete=models.CASCADE, related_name='recommended_to')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'rank'], name='customer_recommendation_rank_unique'),
+        ]
+
+class RecommenderWatermark(models.Model):
+    """
+    Last reservation the recommender has accumulated into
+    CustomerHairdresserBookings.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    last_reserve_id = models.BigIntegerField(default=0)
+
+class TrendingEpoch(models.Model):
+    """
+    Time the trending scores of hairdresser and services are stored relative
+    to (reserve.trending). Moved forward by the decay_trending command.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    epoch = models.DateTimeField()
+
+class CacheVersion(models.Model):
+    """
+    Version of a per-process cache shared by every process (reserve.versions).
+    Bumping it makes each process drop what it built from the previous one.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.BigIntegerField()
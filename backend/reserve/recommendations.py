@@ -0,0 +1,186 @@
+"""
+Collaborative filtering recommendations: customers who booked X also booked Y.
+
+Reservations are accumulated per (customer, hairdresser) in
+CustomerHairdresserBookings, incrementally from the reservations created since
+the last run (RecommenderWatermark). From those counts the recommender builds:
+- the sparse customer x hairdresser matrix, weighted 1 + log(bookings) so a
+  regular of one salon does not outweigh everyone else;
+- the item-item cosine similarity of its hairdresser columns, keeping the
+  SIMILAR_HAIRDRESSERS best of each hairdresser.
+
+A customer scores each hairdresser by the sum of its similarities with the
+hairdressers the customer booked, weighted the same way. Hairdressers the
+customer already booked are left out.
+
+The RECOMMENDATIONS best of each customer are stored in CustomerRecommendation,
+so the home screen and the chatbot read them with one indexed query. An
+incremental run recomputes the customers with new reservations. A full run
+rebuilds the counts from Reserve and recomputes everyone; schedule it nightly
+to pick up the similarity changes other customers caused, and reservations a
+slow transaction committed below the watermark.
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Exists, F, Max
+from django.db.models.functions import Greatest
+from scipy import sparse
+
+WATERMARK = 'collaborative_filtering'
+RECOMMENDATIONS = 20
+SIMILAR_HAIRDRESSERS = 50
+
+
+def interaction_matrix(counts):
+    """
+    (customer ids, hairdresser ids, CSR matrix) of (customer id, hairdresser
+    id, bookings) rows. Rows and columns follow the sorted ids.
+    """
+    customer_ids = sorted({customer_id for customer_id, _, _ in counts})
+    hairdresser_ids = sorted({hairdresser_id for _, hairdresser_id, _ in counts})
+    customer_row = {customer_id: row for row, customer_id in enumerate(customer_ids)}
+    hairdresser_column = {hairdresser_id: column for column, hairdresser_id in enumerate(hairdresser_ids)}
+
+    rows = np.fromiter((customer_row[customer_id] for customer_id, _, _ in counts), dtype=np.int64, count=len(counts))
+    columns = np.fromiter(
+        (hairdresser_column[hairdresser_id] for _, hairdresser_id, _ in counts), dtype=np.int64, count=len(counts),
+    )
+    bookings = np.fromiter((bookings for _, _, bookings in counts), dtype=np.float64, count=len(counts))
+    matrix = sparse.csr_matrix(
+        (1 + np.log(bookings), (rows, columns)), shape=(len(customer_ids), len(hairdresser_ids)),
+    )
+    return customer_ids, hairdresser_ids, matrix
+
+def item_similarity(matrix):
+    """
+    Cosine similarity between the hairdresser columns, as a CSR matrix
+    keeping the SIMILAR_HAIRDRESSERS most similar hairdressers of each row.
+    """
+    norms = np.sqrt(np.asarray(matrix.power(2).sum(axis=0)).ravel())
+    inverse_norms = np.divide(1, norms, out=np.zeros_like(norms), where=norms > 0)
+    normalized = matrix @ sparse.diags(inverse_norms)
+    similarity = (normalized.T @ normalized).tocsr()
+    similarity.setdiag(0)
+    similarity.eliminate_zeros()
+
+    data, indices, indptr = [], [], [0]
+    for row in range(similarity.shape[0]):
+        start, end = similarity.indptr[row], similarity.indptr[row + 1]
+        columns, values = similarity.indices[start:end], similarity.data[start:end]
+        # Most similar first and by column on ties
+        best = np.lexsort((columns, -values))[:SIMILAR_HAIRDRESSERS]
+        indices.append(columns[best])
+        data.append(values[best])
+        indptr.append(indptr[-1] + len(best))
+    return sparse.csr_matrix((np.concatenate(data), np.concatenate(indices), indptr), shape=similarity.shape)
+
+def recommend(matrix, similarity, rows):
+    """
+    {row: [(column, score)]} of the RECOMMENDATIONS best hairdresser columns
+    of the given customer rows, without the ones they booked.
+    """
+    booked = matrix[rows]
+    scores = (booked @ similarity).tocsr()
+
+    recommendations = {}
+    for position, row in enumerate(rows):
+        start, end = scores.indptr[position], scores.indptr[position + 1]
+        columns, values = scores.indices[start:end], scores.data[start:end]
+        kept = (values > 0) & ~np.isin(columns, booked.indices[booked.indptr[position]:booked.indptr[position + 1]])
+        columns, values = columns[kept], values[kept]
+        order = np.lexsort((columns, -values))[:RECOMMENDATIONS]
+        recommendations[row] = list(zip(columns[order].tolist(), values[order].tolist()))
+    return recommendations
+
+def _accumulate(after_id, up_to_id):
+    """
+    Adds the reservations with ids in (after_id, up_to_id] to the counts.
+    Returns (reservations added, their customer ids).
+    """
+    from reserve.models import CustomerHairdresserBookings, Reserve
+
+    new_counts = list(
+        Reserve.objects
+        .filter(id__gt=after_id, id__lte=up_to_id)
+        .values_list('customer_id', 'service__hairdresser_id')
+        .annotate(bookings=Count('id'))
+        .order_by()
+    )
+    if not new_counts:
+        return 0, set()
+
+    customer_ids = {customer_id for customer_id, _, _ in new_counts}
+    existing = {
+        (customer_id, hairdresser_id): bookings
+        for customer_id, hairdresser_id, bookings in CustomerHairdresserBookings.objects
+        .filter(customer_id__in=customer_ids)
+        .values_list('customer_id', 'hairdresser_id', 'bookings')
+    }
+    CustomerHairdresserBookings.objects.bulk_create(
+        (
+            CustomerHairdresserBookings(
+                customer_id=customer_id,
+                hairdresser_id=hairdresser_id,
+                bookings=existing.get((customer_id, hairdresser_id), 0) + bookings,
+            )
+            for customer_id, hairdresser_id, bookings in new_counts
+        ),
+        batch_size=5000,
+        update_conflicts=True,
+        unique_fields=['customer', 'hairdresser'],
+        update_fields=['bookings'],
+    )
+    return sum(bookings for _, _, bookings in new_counts), customer_ids
+
+def refresh_recommendations(full=False):
+    """
+    Accumulates the reservations made since the watermark and recomputes the
+    recommendations of their customers (of every customer with `full`).
+    Returns (reservations processed, customers recomputed).
+    """
+    from reserve.models import CustomerHairdresserBookings, CustomerRecommendation, RecommenderWatermark, Reserve
+
+    with transaction.atomic():
+        # Runs queue behind each other rather than counting reservations twice
+        watermark, _ = RecommenderWatermark.objects.select_for_update().get_or_create(name=WATERMARK)
+        last_reserve_id = Reserve.objects.aggregate(last=Max('id'))['last'] or 0
+        if full:
+            CustomerHairdresserBookings.objects.all().delete()
+        processed, customers = _accumulate(0 if full else watermark.last_reserve_id, last_reserve_id)
+        watermark.last_reserve_id = last_reserve_id
+        watermark.save(update_fields=['last_reserve_id'])
+
+        if full or customers:
+            counts = list(CustomerHairdresserBookings.objects.filter(bookings__gt=0).values_list('customer_id', 'hairdresser_id', 'bookings'))
+            customer_ids, hairdresser_ids, matrix = interaction_matrix(counts)
+            if full:
+                customers = set(customer_ids)
+                CustomerRecommendation.objects.all().delete()
+            else:
+                CustomerRecommendation.objects.filter(customer_id__in=customers).delete()
+
+            rows = [row for row, customer_id in enumerate(customer_ids) if customer_id in customers]
+            recommendations = recommend(matrix, item_similarity(matrix), rows) if rows else {}
+            CustomerRecommendation.objects.bulk_create(
+                (
+                    CustomerRecommendation(
+                        customer_id=customer_ids[row], hairdresser_id=hairdresser_ids[column], rank=rank, score=score,
+                    )
+                    for row, scored in recommendations.items()
+                    for rank, (column, score) in enumerate(scored, start=1)
+                ),
+                batch_size=5000,
+            )
+    return processed, len(customers)
+
+def forget_reserve(reserve):
+    """
+    Takes a deleted reservation out of the counts, if a run already added it.
+    """
+    from reserve.models import CustomerHairdresserBookings, RecommenderWatermark
+
+    CustomerHairdresserBookings.objects.filter(
+        Exists(RecommenderWatermark.objects.filter(name=WATERMARK, last_reserve_id__gte=reserve.id)),
+        customer_id=reserve.customer_id,
+        hairdresser_id=reserve.service.hairdresser_id,
+    ).update(bookings=Greatest(F('bookings') - 1, 0))
@@ -0,0 +1,67 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from agenda.models import Agenda
+from agenda.occupancy import span_masks
+from availability.models import Availability, AvailabilityOverride
+from reserve import recommendations, slot_cache, trending
+from reserve.models import Reserve
+from review.models import Review
+from users import search_index
+
+
+def _span_days(start, end):
+    if not start or not end or end <= start:
+        return []
+    return [day for day, _ in span_masks(start, end)]
+
+@receiver(post_save, sender=Agenda)
+def invalidate_slots_on_agenda_save(sender, instance, **kwargs):
+    days = _span_days(instance.start_time, instance.end_time)
+    # Set by the agenda occupancy signals when an existing booking is saved
+    previous_span = getattr(instance, '_previous_span', None)
+    if previous_span:
+        previous_hairdresser_id, previous_start, previous_end = previous_span
+        slot_cache.invalidate_days(previous_hairdresser_id, _span_days(previous_start, previous_end))
+    slot_cache.invalidate_days(instance.hairdresser_id, days)
+
+@receiver(post_delete, sender=Agenda)
+def invalidate_slots_on_agenda_delete(sender, instance, **kwargs):
+    slot_cache.invalidate_days(instance.hairdresser_id, _span_days(instance.start_time, instance.end_time))
+
+@receiver(post_save, sender=Reserve)
+@receiver(post_delete, sender=Reserve)
+def invalidate_slots_on_reserve_change(sender, instance, **kwargs):
+    hairdresser_id = instance.service.hairdresser_id
+    slot_cache.invalidate_days(hairdresser_id, _span_days(instance.start_time, instance.end_time))
+
+@receiver(post_save, sender=Reserve)
+@receiver(post_delete, sender=Reserve)
+def refresh_bookings_on_reserve_change(sender, instance, **kwargs):
+    # The search suggestions are ranked by booking counts
+    search_index.refresh_bookings(instance.service_id)
+
+@receiver(post_delete, sender=Reserve)
+def forget_booking_on_reserve_delete(sender, instance, **kwargs):
+    # Recommendations are computed from the accumulated bookings
+    recommendations.forget_reserve(instance)
+
+@receiver(post_save, sender=Reserve)
+def record_trending_booking(sender, instance, created, **kwargs):
+    if created:
+        trending.record_on_commit(instance.service.hairdresser_id, instance.service_id)
+
+@receiver(post_save, sender=Review)
+def record_trending_review(sender, instance, created, **kwargs):
+    if created:
+        trending.record_on_commit(instance.hairdresser_id, weight=trending.review_weight(instance.rating), at=instance.created_at)
+
+@receiver(post_save, sender=Availability)
+@receiver(post_delete, sender=Availability)
+def invalidate_slots_on_availability_change(sender, instance, **kwargs):
+    slot_cache.invalidate_hairdresser(instance.hairdresser_id)
+
+@receiver(post_save, sender=AvailabilityOverride)
+@receiver(post_delete, sender=AvailabilityOverride)
+def invalidate_slots_on_override_change(sender, instance, **kwargs):
+    slot_cache.invalidate_days(instance.hairdresser_id, [instance.date])
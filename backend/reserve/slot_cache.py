@@ -0,0 +1,148 @@
+"""
+Cache of the full-day slot lists of each (hairdresser, service duration, date).
+
+Entries are keyed by three version numbers: a global one, one per hairdresser
+and one per hairdresser-day. Writes never delete entries, they bump the
+version that covers them (see the reserve signals), which makes every entry
+of that scope unreachable at once whatever the service durations involved:
+
+- Agenda and Reserve writes bump the hairdresser-days they touch.
+- Availability writes bump the hairdresser.
+- Occupancy rebuilds bump the global version. They run in management
+  commands, outside the server processes, so that version is kept in the
+  database (reserve.versions) rather than in the cache, which is per process
+  unless a shared backend is configured.
+
+Cache bumps happen right away, so the writing transaction never reads its own
+stale entries, and once more on commit, so results cached by concurrent
+requests from the data before the commit are dropped as well. The global
+version is read by the writing transaction as soon as it is bumped, and by
+everybody else once it commits.
+
+Cached lists hold every slot of the day. The "past slots of today" filter is
+applied on read, so today's entries stay valid as time goes by. Days where
+somebody else holds a slot are computed without the cache, since holds are
+short-lived and specific to the viewer.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from reserve.versions import bump_version, get_version
+
+SLOT_CACHE_TIMEOUT = 60 * 60
+GLOBAL_VERSION_NAME = 'slots'
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'bypassed': 0}
+
+
+def _hairdresser_version_key(hairdresser_id):
+    return f'slots:version:{hairdresser_id}'
+
+def _day_version_key(hairdresser_id, day):
+    return f'slots:version:{hairdresser_id}:{day.isoformat()}'
+
+def _slots_key(versions, hairdresser_id, service_duration, day):
+    global_version, hairdresser_version, day_version = versions
+    return (
+        f'slots:{hairdresser_id}:{day.isoformat()}:{int(service_duration)}:'
+        f'{global_version}.{hairdresser_version}.{day_version}'
+    )
+
+def _versions(hairdresser_id, days):
+    """
+    Reads the versions covering each day, the global one from the database and
+    the others in one cache round-trip. Missing versions are initialised with
+    the current time rather than a constant, so an evicted version never
+    points back to entries written before it.
+    """
+    global_version = get_version(GLOBAL_VERSION_NAME)
+    keys = [_hairdresser_version_key(hairdresser_id)]
+    keys += [_day_version_key(hairdresser_id, day) for day in days]
+    cached_versions = cache.get_many(keys)
+
+    missing = {key: time.time_ns() for key in keys if key not in cached_versions}
+    if missing:
+        for key, value in missing.items():
+            cache.add(key, value, timeout=None)
+        cached_versions.update(cache.get_many(list(missing)))
+
+    return {
+        day: (
+            global_version,
+            cached_versions[_hairdresser_version_key(hairdresser_id)],
+            cached_versions[_day_version_key(hairdresser_id, day)],
+        )
+        for day in days
+    }
+
+def _count(name, amount=1):
+    if amount:
+        with _stats_lock:
+            _stats[name] += amount
+
+def get_days(hairdresser_id, service_duration, days):
+    """
+    Returns the cached full-day slot lists of the given days, as a dict mapping
+    each day found to its list, plus the version map to store misses with.
+    """
+    versions = _versions(hairdresser_id, days)
+    keys = {_slots_key(versions[day], hairdresser_id, service_duration, day): day for day in days}
+    found = cache.get_many(list(keys))
+
+    _count('hits', len(found))
+    _count('misses', len(keys) - len(found))
+    return {keys[key]: slots for key, slots in found.items()}, versions
+
+def set_days(hairdresser_id, service_duration, slots_by_day, versions):
+    cache.set_many(
+        {
+            _slots_key(versions[day], hairdresser_id, service_duration, day): slots
+            for day, slots in slots_by_day.items()
+        },
+        timeout=SLOT_CACHE_TIMEOUT
+    )
+
+def count_bypassed(amount):
+    _count('bypassed', amount)
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+def _bump_now_and_on_commit(keys):
+    keys = list(keys)
+    _bump(keys)
+    transaction.on_commit(lambda: _bump(keys))
+
+def invalidate_days(hairdresser_id, days):
+    _bump_now_and_on_commit(_day_version_key(hairdresser_id, day) for day in set(days))
+
+def invalidate_hairdresser(hairdresser_id):
+    _bump_now_and_on_commit([_hairdresser_version_key(hairdresser_id)])
+
+def invalidate_all():
+    bump_version(GLOBAL_VERSION_NAME)
+
+def stats():
+    """
+    Hit/miss counters of this process since it started (or since reset_stats).
+    Hits and misses count days; bypassed counts days computed without the
+    cache because of slot holds.
+    """
+    with _stats_lock:
+        current = dict(_stats)
+    lookups = current['hits'] + current['misses']
+    current['hit_rate'] = round(current['hits'] / lookups, 4) if lookups else None
+    return current
+
+def reset_stats():
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
@@ -1,4 +1,7 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+import threading
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
@@ -8,9 +11,22 @@ from django.utils import timezone
 
 from users.models import User, Customer, Hairdresser
 from service.models import Service
-from reserve.models import Reserve
+from reserve.models import CustomerHairdresserBookings, CustomerRecommendation, Reserve, SlotHold, TrendingEpoch
+from reserve.recommendations import refresh_recommendations
+from reserve import trending
+from review.models import Review
 from agenda.models import Agenda
-from availability.models import Availability
+from availability.models import Availability, AvailabilityOverride
+from preferences.models import Preferences
+from zoneinfo import ZoneInfo
+from django.core.management import call_command
+from io import StringIO
+from unittest.mock import patch
+from django.core.cache import cache
+from reserve import slot_cache
+from reserve.versions import get_version
+
+LOCAL_TIMEZONE = ZoneInfo("America/Manaus")
 
 
 class ReserveTestCase(TestCase):
@@ -102,7 +118,8 @@ class ReserveTestCase(TestCase):
             start_time=self.reserve_start_time,
             end_time=self.reserve_start_time + timedelta(minutes=self.service.duration),
             hairdresser=self.hairdresser,
-            service=self.service
+            service=self.service,
+            reserve=self.reserve
         )
 
 
@@ -149,6 +166,94 @@ class CreateReserveTest(ReserveTestCase):
         self.assertEqual(response.json()['error'], 'The hairdresser is not available during this time slot.')
         self.assertEqual(Reserve.objects.count(), 1)  # No new reserve created
         
+    def test_create_reserve_customer_overlap_other_hairdresser(self):
+        """Test that a customer cannot book two overlapping services with different hairdressers"""
+        other_hairdresser = Hairdresser.objects.create(
+            user=User.objects.create(
+                email="other.hairdresser@example.com",
+                first_name="Other",
+                last_name="Hairdresser",
+                phone="+5592984503333",
+                neighborhood="Downtown",
+                city="Manaus",
+                state="AM",
+                address="Hairdresser Street",
+                postal_code="69050750",
+                role="hairdresser"
+            ),
+            cnpj="12345678901313"
+        )
+        other_service = Service.objects.create(
+            name="Coloring",
+            price=80.00,
+            duration=60,
+            hairdresser=other_hairdresser
+        )
+        reserve_data = {
+            'start_time': (self.reserve_start_time + timedelta(minutes=30)).isoformat(),
+            'customer': self.customer.id,
+            'hairdresser': other_hairdresser.id,
+            'service': other_service.id
+        }
+
+        response = self.client.post(
+            self.create_url,
+            data=json.dumps(reserve_data),
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.json()['error'], 'Você já tem outra reserva agendada para o mesmo horário')
+        self.assertEqual(Reserve.objects.count(), 1)
+        self.assertEqual(Agenda.objects.count(), 1)
+
+    def test_create_reserve_stores_end_time(self):
+        """Test that a new reserve stores the end of its service"""
+        new_start_time = self.reserve_start_time + timedelta(hours=2)
+        reserve_data = {
+            'start_time': new_start_time.isoformat(),
+            'customer': self.customer.id,
+            'hairdresser': self.hairdresser.id,
+            'service': self.service.id
+        }
+
+        response = self.client.post(
+            self.create_url,
+            data=json.dumps(reserve_data),
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        reserve = Reserve.objects.get(start_time=new_start_time)
+        self.assertEqual(reserve.end_time, new_start_time + timedelta(minutes=self.service.duration))
+
+    def test_create_reserve_history_does_not_add_queries(self):
+        """Test that the double-booking check does not depend on the customer's history"""
+        Reserve.objects.bulk_create([
+            Reserve(
+                start_time=self.reserve_start_time - timedelta(days=day),
+                end_time=self.reserve_start_time - timedelta(days=day) + timedelta(minutes=self.service.duration),
+                customer=self.customer,
+                service=self.service
+            )
+            for day in range(1, 301)
+        ])
+        reserve_data = {
+            'start_time': (self.reserve_start_time + timedelta(hours=2)).isoformat(),
+            'customer': self.customer.id,
+            'hairdresser': self.hairdresser.id,
+            'service': self.service.id
+        }
+
+        with self.assertNumQueries(12):
+            response = self.client.post(
+                self.create_url,
+                data=json.dumps(reserve_data),
+                content_type='application/json'
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
     def test_create_reserve_invalid_customer(self):
         """Test reserve creation with non-existent customer"""
         new_start_time = self.reserve_start_time + timedelta(hours=2)
@@ -212,6 +317,575 @@ class CreateReserveTest(ReserveTestCase):
         self.assertEqual(response.json()['error'], 'Service not found')
 
 
+class BulkCreateReserveTest(ReserveTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bulk_url = reverse('create_bulk_reserve')
+        today = timezone.now().astimezone(LOCAL_TIMEZONE).date()
+        next_monday = today + timedelta(days=7 - today.weekday())
+        self.first_start = datetime.combine(next_monday, datetime.strptime("14:00", "%H:%M").time()).replace(tzinfo=LOCAL_TIMEZONE)
+
+    def post_bulk(self, **payload):
+        payload = {
+            'customer': self.customer.id,
+            'hairdresser': self.hairdresser.id,
+            'service': self.service.id,
+            **payload
+        }
+        return self.client.post(self.bulk_url, data=json.dumps(payload), content_type='application/json')
+
+    def weekly(self, count, **payload):
+        return self.post_bulk(
+            recurrence={'start_time': self.first_start.isoformat(), 'frequency': 'weekly', 'count': count},
+            **payload
+        )
+
+    def test_weekly_count_creates_every_occurrence(self):
+        """Test that a weekly recurrence books every occurrence with a linked agenda item"""
+        response = self.weekly(4)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.json()['data']['created']), 4)
+        self.assertEqual(response.json()['data']['conflicts'], [])
+        starts = sorted(Reserve.objects.exclude(id=self.reserve.id).values_list('start_time', flat=True))
+        self.assertEqual(starts, [self.first_start + timedelta(days=7 * week) for week in range(4)])
+        self.assertEqual(Agenda.objects.filter(reserve__in=Reserve.objects.exclude(id=self.reserve.id)).count(), 4)
+
+    def test_biweekly_until(self):
+        """Test that a biweekly recurrence stops at the until date"""
+        response = self.post_bulk(recurrence={
+            'start_time': self.first_start.isoformat(),
+            'frequency': 'biweekly',
+            'until': (self.first_start + timedelta(days=30)).strftime('%Y-%m-%d'),
+        })
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        created = [item['start_time'] for item in response.json()['data']['created']]
+        self.assertEqual(len(created), 3)
+
+    def test_booked_slots_leave_the_slot_list(self):
+        """Test that the occupancy is updated for bulk-created reservations"""
+        self.weekly(2)
+
+        response = self.client.post(
+            self.get_slots_url(self.hairdresser.id),
+            data=json.dumps({'service': self.service.id, 'date': self.first_start.strftime('%Y-%m-%d')}),
+            content_type='application/json'
+        )
+
+        self.assertNotIn('14:00', response.json()['available_slots'])
+        self.assertIn('15:00', response.json()['available_slots'])
+
+    def test_all_or_nothing_rejects_everything_on_conflict(self):
+        """Test that one conflicting occurrence rejects the whole batch by default"""
+        taken_start = self.first_start + timedelta(days=7, minutes=30)
+        Agenda.objects.create(
+            start_time=taken_start,
+            end_time=taken_start + timedelta(minutes=30),
+            hairdresser=self.hairdresser,
+            service=self.service
+        )
+
+        response = self.weekly(4)
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.json()['conflicts'], [{
+            'start_time': (self.first_start + timedelta(days=7)).isoformat(),
+            'reason': 'hairdresser_unavailable'
+        }])
+        self.assertEqual(Reserve.objects.count(), 1)
+
+    def test_best_effort_books_the_free_occurrences(self):
+        """Test that best-effort mode books what it can and reports the rest"""
+        taken_start = self.first_start + timedelta(days=14)
+        Agenda.objects.create(
+            start_time=taken_start,
+            end_time=taken_start + timedelta(minutes=60),
+            hairdresser=self.hairdresser,
+            service=self.service
+        )
+
+        response = self.weekly(4, mode='best_effort')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.json()['data']['created']), 3)
+        self.assertEqual(
+            [conflict['reason'] for conflict in response.json()['data']['conflicts']],
+            ['hairdresser_unavailable']
+        )
+
+    def test_explicit_start_times_conflicts(self):
+        """Test the per-occurrence reasons for an explicit list of start times"""
+        other_customer_reserve = self.first_start + timedelta(days=7)
+        Reserve.objects.create(start_time=other_customer_reserve, customer=self.customer, service=self.service)
+
+        response = self.post_bulk(
+            start_times=[
+                self.first_start.isoformat(),
+                (self.first_start + timedelta(minutes=30)).isoformat(),
+                (self.first_start + timedelta(days=1)).isoformat(),
+                other_customer_reserve.isoformat(),
+                (self.first_start - timedelta(days=14)).isoformat(),
+            ],
+            mode='best_effort'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.json()['data']['created']), 1)
+        reasons = {
+            conflict['start_time']: conflict['reason']
+            for conflict in response.json()['data']['conflicts']
+        }
+        self.assertEqual(reasons, {
+            (self.first_start + timedelta(minutes=30)).isoformat(): 'overlaps_occurrence',
+            (self.first_start + timedelta(days=1)).isoformat(): 'outside_working_hours',
+            other_customer_reserve.isoformat(): 'customer_unavailable',
+            (self.first_start - timedelta(days=14)).isoformat(): 'in_past',
+        })
+
+    def test_query_count_does_not_grow_with_occurrences(self):
+        """Test that validating and creating many occurrences takes as many queries as a few"""
+        with CaptureQueriesContext(connection) as few:
+            self.weekly(2)
+        Reserve.objects.exclude(id=self.reserve.id).delete()
+        with CaptureQueriesContext(connection) as many:
+            self.weekly(20)
+
+        self.assertEqual(Reserve.objects.count(), 21)
+        self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+
+    def test_too_many_occurrences(self):
+        """Test that recurrences longer than the limit are rejected"""
+        response = self.post_bulk(recurrence={
+            'start_time': self.first_start.isoformat(),
+            'frequency': 'weekly',
+            'until': (self.first_start + timedelta(days=7 * 60)).strftime('%Y-%m-%d'),
+        })
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Reserve.objects.count(), 1)
+
+    def test_invalid_recurrence(self):
+        """Test that a recurrence needs a known frequency and exactly one of count and until"""
+        response = self.post_bulk(recurrence={'start_time': self.first_start.isoformat(), 'frequency': 'daily', 'count': 3})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.post_bulk(recurrence={'start_time': self.first_start.isoformat(), 'frequency': 'weekly'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        for frequency in (['weekly'], {'every': 'week'}):
+            response = self.post_bulk(recurrence={'start_time': self.first_start.isoformat(), 'frequency': frequency, 'count': 3})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('frequency', response.json()['error'])
+
+class SlotHoldTest(ReserveTestCase):
+    def setUp(self):
+        super().setUp()
+        self.hold_url = reverse('hold_slot')
+        self.other_customer = Customer.objects.create(
+            user=User.objects.create(
+                email="other.customer@example.com",
+                first_name="Other",
+                last_name="Customer",
+                phone="+5592984504444",
+                neighborhood="Downtown",
+                city="Manaus",
+                state="AM",
+                address="Customer Street",
+                postal_code="69050750",
+                role="customer"
+            ),
+            cpf="10987654321"
+        )
+        today = timezone.now().astimezone(LOCAL_TIMEZONE).date()
+        self.next_monday = today + timedelta(days=7 - today.weekday())
+        self.slot_start = datetime.combine(self.next_monday, datetime.strptime("14:00", "%H:%M").time()).replace(tzinfo=LOCAL_TIMEZONE)
+
+    def hold(self, customer, start_time=None):
+        return self.client.post(
+            self.hold_url,
+            data=json.dumps({
+                'customer': customer.id,
+                'hairdresser': self.hairdresser.id,
+                'service': self.service.id,
+                'start_time': (start_time or self.slot_start).isoformat(),
+            }),
+            content_type='application/json'
+        )
+
+    def slots(self, customer=None):
+        payload = {'service': self.service.id, 'date': self.next_monday.strftime('%Y-%m-%d')}
+        if customer:
+            payload['customer'] = customer.id
+        response = self.client.post(
+            self.get_slots_url(self.hairdresser.id), data=json.dumps(payload), content_type='application/json'
+        )
+        return response.json()['available_slots']
+
+    def book(self, customer):
+        return self.client.post(
+            self.create_url,
+            data=json.dumps({
+                'start_time': self.slot_start.isoformat(),
+                'customer': customer.id,
+                'hairdresser': self.hairdresser.id,
+                'service': self.service.id
+            }),
+            content_type='application/json'
+        )
+
+    def test_held_slot_is_busy_for_others_only(self):
+        """Test that a held slot disappears for other customers but not for the holder"""
+        response = self.hold(self.customer)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('14:00', self.slots(self.other_customer))
+        self.assertNotIn('14:00', self.slots())
+        self.assertIn('14:00', self.slots(self.customer))
+
+    def test_cannot_hold_a_held_slot(self):
+        """Test that a second customer cannot hold an overlapping slot"""
+        self.hold(self.customer)
+
+        response = self.hold(self.other_customer, self.slot_start + timedelta(minutes=30))
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(SlotHold.objects.count(), 1)
+
+    def test_holder_books_and_hold_is_consumed(self):
+        """Test that the holder can book the held slot and the hold goes away"""
+        self.hold(self.customer)
+
+        self.assertEqual(self.book(self.other_customer).status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.book(self.customer).status_code, status.HTTP_201_CREATED)
+        self.assertFalse(SlotHold.objects.exists())
+
+    def test_expired_hold_is_ignored_and_swept(self):
+        """Test that an expired hold no longer blocks anybody and is removed by the sweeper"""
+        self.hold(self.customer)
+        SlotHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertIn('14:00', self.slots(self.other_customer))
+        self.assertEqual(self.book(self.other_customer).status_code, status.HTTP_201_CREATED)
+
+        out = StringIO()
+        call_command('sweep_slot_holds', stdout=out)
+        self.assertIn('Removed 1 expired slot holds', out.getvalue())
+        self.assertFalse(SlotHold.objects.exists())
+
+    def test_release_holds(self):
+        """Test that a customer can drop their holds"""
+        self.hold(self.customer)
+
+        response = self.client.delete(reverse('release_slot_holds', args=[self.customer.id]))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('14:00', self.slots(self.other_customer))
+
+    def test_new_hold_replaces_previous_one(self):
+        """Test that a customer only keeps the holds of their latest selection"""
+        self.hold(self.customer)
+        self.hold(self.customer, self.slot_start + timedelta(hours=1))
+
+        self.assertEqual(list(SlotHold.objects.values_list('start_time', flat=True)), [self.slot_start + timedelta(hours=1)])
+
+    def test_chatbot_holds_the_picked_slot_until_confirmed(self):
+        """Test that the chatbot listing holds nothing and the picked slot is held until it is booked"""
+        from reserve.holds import whatsapp_holder
+        from reserve.views import create_new_reserve, get_available_slots, hold_chosen_slot
+
+        holder = whatsapp_holder(self.customer_user.phone)
+        result = get_available_slots(self.hairdresser.id, self.service.id, self.next_monday.strftime('%Y-%m-%d'), holder=holder)
+
+        self.assertFalse(SlotHold.objects.exists())
+        self.assertEqual(self.slots(self.other_customer), result['available_slots'])
+
+        held = hold_chosen_slot(self.customer.id, self.service.id, self.hairdresser.id, self.slot_start)
+        self.assertTrue(held.get('success'))
+        self.assertNotIn('14:00', self.slots(self.other_customer))
+        self.assertEqual(self.book(self.other_customer).status_code, status.HTTP_409_CONFLICT)
+
+        created = create_new_reserve(self.customer.id, self.service.id, self.hairdresser.id, self.slot_start)
+        self.assertTrue(created.get('success'))
+        self.assertFalse(SlotHold.objects.exists())
+
+    def test_chatbot_cannot_hold_or_book_a_slot_held_by_others(self):
+        """Test that a slot held through HoldSlot is refused to the chatbot"""
+        from reserve.holds import customer_holder
+        from reserve.views import create_new_reserve, hold_chosen_slot
+
+        self.hold(self.other_customer)
+        self.assertIn('error', hold_chosen_slot(self.customer.id, self.service.id, self.hairdresser.id, self.slot_start))
+        self.assertIn('error', create_new_reserve(self.customer.id, self.service.id, self.hairdresser.id, self.slot_start))
+        self.assertEqual(list(SlotHold.objects.values_list('holder', flat=True)), [customer_holder(self.other_customer.id)])
+
+    def test_app_and_chat_holds_belong_to_the_same_customer(self):
+        """Test that a customer's hold from the app does not block them in the chat"""
+        from reserve.holds import customer_holder, whatsapp_holder
+        from reserve.views import create_new_reserve, get_available_slots
+
+        self.hold(self.customer)
+        self.assertEqual(whatsapp_holder(self.customer_user.phone), customer_holder(self.customer.id))
+        self.assertEqual(whatsapp_holder('+5500000000000'), 'whatsapp:+5500000000000')
+
+        result = get_available_slots(
+            self.hairdresser.id, self.service.id, self.next_monday.strftime('%Y-%m-%d'),
+            holder=whatsapp_holder(self.customer_user.phone),
+        )
+        self.assertIn('14:00', result['available_slots'])
+        created = create_new_reserve(self.customer.id, self.service.id, self.hairdresser.id, self.slot_start)
+        self.assertTrue(created.get('success'))
+
+class RecommendationTest(ReserveTestCase):
+    def setUp(self):
+        super().setUp()
+        self.hairdresser_2, self.service_2 = self.create_hairdresser(2)
+        self.hairdresser_3, self.service_3 = self.create_hairdresser(3)
+        self.customer_2, self.customer_3, self.customer_4 = (self.create_customer(i) for i in (2, 3, 4))
+
+        # Everyone booked the first hairdresser; two customers also booked the
+        # second one, one customer the third one twice
+        for customer, service in (
+            (self.customer_2, self.service), (self.customer_2, self.service_2),
+            (self.customer_3, self.service), (self.customer_3, self.service_3), (self.customer_3, self.service_3),
+            (self.customer_4, self.service), (self.customer_4, self.service_2),
+        ):
+            Reserve.objects.create(start_time=self.reserve_start_time, customer=customer, service=service)
+
+    def create_hairdresser(self, i):
+        user = User.objects.create(
+            email=f"hairdresser{i}@example.com", phone=f"+55929845{i:05d}", postal_code="69050750", role="hairdresser",
+        )
+        hairdresser = Hairdresser.objects.create(user=user, cnpj="12345678901212")
+        return hairdresser, Service.objects.create(name="Haircut", price=50, duration=60, hairdresser=hairdresser)
+
+    def create_customer(self, i):
+        user = User.objects.create(
+            email=f"customer{i}@example.com", phone=f"+55929846{i:05d}", postal_code="69050750", role="customer",
+        )
+        return Customer.objects.create(user=user, cpf="12345678901")
+
+    def recommended(self, customer):
+        return list(CustomerRecommendation.objects.filter(customer=customer).order_by('rank').values_list('hairdresser_id', flat=True))
+
+    def test_customers_who_booked_also_booked(self):
+        self.assertEqual(refresh_recommendations(full=True), (8, 4))
+
+        # The second hairdresser shares more customers with the first one
+        self.assertEqual(self.recommended(self.customer), [self.hairdresser_2.id, self.hairdresser_3.id])
+        # Booked hairdressers are left out
+        self.assertEqual(self.recommended(self.customer_2), [self.hairdresser_3.id])
+        self.assertEqual(self.recommended(self.customer_3), [self.hairdresser_2.id])
+
+    def test_incremental_refresh_since_watermark(self):
+        refresh_recommendations()
+        self.assertEqual(refresh_recommendations(), (0, 0))
+
+        Reserve.objects.create(start_time=self.reserve_start_time, customer=self.customer, service=self.service_2)
+        self.assertEqual(refresh_recommendations(), (1, 1))
+        self.assertEqual(self.recommended(self.customer), [self.hairdresser_3.id])
+
+        # Deleted reservations leave the history
+        self.reserve.delete()
+        bookings = CustomerHairdresserBookings.objects.get(customer=self.customer, hairdresser=self.hairdresser)
+        self.assertEqual(bookings.bookings, 0)
+        incremental = sorted(CustomerHairdresserBookings.objects.filter(bookings__gt=0).values_list('customer_id', 'hairdresser_id', 'bookings'))
+        refresh_recommendations(full=True)
+        self.assertEqual(incremental, sorted(CustomerHairdresserBookings.objects.values_list('customer_id', 'hairdresser_id', 'bookings')))
+
+
+class TrendingTest(ReserveTestCase):
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create(
+            email="hairdresser2@example.com", phone="+5592984500002", postal_code="69050750", role="hairdresser",
+        )
+        self.hairdresser_2 = Hairdresser.objects.create(user=user, cnpj="12345678901212")
+
+    def scores(self):
+        self.hairdresser.refresh_from_db()
+        self.hairdresser_2.refresh_from_db()
+        self.service.refresh_from_db()
+        return self.hairdresser.trending_score, self.hairdresser_2.trending_score, self.service.trending_score
+
+    def test_bookings_and_reviews_raise_scores(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Reserve.objects.create(start_time=self.reserve_start_time, customer=self.customer, service=self.service)
+            Reserve.objects.create(start_time=self.reserve_start_time + timedelta(days=1), customer=self.customer, service=self.service)
+            Review.objects.create(rating=4, customer=self.customer, hairdresser=self.hairdresser_2)
+
+        hairdresser, hairdresser_2, service = self.scores()
+        self.assertAlmostEqual(hairdresser, 2, places=3)
+        self.assertAlmostEqual(service, 2, places=3)
+        self.assertAlmostEqual(hairdresser_2, 0.8, places=3)
+
+    def test_failed_increment_keeps_the_booking(self):
+        with patch('reserve.trending.record', side_effect=RuntimeError('database gone')):
+            with self.captureOnCommitCallbacks(execute=True):
+                Reserve.objects.create(start_time=self.reserve_start_time, customer=self.customer, service=self.service)
+
+        self.assertEqual(Reserve.objects.filter(service=self.service).count(), 2)
+        self.assertEqual(self.scores(), (0, 0, 0))
+
+    def test_rebase_decays_every_score(self):
+        epoch = timezone.now() - 2 * trending.HALF_LIFE
+        TrendingEpoch.objects.create(name=trending.EPOCH, epoch=epoch)
+        trending.record(self.hairdresser.id, self.service.id, weight=4, at=epoch)
+        trending.record(self.hairdresser_2.id, at=epoch + trending.HALF_LIFE)
+
+        # Stored relative to the epoch: the later event weighs twice as much
+        self.assertEqual([round(score, 6) for score in self.scores()], [4, 2, 4])
+
+        self.assertEqual(trending.rebase(at=epoch + trending.HALF_LIFE), (2, 1))
+        self.assertEqual([round(score, 6) for score in self.scores()], [2, 1, 2])
+        self.assertEqual(TrendingEpoch.objects.get().epoch, epoch + trending.HALF_LIFE)
+
+        # Scores that decayed away are reset
+        self.assertEqual(trending.rebase(at=epoch + 20 * trending.HALF_LIFE), (0, 0))
+        self.assertEqual(self.scores(), (0, 0, 0))
+
+
+class SlotCacheTest(ReserveTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        slot_cache.reset_stats()
+        today = timezone.now().astimezone(LOCAL_TIMEZONE).date()
+        self.next_monday = today + timedelta(days=7 - today.weekday())
+
+    def slots(self, day):
+        response = self.client.post(
+            self.get_slots_url(self.hairdresser.id),
+            data=json.dumps({'service': self.service.id, 'date': day.strftime('%Y-%m-%d')}),
+            content_type='application/json'
+        )
+        return response.json()['available_slots']
+
+    def test_repeated_lookup_is_served_from_cache(self):
+        """Test that the second lookup of a day skips the availability and occupancy queries"""
+        # Created by the first lookup ever made
+        get_version(slot_cache.GLOBAL_VERSION_NAME)
+
+        with self.assertNumQueries(7):
+            first = self.slots(self.next_monday)
+        with self.assertNumQueries(4):
+            second = self.slots(self.next_monday)
+
+        self.assertEqual(first, second)
+        self.assertEqual(slot_cache.stats()['hits'], 1)
+        self.assertEqual(slot_cache.stats()['misses'], 1)
+
+    def test_agenda_write_invalidates_only_its_day(self):
+        """Test that a booking drops the cached slots of its day and keeps the other days"""
+        following_monday = self.next_monday + timedelta(days=7)
+        self.slots(self.next_monday)
+        self.slots(following_monday)
+        booking_start = datetime.combine(self.next_monday, datetime.strptime("14:00", "%H:%M").time()).replace(tzinfo=LOCAL_TIMEZONE)
+
+        Agenda.objects.create(
+            start_time=booking_start,
+            end_time=booking_start + timedelta(minutes=60),
+            hairdresser=self.hairdresser,
+            service=self.service
+        )
+        slot_cache.reset_stats()
+
+        self.assertNotIn('14:00', self.slots(self.next_monday))
+        self.assertIn('14:00', self.slots(following_monday))
+        self.assertEqual(slot_cache.stats()['misses'], 1)
+        self.assertEqual(slot_cache.stats()['hits'], 1)
+
+    def test_reserve_delete_invalidates_its_day(self):
+        """Test that cancelling a reservation frees its slot right away"""
+        booking_start = datetime.combine(self.next_monday, datetime.strptime("14:00", "%H:%M").time()).replace(tzinfo=LOCAL_TIMEZONE)
+        reserve = Reserve.objects.create(start_time=booking_start, customer=self.customer, service=self.service)
+        Agenda.objects.create(
+            start_time=booking_start,
+            end_time=booking_start + timedelta(minutes=60),
+            hairdresser=self.hairdresser,
+            service=self.service,
+            reserve=reserve
+        )
+        self.assertNotIn('14:00', self.slots(self.next_monday))
+
+        reserve.delete()
+
+        self.assertIn('14:00', self.slots(self.next_monday))
+
+    def test_availability_write_invalidates_hairdresser(self):
+        """Test that changing the working hours drops every cached day of the hairdresser"""
+        self.assertIn('16:00', self.slots(self.next_monday))
+
+        self.availability.end_time = datetime.strptime("15:00", "%H:%M").time()
+        self.availability.save()
+
+        self.assertNotIn('16:00', self.slots(self.next_monday))
+
+    def test_today_filters_past_slots_on_cache_hits(self):
+        """Test that a cached list of today still drops the slots that already started"""
+        morning = datetime.combine(self.next_monday, datetime.strptime("10:10", "%H:%M").time()).replace(tzinfo=LOCAL_TIMEZONE)
+
+        with patch('django.utils.timezone.now', return_value=morning):
+            self.assertEqual(self.slots(self.next_monday)[:3], ['10:30', '11:00', '13:00'])
+        with patch('django.utils.timezone.now', return_value=morning + timedelta(hours=3)):
+            self.assertEqual(self.slots(self.next_monday)[:2], ['13:30', '14:00'])
+
+        self.assertEqual(slot_cache.stats()['hits'], 1)
+
+    def test_override_changes_cached_day(self):
+        """Test that a date override replaces the weekly hours and drops the cached day"""
+        self.assertIn('09:00', self.slots(self.next_monday))
+
+        AvailabilityOverride.objects.create(hairdresser=self.hairdresser, date=self.next_monday, is_closed=True)
+        self.assertEqual(self.slots(self.next_monday), [])
+
+        AvailabilityOverride.objects.filter(date=self.next_monday).update(is_closed=False)
+        override = AvailabilityOverride.objects.get(date=self.next_monday)
+        override.start_time = datetime.strptime("18:00", "%H:%M").time()
+        override.end_time = datetime.strptime("20:00", "%H:%M").time()
+        override.save()
+        self.assertEqual(self.slots(self.next_monday), ['18:00', '18:30', '19:00'])
+
+        tuesday = self.next_monday + timedelta(days=1)
+        AvailabilityOverride.objects.create(
+            hairdresser=self.hairdresser,
+            date=tuesday,
+            start_time=datetime.strptime("09:00", "%H:%M").time(),
+            end_time=datetime.strptime("10:00", "%H:%M").time()
+        )
+        self.assertEqual(self.slots(tuesday), ['09:00'])
+
+    def test_rebuild_in_another_process_drops_cached_slots(self):
+        """Test that an occupancy rebuild run with a separate cache still reaches this process"""
+        from django.core.cache.backends.locmem import LocMemCache
+
+        self.assertIn('14:00', self.slots(self.next_monday))
+
+        # Rows written outside the ORM signals leave the occupancy and the cache stale
+        booking_start = datetime.combine(self.next_monday, datetime.strptime("14:00", "%H:%M").time()).replace(tzinfo=LOCAL_TIMEZONE)
+        Agenda.objects.bulk_create([Agenda(
+            start_time=booking_start,
+            end_time=booking_start + timedelta(minutes=60),
+            hairdresser=self.hairdresser,
+            service=self.service
+        )])
+        self.assertIn('14:00', self.slots(self.next_monday))
+
+        with patch('reserve.slot_cache.cache', LocMemCache('another-process', {})):
+            call_command('rebuild_occupancy', stdout=StringIO())
+
+        self.assertNotIn('14:00', self.slots(self.next_monday))
+
+    def test_stats_endpoint(self):
+        """Test that the counters are exposed"""
+        self.slots(self.next_monday)
+        self.slots(self.next_monday)
+
+        response = self.client.get(reverse('slot_cache_stats'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['data'], {'hits': 1, 'misses': 1, 'bypassed': 0, 'hit_rate': 0.5})
+
 class ListReserveTest(ReserveTestCase):
     def test_list_all_reserves(self):
         """Test listing all reserves"""
@@ -344,4 +1018,240 @@ class ReserveSlotTest(ReserveTestCase):
         )
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.json()['available_slots'], [])
\ No newline at end of file
+        self.assertEqual(response.json()['available_slots'], [])
+
+class ReserveSlotRangeTest(ReserveTestCase):
+    def setUp(self):
+        super().setUp()
+        today = timezone.now().date()
+        self.next_monday = today + timedelta(days=7 - today.weekday())
+
+    def post_range(self, date_from, date_to):
+        return self.client.post(
+            self.get_slots_url(self.hairdresser.id),
+            data=json.dumps({
+                'service': self.service.id,
+                'date_from': date_from.strftime('%Y-%m-%d'),
+                'date_to': date_to.strftime('%Y-%m-%d'),
+            }),
+            content_type='application/json'
+        )
+
+    def test_range_returns_day_keyed_slots(self):
+        """Test that range mode returns one entry per day of the window"""
+        response = self.post_range(self.next_monday, self.next_monday + timedelta(days=6))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        slots = response.json()['available_slots']
+        self.assertEqual(len(slots), 7)
+        self.assertEqual(
+            slots[self.next_monday.isoformat()],
+            ['09:00', '09:30', '10:00', '10:30', '11:00',
+             '13:00', '13:30', '14:00', '14:30', '15:00', '15:30', '16:00']
+        )
+        self.assertEqual(slots[(self.next_monday + timedelta(days=1)).isoformat()], [])
+
+    def test_range_skips_booked_periods(self):
+        """Test that bookings only block the slots of their own day"""
+        booking_start = datetime.combine(self.next_monday, datetime.min.time()).replace(
+            hour=10, tzinfo=LOCAL_TIMEZONE
+        )
+        Agenda.objects.create(
+            start_time=booking_start,
+            end_time=booking_start + timedelta(minutes=45),
+            hairdresser=self.hairdresser,
+            service=self.service
+        )
+
+        response = self.post_range(self.next_monday, self.next_monday + timedelta(days=7))
+
+        slots = response.json()['available_slots']
+        self.assertEqual(slots[self.next_monday.isoformat()][:3], ['09:00', '10:45', '13:00'])
+        self.assertIn('10:00', slots[(self.next_monday + timedelta(days=7)).isoformat()])
+
+    def test_range_query_count_does_not_grow_with_days(self):
+        """Test that a month costs the same number of queries as a single day"""
+        get_version(slot_cache.GLOBAL_VERSION_NAME)
+        with self.assertNumQueries(7):
+            self.post_range(self.next_monday, self.next_monday)
+        with self.assertNumQueries(7):
+            self.post_range(self.next_monday, self.next_monday + timedelta(days=29))
+
+    def test_range_too_long(self):
+        """Test that windows longer than the allowed maximum are rejected"""
+        response = self.post_range(self.next_monday, self.next_monday + timedelta(days=60))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_range_inverted_dates(self):
+        """Test that date_to before date_from is rejected"""
+        response = self.post_range(self.next_monday, self.next_monday - timedelta(days=1))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class EarliestSlotsTest(ReserveTestCase):
+    def setUp(self):
+        super().setUp()
+        self.earliest_url = reverse('get_earliest_slots')
+        today = timezone.now().date()
+        self.next_monday = today + timedelta(days=7 - today.weekday())
+
+        self.other_hairdresser_user = User.objects.create(
+            email="hairdresser2@example.com",
+            password="hairdresser123",
+            first_name="Other",
+            last_name="Hairdresser",
+            phone="+5592984503333",
+            neighborhood="Centro",
+            city="Manaus",
+            state="AM",
+            address="Other Street",
+            number="789",
+            postal_code="69050750",
+            role="hairdresser"
+        )
+        self.other_hairdresser = Hairdresser.objects.create(
+            user=self.other_hairdresser_user,
+            cnpj="12345678901313"
+        )
+        self.other_service = Service.objects.create(
+            name="Haircut Premium",
+            description="Premium haircut",
+            price=80.00,
+            duration=60,
+            hairdresser=self.other_hairdresser
+        )
+        Availability.objects.create(
+            hairdresser=self.other_hairdresser,
+            weekday="monday",
+            start_time=timezone.datetime.strptime("08:00", "%H:%M").time(),
+            end_time=timezone.datetime.strptime("12:00", "%H:%M").time()
+        )
+
+    def post_search(self, **filters):
+        payload = {'date': self.next_monday.strftime('%Y-%m-%d'), **filters}
+        return self.client.post(self.earliest_url, data=json.dumps(payload), content_type='application/json')
+
+    def test_earliest_slots_merged_across_hairdressers(self):
+        """Test that the earliest slots of every hairdresser are merged chronologically"""
+        response = self.post_search(service='haircut', limit=3)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = [
+            (datetime.fromisoformat(item['start_time']).astimezone(LOCAL_TIMEZONE).strftime('%H:%M'), item['hairdresser']['id'])
+            for item in response.json()['data']
+        ]
+        self.assertEqual(results, [
+            ('08:00', self.other_hairdresser.id),
+            ('08:30', self.other_hairdresser.id),
+            ('09:00', self.hairdresser.id),
+        ])
+
+    def test_earliest_slots_time_window(self):
+        """Test that slots outside the requested time window are ignored"""
+        response = self.post_search(service='haircut', time_from='10:30', time_to='11:00', limit=10)
+
+        results = {
+            (item['start_time'], item['service']['id'])
+            for item in response.json()['data']
+        }
+        self.assertEqual(len(results), 4)
+        for start_time, _ in results:
+            local_time = datetime.fromisoformat(start_time).astimezone(LOCAL_TIMEZONE).strftime('%H:%M')
+            self.assertIn(local_time, ['10:30', '11:00'])
+
+    def test_earliest_slots_by_preference(self):
+        """Test filtering hairdressers by preference"""
+        preference = Preferences.objects.create(name='Tranças')
+        self.other_hairdresser_user.preferences.add(preference)
+
+        response = self.post_search(preference='tranças', limit=10)
+
+        hairdresser_ids = {item['hairdresser']['id'] for item in response.json()['data']}
+        self.assertEqual(hairdresser_ids, {self.other_hairdresser.id})
+
+    def test_earliest_slots_requires_filter(self):
+        """Test that a preference or service filter is required"""
+        response = self.post_search()
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ConcurrentReserveTest(TransactionTestCase):
+    BOOKINGS = 50
+
+    def setUp(self):
+        hairdresser_user = User.objects.create(
+            email="hairdresser@example.com",
+            password="hairdresser123",
+            first_name="Test",
+            last_name="Hairdresser",
+            phone="+5592984502222",
+            neighborhood="Downtown",
+            city="Manaus",
+            state="AM",
+            address="Hairdresser Street",
+            postal_code="69050750",
+            role="hairdresser"
+        )
+        self.hairdresser = Hairdresser.objects.create(user=hairdresser_user, cnpj="12345678901212")
+        self.service = Service.objects.create(
+            name="Haircut",
+            price=50.00,
+            duration=60,
+            hairdresser=self.hairdresser
+        )
+        self.customers = [
+            Customer.objects.create(
+                user=User.objects.create(
+                    email=f"customer{i}@example.com",
+                    first_name="Test",
+                    last_name=f"Customer {i}",
+                    phone=f"+55929845{i:05d}",
+                    neighborhood="Downtown",
+                    city="Manaus",
+                    state="AM",
+                    address="Customer Street",
+                    postal_code="69050750",
+                    role="customer"
+                ),
+                cpf="12345678901"
+            )
+            for i in range(self.BOOKINGS)
+        ]
+        self.start_time = (timezone.now() + timedelta(days=2)).replace(hour=14, minute=0, second=0, microsecond=0)
+
+    def test_simultaneous_bookings_single_winner(self):
+        """Test that only one of many simultaneous bookings of the same slot succeeds"""
+        barrier = threading.Barrier(self.BOOKINGS)
+        status_codes = []
+
+        def book(customer):
+            try:
+                client = APIClient()
+                barrier.wait()
+                response = client.post(
+                    reverse('create_reserve'),
+                    data=json.dumps({
+                        'start_time': self.start_time.isoformat(),
+                        'customer': customer.id,
+                        'hairdresser': self.hairdresser.id,
+                        'service': self.service.id
+                    }),
+                    content_type='application/json'
+                )
+                status_codes.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book, args=(customer,)) for customer in self.customers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(status_codes.count(status.HTTP_201_CREATED), 1)
+        self.assertEqual(status_codes.count(status.HTTP_409_CONFLICT), self.BOOKINGS - 1)
+        self.assertEqual(Agenda.objects.count(), 1)
+        self.assertEqual(Reserve.objects.count(), 1)
@@ -0,0 +1,124 @@
+"""
+Time-decayed "em alta" (trending) scores of hairdressers and services.
+
+Every booking and review adds its weight (WEIGHTS) to the score of its
+hairdresser, bookings to the score of their service too, and the weight decays
+exponentially with a half-life of HALF_LIFE. Decaying every score on every
+read would rewrite the whole table, so scores are stored relative to an epoch
+(TrendingEpoch): an event at time t adds
+
+    weight * exp((t - epoch) / tau)
+
+and the score at time now is the stored one times exp(-(now - epoch) / tau).
+That factor is the same for every row, so ordering by the stored column (and
+its index) is ordering by the decayed score; a top-K read is an index scan.
+
+The exponent grows with the time since the epoch, so the decay_trending
+command moves the epoch to the present from time to time: one bulk UPDATE per
+table multiplies the scores by the decay since the previous epoch, and scores
+below MIN_SCORE are reset to zero to keep the scored rows few. The rebase
+locks the epoch row FOR UPDATE and increments read it FOR SHARE: increments
+do not wait for each other, and an increment is never scaled for an epoch its
+row was not rebased to.
+
+Increments run once the transaction of the booking or review commits (reserve
+signals), which keeps the row lock of a popular hairdresser out of the booking
+transaction. Cancelled bookings keep counting until they decay.
+"""
+import math
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+EPOCH = 'trending'
+HALF_LIFE = timedelta(days=7)
+WEIGHTS = {'booking': 1.0, 'review': 1.0}
+MAX_RATING = 5
+MIN_SCORE = 1e-3
+
+# Decay time constant, in seconds
+TAU = HALF_LIFE.total_seconds() / math.log(2)
+
+
+def _locked_epoch():
+    from reserve.models import TrendingEpoch
+
+    epoch, _ = TrendingEpoch.objects.select_for_update().get_or_create(
+        name=EPOCH, defaults={'epoch': timezone.now()},
+    )
+    return epoch
+
+def _shared_epoch():
+    """
+    The epoch, read FOR SHARE: a rebase waits for the increments reading it
+    and they wait for the rebase, but not for each other.
+    """
+    from reserve.models import TrendingEpoch
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT epoch FROM {TrendingEpoch._meta.db_table} WHERE name = %s FOR SHARE', [EPOCH])
+        row = cursor.fetchone()
+    # The first event creates it
+    return row[0] if row else _locked_epoch().epoch
+
+def review_weight(rating):
+    """
+    Weight of a review, a full weight for the best rating.
+    """
+    return WEIGHTS['review'] * max(rating or 0, 0) / MAX_RATING
+
+def record(hairdresser_id, service_id=None, weight=WEIGHTS['booking'], at=None):
+    """
+    Adds an event of `weight` at `at` (now by default) to the hairdresser and,
+    for bookings, to the service.
+    """
+    from service.models import Service
+    from users.models import Hairdresser
+
+    if weight <= 0:
+        return
+    at = at or timezone.now()
+    with transaction.atomic():
+        epoch = _shared_epoch()
+        increment = weight * math.exp((at - epoch).total_seconds() / TAU)
+        Hairdresser.objects.filter(id=hairdresser_id).update(trending_score=F('trending_score') + increment)
+        if service_id is not None:
+            Service.objects.filter(id=service_id).update(trending_score=F('trending_score') + increment)
+
+def record_on_commit(hairdresser_id, service_id=None, weight=WEIGHTS['booking'], at=None):
+    at = at or timezone.now()
+
+    def apply():
+        # The booking or review is committed already, a lost increment must
+        # not fail its request
+        try:
+            record(hairdresser_id, service_id, weight, at)
+        except Exception as e:
+            print(f"Trending score not recorded: {e}")
+    transaction.on_commit(apply)
+
+def rebase(at=None):
+    """
+    Decays every score to `at` (now by default) and makes it the epoch.
+    Returns (hairdressers, services) still scored.
+    """
+    from service.models import Service
+    from users.models import Hairdresser
+
+    at = at or timezone.now()
+    with transaction.atomic():
+        epoch = _locked_epoch()
+        # An epoch is never moved back
+        at = max(at, epoch.epoch)
+        decay = math.exp(-(at - epoch.epoch).total_seconds() / TAU)
+
+        scored = []
+        for model in (Hairdresser, Service):
+            model.objects.filter(trending_score__gt=0, trending_score__lt=MIN_SCORE / decay).update(trending_score=0)
+            scored.append(model.objects.filter(trending_score__gt=0).update(trending_score=F('trending_score') * decay))
+
+        epoch.epoch = at
+        epoch.save(update_fields=['epoch'])
+    return tuple(scored)
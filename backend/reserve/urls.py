@@ -1,10 +1,15 @@
 from django.urls import path
-from .views import CreateReserve, ListReserve, UpdateReserve, RemoveReserve, ReserveSlot, ReserveById
+from .views import CreateReserve, BulkCreateReserve, HoldSlot, ListReserve, UpdateReserve, RemoveReserve, ReserveSlot, ReserveById, EarliestSlots, SlotCacheStats
 
 urlpatterns = [
     path('<int:id>', ReserveById.as_view(), name='retrieve_reserve_by_id'),
     path('create', CreateReserve.as_view(), name='create_reserve'),
+    path('create/bulk', BulkCreateReserve.as_view(), name='create_bulk_reserve'),
+    path('hold', HoldSlot.as_view(), name='hold_slot'),
+    path('hold/<int:customer_id>', HoldSlot.as_view(), name='release_slot_holds'),
     path('slots/<int:hairdresser_id>', ReserveSlot.as_view(), name="get_slots"),
+    path('slots/earliest', EarliestSlots.as_view(), name="get_earliest_slots"),
+    path('slots/cache/stats', SlotCacheStats.as_view(), name="slot_cache_stats"),
     path('list/<int:customer_id>', ListReserve.as_view(), name='list_reserve'),
     path('list', ListReserve.as_view(), name='list_reserve'),
     #path('update/<int:reserve_id>', UpdateReserve.as_view(), name='update_reserve'),
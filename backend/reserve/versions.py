@@ -0,0 +1,31 @@
+"""
+Cache versions shared by every process through the database.
+
+The Django cache is per process unless a shared backend is configured, so a
+version bumped in it by a management command never reaches the running
+servers. Versions that must cross processes are rows of CacheVersion instead:
+readers compare the stored version with the one their cached data was built
+from, and a bump is one UPDATE that becomes visible when its transaction
+commits.
+"""
+import time
+
+from django.db.models import F
+
+from reserve.models import CacheVersion
+
+
+def get_version(name):
+    """
+    The current version of `name`. A missing version is initialised with the
+    current time rather than a constant, so it never points back to data
+    cached before it.
+    """
+    version = CacheVersion.objects.filter(name=name).values_list('version', flat=True).first()
+    if version is None:
+        version = CacheVersion.objects.get_or_create(name=name, defaults={'version': time.time_ns()})[0].version
+    return version
+
+def bump_version(name):
+    CacheVersion.objects.get_or_create(name=name, defaults={'version': time.time_ns()})
+    CacheVersion.objects.filter(name=name).update(version=F('version') + 1)
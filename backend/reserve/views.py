@@ -1,5 +1,10 @@
 from django.shortcuts import render
-from datetime import timedelta, datetime, timezone
+from datetime import timedelta, datetime, time, timezone
+from collections import defaultdict
+from itertools import islice
+import heapq
+import operator
+from functools import reduce
 from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -8,17 +13,34 @@ from django.http import JsonResponse
 from users.models import User, Customer, Hairdresser
 from reserve.models import Reserve
 from reserve.serializers import ReserveSerializer, ReserveFullInfoSerializer
+from users.serializers import HairdresserNameSerializer
+from service.serializers import ServiceSerializer
 from service.models import Service
-from agenda.models import Agenda
+from agenda.models import Agenda, is_agenda_overlap_error
+from agenda.occupancy import (
+    LOCAL_TIMEZONE, free_intervals_from_mask, is_hairdresser_free, load_busy_masks,
+    load_day_masks, local_day_start, mark_busy_many, span_masks, working_mask
+)
+from reserve import slot_cache, trending
+from reserve.holds import (
+    customer_holder, held_spans, is_held_by_others, load_held_masks, place_holds, release_holds
+)
 from availability.models import Availability
+from availability.schedule import compile_calendar, compile_calendars
 import calendar
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from rest_framework import status
 from django.utils.dateparse import parse_datetime
-from zoneinfo import ZoneInfo
 
 # Create your views here.
-LOCAL_TIMEZONE = ZoneInfo('America/Manaus')
+SLOT_STEP_MINUTES = 30
+MAX_SLOT_RANGE_DAYS = 60
+MAX_EARLIEST_SLOTS = 50
+MAX_BULK_OCCURRENCES = 52
+RECURRENCE_STEP_DAYS = {'weekly': 7, 'biweekly': 14}
+BULK_MODES = ('all_or_nothing', 'best_effort')
+
 class ReserveById(APIView):
     def get(self, request, id=None):
     
@@ -64,47 +86,57 @@ class CreateReserve(APIView):
              start_time = timezone.make_aware(start_time)
 
         end_time = calculate_end_time(start_time, service_instance.duration)
-        hairdresser_overlap = Agenda.objects.filter(
-            hairdresser=hairdresser_instance,
-            start_time__lt=end_time,
-            end_time__gt=start_time
-        ).exists()
-
-        if hairdresser_overlap:
-            return JsonResponse(
-                {'error': 'The hairdresser is not available during this time slot.'},
-                status=status.HTTP_409_CONFLICT
-            )
-
-        customer_reservations = Reserve.objects.filter(customer=customer_instance).select_related('service')
-        for reservation in customer_reservations:
-            existing_start = reservation.start_time
-
-            if timezone.is_naive(existing_start):
-                existing_start = timezone.make_aware(existing_start)
-            
-            existing_end = calculate_end_time(existing_start, reservation.service.duration)
-            
-            if existing_start < end_time and start_time < existing_end:
-                 return JsonResponse(
-                     {'error': 'Você já tem outra reserva agendada para o mesmo horário'},
-                     status=status.HTTP_409_CONFLICT
-                 )
 
+        holder = customer_holder(customer_instance.id)
         try:
             with transaction.atomic():
-                Reserve.objects.create(
+                if is_held_by_others(hairdresser_instance.id, start_time, end_time, holder):
+                    return JsonResponse(
+                        {'error': 'This time slot is being held by another customer.'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+
+                reserve = Reserve.objects.create(
                     start_time=start_time,
+                    end_time=end_time,
                     customer=customer_instance,
                     service=service_instance,
                 )
-                
+
+                # The agenda insert comes before the customer check so the hairdresser's
+                # exclusion constraint decides concurrent bookings of the same slot
                 Agenda.objects.create(
                     start_time=start_time,
                     end_time=end_time,
                     hairdresser=hairdresser_instance,
-                    service=service_instance
+                    service=service_instance,
+                    reserve=reserve
                 )
+
+                has_overlapping_reserve = Reserve.objects.filter(
+                    customer=customer_instance,
+                    start_time__lt=end_time,
+                    end_time__gt=start_time
+                ).exclude(id=reserve.id).exists()
+                if has_overlapping_reserve:
+                    transaction.set_rollback(True)
+                    return JsonResponse(
+                        {'error': 'Você já tem outra reserva agendada para o mesmo horário'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+
+                release_holds(holder)
+        except IntegrityError as e:
+            # Overlapping bookings are rejected by the agenda exclusion constraint
+            if is_agenda_overlap_error(e):
+                return JsonResponse(
+                    {'error': 'The hairdresser is not available during this time slot.'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            return JsonResponse(
+                {'error': f'An error occurred while saving the reservation: {e}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
         except Exception as e:
             return JsonResponse(
                 {'error': f'An error occurred while saving the reservation: {e}'},
@@ -113,6 +145,203 @@ class CreateReserve(APIView):
             
         return JsonResponse({'message': 'Reserve created successfully'}, status=status.HTTP_201_CREATED)     
 
+class BulkCreateReserve(APIView):
+    def post(self, request):
+        try:
+            data = json.loads(request.body)
+            customer_id = data['customer']
+            hairdresser_id = data['hairdresser']
+            service_id = data['service']
+            mode = data.get('mode', 'all_or_nothing')
+            if 'start_times' in data:
+                start_times = [parse_datetime(value) for value in data['start_times']]
+            else:
+                recurrence = data['recurrence']
+                recurrence_start = parse_datetime(recurrence['start_time'])
+                frequency = recurrence['frequency']
+                count = int(recurrence['count']) if recurrence.get('count') is not None else None
+                until = datetime.strptime(recurrence['until'], '%Y-%m-%d').date() if recurrence.get('until') else None
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            return JsonResponse({'error': f'Invalid request body: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return JsonResponse(
+                {'error': "Invalid payload. Use ISO datetimes, YYYY-MM-DD for 'until' and an integer 'count'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if mode not in BULK_MODES:
+            return JsonResponse({'error': f'"mode" must be one of: {", ".join(BULK_MODES)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if 'start_times' not in data:
+            # A list or object would not even be hashable for the lookup
+            if not isinstance(frequency, str) or frequency not in RECURRENCE_STEP_DAYS:
+                return JsonResponse(
+                    {'error': f'"frequency" must be one of: {", ".join(RECURRENCE_STEP_DAYS)}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if (count is None) == (until is None):
+                return JsonResponse({'error': 'Exactly one of "count" and "until" is required.'}, status=status.HTTP_400_BAD_REQUEST)
+            if count is not None and not 0 < count <= MAX_BULK_OCCURRENCES:
+                return JsonResponse(
+                    {'error': f'"count" must be between 1 and {MAX_BULK_OCCURRENCES}.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            start_times = [recurrence_start]
+
+        if not start_times or None in start_times:
+            return JsonResponse(
+                {'error': "Invalid datetime format. Expected ISO format like '2025-04-26T14:30:00Z'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        start_times = [
+            timezone.make_aware(start_time) if timezone.is_naive(start_time) else start_time
+            for start_time in start_times
+        ]
+        if 'start_times' not in data:
+            start_times = expand_recurrence(start_times[0], frequency, count, until)
+        if len(start_times) > MAX_BULK_OCCURRENCES:
+            return JsonResponse(
+                {'error': f'A bulk reservation cannot exceed {MAX_BULK_OCCURRENCES} occurrences.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            customer_instance = Customer.objects.get(id=customer_id)
+            hairdresser_instance = Hairdresser.objects.get(id=hairdresser_id)
+            service_instance = Service.objects.get(id=service_id)
+        except Customer.DoesNotExist:
+            return JsonResponse({'error': 'Customer not found'}, status=status.HTTP_404_NOT_FOUND)
+        except Service.DoesNotExist:
+            return JsonResponse({'error': 'Service not found'}, status=status.HTTP_404_NOT_FOUND)
+        except Hairdresser.DoesNotExist:
+            return JsonResponse({'error': 'Hairdresser not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        conflicts = find_occurrence_conflicts(
+            hairdresser_instance.id, customer_instance.id, service_instance.duration, start_times
+        )
+        conflict_list = [
+            {'start_time': start_time.isoformat(), 'reason': reason}
+            for start_time, reason in sorted(conflicts.items())
+        ]
+        bookable = sorted(set(start_times) - set(conflicts))
+        if not bookable or (conflicts and mode == 'all_or_nothing'):
+            return JsonResponse(
+                {'error': 'Some occurrences cannot be booked.', 'conflicts': conflict_list},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        duration = timedelta(minutes=service_instance.duration)
+        try:
+            with transaction.atomic():
+                reserves = Reserve.objects.bulk_create([
+                    Reserve(
+                        start_time=start_time,
+                        end_time=start_time + duration,
+                        customer=customer_instance,
+                        service=service_instance
+                    )
+                    for start_time in bookable
+                ])
+                # bulk_create skips the signals, so the occupancy and the slot cache are updated here
+                Agenda.objects.bulk_create([
+                    Agenda(
+                        start_time=reserve.start_time,
+                        end_time=reserve.end_time,
+                        hairdresser=hairdresser_instance,
+                        service=service_instance,
+                        reserve=reserve
+                    )
+                    for reserve in reserves
+                ])
+                spans = [(reserve.start_time, reserve.end_time) for reserve in reserves]
+                mark_busy_many(hairdresser_instance.id, spans)
+                slot_cache.invalidate_days(
+                    hairdresser_instance.id, [day for span in spans for day, _ in span_masks(*span)]
+                )
+                trending.record_on_commit(
+                    hairdresser_instance.id, service_instance.id, weight=trending.WEIGHTS['booking'] * len(reserves)
+                )
+        except IntegrityError as e:
+            # A concurrent booking took one of the slots after the checks above
+            if is_agenda_overlap_error(e):
+                return JsonResponse(
+                    {'error': 'The hairdresser is not available during this time slot.'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            return JsonResponse(
+                {'error': f'An error occurred while saving the reservations: {e}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        return JsonResponse({
+            'data': {
+                'created': ReserveSerializer(reserves, many=True).data,
+                'conflicts': conflict_list,
+            }
+        }, status=status.HTTP_201_CREATED)
+
+class HoldSlot(APIView):
+    def post(self, request):
+        try:
+            data = json.loads(request.body)
+            customer_id = data['customer']
+            hairdresser_id = data['hairdresser']
+            service_id = data['service']
+            start_time_str = data['start_time']
+        except (json.JSONDecodeError, KeyError) as e:
+            return JsonResponse({'error': f'Invalid request body: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            customer_instance = Customer.objects.get(id=customer_id)
+            hairdresser_instance = Hairdresser.objects.get(id=hairdresser_id)
+            service_instance = Service.objects.get(id=service_id)
+        except Customer.DoesNotExist:
+            return JsonResponse({'error': 'Customer not found'}, status=status.HTTP_404_NOT_FOUND)
+        except Service.DoesNotExist:
+            return JsonResponse({'error': 'Service not found'}, status=status.HTTP_404_NOT_FOUND)
+        except Hairdresser.DoesNotExist:
+            return JsonResponse({'error': 'Hairdresser not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        start_time = parse_datetime(start_time_str)
+        if not start_time:
+            return JsonResponse(
+                {'error': "Invalid datetime format. Expected ISO format like '2025-04-26T14:30:00Z'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if timezone.is_naive(start_time):
+            start_time = timezone.make_aware(start_time)
+        end_time = calculate_end_time(start_time, service_instance.duration)
+
+        if start_time < timezone.now() or not is_hairdresser_free(hairdresser_instance.id, start_time, end_time):
+            return JsonResponse(
+                {'error': 'The hairdresser is not available during this time slot.'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        with transaction.atomic():
+            holds = place_holds(
+                customer_holder(customer_instance.id), hairdresser_instance.id, service_instance, [start_time]
+            )
+        if not holds:
+            return JsonResponse(
+                {'error': 'This time slot is being held by another customer.'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        hold = holds[0]
+        return JsonResponse({
+            'data': {
+                'id': hold.id,
+                'start_time': hold.start_time.isoformat(),
+                'end_time': hold.end_time.isoformat(),
+                'expires_at': hold.expires_at.isoformat(),
+            }
+        }, status=status.HTTP_201_CREATED)
+
+    def delete(self, request, customer_id):
+        released = release_holds(customer_holder(customer_id))
+        return JsonResponse({'data': f'{released} hold(s) released'}, status=200)
+
 class ListReserve(APIView):
     def get(self, request, customer_id=None):
         if(customer_id):
@@ -149,10 +378,14 @@ class ReserveSlot(APIView):
         try:
             data = json.loads(request.body)
             service_id = data['service']
-            date_str = data['date']
-            selected_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+            is_range = 'date_from' in data or 'date_to' in data
+            if is_range:
+                date_from = datetime.strptime(data['date_from'], '%Y-%m-%d').date()
+                date_to = datetime.strptime(data['date_to'], '%Y-%m-%d').date()
+            else:
+                date_from = date_to = datetime.strptime(data['date'], '%Y-%m-%d').date()
         except (json.JSONDecodeError, KeyError):
-            return JsonResponse({'error': 'Invalid payload. "service" and "date" are required.'}, status=400)
+            return JsonResponse({'error': 'Invalid payload. "service" and "date" (or "date_from" and "date_to") are required.'}, status=400)
         except ValueError:
             return JsonResponse({'error': 'Invalid date format. Please use YYYY-MM-DD.'}, status=400)
 
@@ -164,41 +397,72 @@ class ReserveSlot(APIView):
         except Service.DoesNotExist:
             return JsonResponse({'error': 'Service not found'}, status=404)
 
-        weekday_name = calendar.day_name[selected_date.weekday()]
-        availability = Availability.objects.filter(
-            hairdresser=hairdresser,
-            weekday=weekday_name.lower()
-        ).first()
-
-        if not availability:
-            return JsonResponse({'available_slots': []})
-
-        now = timezone.now()
-        is_today = (selected_date == now.date())
-
-        start_of_day = timezone.make_aware(datetime.combine(selected_date, datetime.min.time()))
-        end_of_day = timezone.make_aware(datetime.combine(selected_date, datetime.max.time()))
-
-        bookings = Agenda.objects.filter(
-            hairdresser=hairdresser,
-            start_time__lt=end_of_day,
-            end_time__gt=start_of_day
-        ).order_by('start_time')
-
-        available_slots = generate_time_slots(
-            selected_date,
-            availability.start_time,
-            availability.end_time,
-            bookings,
-            service.duration,
-            availability.break_start,
-            availability.break_end,
-
-            now_dt=now if is_today else None
-        )
+        if date_to < date_from:
+            return JsonResponse({'error': '"date_to" must not be before "date_from".'}, status=400)
+        if (date_to - date_from).days + 1 > MAX_SLOT_RANGE_DAYS:
+            return JsonResponse({'error': f'The date range cannot exceed {MAX_SLOT_RANGE_DAYS} days.'}, status=400)
+
+        # A customer never has their own holds hidden from them
+        holder = customer_holder(data['customer']) if data.get('customer') else None
+        slots_by_day = generate_slots_for_range(hairdresser, service.duration, date_from, date_to, holder=holder)
 
-        return JsonResponse({'available_slots': available_slots})
+        if is_range:
+            return JsonResponse({
+                'available_slots': {day.isoformat(): slots for day, slots in slots_by_day.items()}
+            })
+        return JsonResponse({'available_slots': slots_by_day[date_from]})
     
+class EarliestSlots(APIView):
+    def post(self, request):
+        try:
+            data = json.loads(request.body)
+            selected_date = datetime.strptime(data['date'], '%Y-%m-%d').date()
+            time_from = datetime.strptime(data['time_from'], '%H:%M').time() if data.get('time_from') else None
+            time_to = datetime.strptime(data['time_to'], '%H:%M').time() if data.get('time_to') else None
+            limit = int(data.get('limit', 5))
+        except (json.JSONDecodeError, KeyError):
+            return JsonResponse({'error': 'Invalid payload. "date" is required.'}, status=400)
+        except (ValueError, TypeError):
+            return JsonResponse({'error': 'Invalid payload. Use YYYY-MM-DD for dates, HH:MM for times and an integer limit.'}, status=400)
+
+        preference_name = data.get('preference')
+        service_name = data.get('service')
+        if not preference_name and not service_name:
+            return JsonResponse({'error': 'One of the following filters is required: preference, service'}, status=400)
+        if not 0 < limit <= MAX_EARLIEST_SLOTS:
+            return JsonResponse({'error': f'"limit" must be between 1 and {MAX_EARLIEST_SLOTS}.'}, status=400)
+
+        services = Service.objects.all()
+        if service_name:
+            services = services.filter(name__icontains=service_name)
+        if preference_name:
+            services = services.filter(
+                Q(preferences__name__iexact=preference_name) |
+                Q(hairdresser__user__preferences__name__iexact=preference_name)
+            )
+        services = services.distinct()
+
+        holder = customer_holder(data['customer']) if data.get('customer') else None
+        earliest_slots = find_earliest_slots(services, selected_date, time_from, time_to, limit, holder=holder)
+
+        hairdressers = Hairdresser.objects.select_related('user').in_bulk(
+            {hairdresser_id for _, hairdresser_id, _ in earliest_slots}
+        )
+        services_by_id = Service.objects.in_bulk({service_id for _, _, service_id in earliest_slots})
+        result = [
+            {
+                'start_time': start_time.isoformat(),
+                'hairdresser': HairdresserNameSerializer(hairdressers[hairdresser_id]).data,
+                'service': ServiceSerializer(services_by_id[service_id]).data,
+            }
+            for start_time, hairdresser_id, service_id in earliest_slots
+        ]
+        return JsonResponse({'data': result}, status=200)
+    
+class SlotCacheStats(APIView):
+    def get(self, request):
+        return JsonResponse({'data': slot_cache.stats()}, status=200)
+
 def calculate_end_time(start_dt: datetime, duration_minutes: int) -> datetime:
     """
     Calculates the end time by adding a duration in minutes to a start datetime.
@@ -223,62 +487,344 @@ def calculate_end_time(start_dt: datetime, duration_minutes: int) -> datetime:
         
     return start_dt + timedelta(minutes=duration)
 
+def compute_free_intervals(window_start, window_end, blocked_periods):
+    """
+    Subtracts the blocked periods from the [window_start, window_end) window
+    with a single sweep over the periods sorted by start time.
+
+    Returns a list of (start, end) tuples of free time, in chronological order.
+    """
+    free_intervals = []
+    cursor = window_start
+
+    for blocked_start, blocked_end in sorted(blocked_periods):
+        if blocked_start >= window_end:
+            break
+        if blocked_end <= cursor:
+            continue
+        if blocked_start > cursor:
+            free_intervals.append((cursor, blocked_start))
+        cursor = blocked_end
+        if cursor >= window_end:
+            break
+
+    if cursor < window_end:
+        free_intervals.append((cursor, window_end))
+
+    return free_intervals
+
+def iter_slot_starts(free_intervals, service_duration, not_before=None, not_after=None):
+    """
+    Yields, in chronological order, the datetimes on which a service of the given
+    duration can start inside the free intervals.
+
+    Slots are laid out every 30 minutes from the start of each free interval,
+    so the first slot after a booking starts as soon as the booking ends.
+    Slots starting before not_before or after not_after are skipped.
+    """
+    service_delta = timedelta(minutes=int(service_duration))
+    slot_duration = timedelta(minutes=SLOT_STEP_MINUTES)
+
+    for free_start, free_end in free_intervals:
+        current_dt = free_start
+        if not_before and current_dt < not_before:
+            # Jump straight to the first step of the grid that is not too early
+            skipped_steps = -(-(not_before - current_dt) // slot_duration)
+            current_dt += skipped_steps * slot_duration
+
+        while current_dt + service_delta <= free_end:
+            if not_after and current_dt > not_after:
+                return
+            yield current_dt
+            current_dt += slot_duration
+
+def day_free_intervals(date, start_time, end_time, blocked_periods, break_start=None, break_end=None):
+    """
+    Returns the free intervals of a working day once the break and the blocked
+    periods are removed from its working hours.
+    """
+    work_start = datetime.combine(date, start_time).replace(tzinfo=LOCAL_TIMEZONE)
+    work_end = datetime.combine(date, end_time).replace(tzinfo=LOCAL_TIMEZONE)
+
+    blocked_periods = list(blocked_periods)
+    if break_start and break_end:
+        blocked_periods.append((
+            datetime.combine(date, break_start).replace(tzinfo=LOCAL_TIMEZONE),
+            datetime.combine(date, break_end).replace(tzinfo=LOCAL_TIMEZONE),
+        ))
+
+    return compute_free_intervals(work_start, work_end, blocked_periods)
+
+def slots_for_day(date, start_time, end_time, blocked_periods, service_duration,
+                  break_start=None, break_end=None, now_dt=None):
+    """
+    Lists the 'HH:MM' start times on which a service of the given duration fits
+    inside the working hours of the day without touching any blocked period.
+    If now_dt is provided, slots that start before it are skipped.
+    """
+    free_intervals = day_free_intervals(date, start_time, end_time, blocked_periods, break_start, break_end)
+    return [
+        slot.astimezone(LOCAL_TIMEZONE).strftime('%H:%M')
+        for slot in iter_slot_starts(free_intervals, service_duration, not_before=now_dt)
+    ]
+
 def generate_time_slots(date, start_time, end_time, bookings, service_duration, 
                         break_start=None, break_end=None, now_dt=None):
     """
     Generate available time slots for a given date and availability.
     If now_dt is provided, it will filter out slots that are in the past.
     """
-    slots = []
-    
-    naive_start_dt = datetime.combine(date, start_time)
-    naive_end_dt = datetime.combine(date, end_time)
-
-    current_dt = naive_start_dt.replace(tzinfo=LOCAL_TIMEZONE)
-    end_dt = naive_end_dt.replace(tzinfo=LOCAL_TIMEZONE)
-    
-    # The last possible start time must account for the service's duration
-    service_delta = timedelta(minutes=service_duration)
-    end_dt -= timedelta(minutes=service_duration)
-    
-    slot_duration = timedelta(minutes=30) 
-    last_possible_start_dt = end_dt - service_delta
     blocked_periods = [(b.start_time, b.end_time) for b in bookings]
-    if break_start and break_end: 
-        naive_break_start = datetime.combine(date, break_start)
-        naive_break_end = datetime.combine(date, break_end)
-        break_start_dt = naive_break_start.replace(tzinfo=LOCAL_TIMEZONE)
-        break_end_dt = naive_break_end.replace(tzinfo=LOCAL_TIMEZONE)
-        blocked_periods.append((break_start_dt, break_end_dt))
-
-    blocked_periods.sort(key=lambda x: x[0])
-
-    while current_dt <= last_possible_start_dt:
-        # Skip slots in the past for today's date
-        if now_dt and current_dt < now_dt:
-            current_dt += slot_duration
+    return slots_for_day(
+        date, start_time, end_time, blocked_periods, service_duration,
+        break_start, break_end, now_dt=now_dt
+    )
+
+def compute_full_day_slots(hairdresser_id, service_duration, days, held_masks=None):
+    """
+    Computes every slot of the given days for a hairdresser, ignoring the
+    current time. The working calendar (weekly availability and date overrides)
+    and the occupancy bitmaps of the days are loaded with one query each.
+
+    Returns a dict mapping each day to its list of 'HH:MM' slots.
+    """
+    held_masks = held_masks or {}
+    hairdresser_calendar = compile_calendar(hairdresser_id, min(days), max(days))
+    busy_masks = load_busy_masks([hairdresser_id], min(days), max(days))
+
+    slots_by_day = {}
+    for day in days:
+        hours = hairdresser_calendar.hours_on(day)
+        if not hours:
+            slots_by_day[day] = []
             continue
+        free_mask = (
+            working_mask(*hours)
+            & ~busy_masks.get((hairdresser_id, day), 0)
+            & ~held_masks.get((hairdresser_id, day), 0)
+        )
+        slots_by_day[day] = [
+            slot.strftime('%H:%M')
+            for slot in iter_slot_starts(free_intervals_from_mask(day, free_mask), service_duration)
+        ]
+    return slots_by_day
 
-        slot_end_dt = current_dt + service_delta
- 
-        is_blocked = False
-        for blocked_start, blocked_end in blocked_periods: 
-            # Check for overlap 
-            if current_dt < blocked_end and slot_end_dt > blocked_start:
-                # This slot is blocked.
-                is_blocked = True
-                # CRITICAL: Jump the clock to the end of the current blockage.
-                # This ensures we don't check any more slots within this blocked period.
-                current_dt = blocked_end
-                break 
-
-        if not is_blocked:
-            slots.append(current_dt.strftime('%H:%M'))
-            current_dt += slot_duration
-    
-    return slots
+def generate_slots_for_range(hairdresser, service_duration, date_from, date_to, holder=None):
+    """
+    Computes the available slots of every day in [date_from, date_to] for a hairdresser.
+
+    Each day is resolved by masking its working hours with its busy cells and
+    walking the resulting free runs (see compute_full_day_slots), so the cost
+    of a month barely differs from the cost of a single day. Full-day results
+    are cached per hairdresser, duration and day by reserve.slot_cache and only
+    the days missing from the cache are computed. Slots of today that already
+    started are dropped on the way out.
+
+    Active slot holds count as busy, except the ones placed by `holder`.
+
+    Returns a dict mapping each date of the window to its list of 'HH:MM' slots.
+    """
+    now = timezone.now()
+    today = now.astimezone(LOCAL_TIMEZONE).date()
+    days = [date_from + timedelta(days=offset) for offset in range((date_to - date_from).days + 1)]
+    open_days = [day for day in days if day >= today]
+
+    full_day_slots = {}
+    if open_days:
+        held_masks = load_held_masks([hairdresser.id], open_days[0], open_days[-1], exclude_holder=holder)
+        cacheable_days = [day for day in open_days if (hairdresser.id, day) not in held_masks]
+        full_day_slots, versions = slot_cache.get_days(hairdresser.id, service_duration, cacheable_days)
+        slot_cache.count_bypassed(len(open_days) - len(cacheable_days))
+
+        missing_days = [day for day in open_days if day not in full_day_slots]
+        if missing_days:
+            computed = compute_full_day_slots(hairdresser.id, service_duration, missing_days, held_masks)
+            slot_cache.set_days(
+                hairdresser.id,
+                service_duration,
+                {day: slots for day, slots in computed.items() if day in versions},
+                versions
+            )
+            full_day_slots.update(computed)
+
+    slots_by_day = {}
+    for day in days:
+        slots = full_day_slots.get(day, [])
+        if day == today:
+            slots = [
+                slot for slot in slots
+                if datetime.combine(day, time.fromisoformat(slot)).replace(tzinfo=LOCAL_TIMEZONE) >= now
+            ]
+        slots_by_day[day] = slots
+
+    return slots_by_day
+
+def _tag_slots(slot_starts, hairdresser_id, service_id):
+    for slot in slot_starts:
+        yield slot, hairdresser_id, service_id
+
+def find_earliest_slots(services, date, time_from=None, time_to=None, limit=5, holder=None):
+    """
+    Finds the `limit` earliest bookable (hairdresser, service, start_time) tuples
+    of a day across every hairdresser offering one of the given services.
+
+    The working calendars (weekly availability and date overrides) and the
+    occupancy bitmaps of all the hairdressers involved are read with one
+    query each. Every (hairdresser, service) pair becomes a lazy,
+    chronologically ordered stream of slot starts and the streams are merged
+    with a heap, so only the slots that make it to the result are produced
+    beyond the first one of each stream.
+
+    Args:
+        services: Service queryset to pick the (hairdresser, service) pairs from.
+        date: The day to search.
+        time_from: Optional local time before which slots are ignored.
+        time_to: Optional local time after which slots are ignored.
+        limit: Maximum number of results.
+        holder: Slot holds placed by this holder are not treated as busy.
 
-def get_available_slots(hairdresser_id, service_id, date_str):
+    Returns:
+        A list of (start_time, hairdresser_id, service_id) tuples sorted by start time.
+    """
+    hairdresser_ids = services.values('hairdresser_id')
+
+    hours_by_hairdresser = {
+        hairdresser_id: hairdresser_calendar.hours_on(date)
+        for hairdresser_id, hairdresser_calendar in compile_calendars(hairdresser_ids, date, date).items()
+        if hairdresser_calendar.works_on(date)
+    }
+    if not hours_by_hairdresser:
+        return []
+
+    busy_masks = load_busy_masks(hairdresser_ids, date, date)
+    held_masks = load_held_masks(hairdresser_ids, date, date, exclude_holder=holder)
+
+    services_by_hairdresser = defaultdict(list)
+    for service_id, hairdresser_id, duration in services.values_list('id', 'hairdresser_id', 'duration'):
+        if hairdresser_id in hours_by_hairdresser:
+            services_by_hairdresser[hairdresser_id].append((service_id, duration))
+
+    now = timezone.now()
+    not_before = datetime.combine(date, time_from).replace(tzinfo=LOCAL_TIMEZONE) if time_from else None
+    if not_before is None or not_before < now:
+        not_before = now
+    not_after = datetime.combine(date, time_to).replace(tzinfo=LOCAL_TIMEZONE) if time_to else None
+
+    streams = []
+    for hairdresser_id, hairdresser_services in services_by_hairdresser.items():
+        free_mask = (
+            working_mask(*hours_by_hairdresser[hairdresser_id])
+            & ~busy_masks.get((hairdresser_id, date), 0)
+            & ~held_masks.get((hairdresser_id, date), 0)
+        )
+        free_intervals = free_intervals_from_mask(date, free_mask)
+        for service_id, duration in hairdresser_services:
+            streams.append(_tag_slots(
+                iter_slot_starts(free_intervals, duration, not_before, not_after),
+                hairdresser_id,
+                service_id
+            ))
+
+    return list(islice(heapq.merge(*streams), limit))
+
+def expand_recurrence(start_time, frequency, count=None, until=None):
+    """
+    Lists the occurrences of a weekly or biweekly recurrence.
+
+    Occurrences keep the local wall-clock time of start_time. The list stops
+    after `count` occurrences or after the last one on or before the local
+    date `until`; it is cut one item past MAX_BULK_OCCURRENCES so callers can
+    tell an over-long recurrence apart.
+    """
+    step = timedelta(days=RECURRENCE_STEP_DAYS[frequency])
+    local_start = start_time.astimezone(LOCAL_TIMEZONE)
+    limit = min(count, MAX_BULK_OCCURRENCES + 1) if count else MAX_BULK_OCCURRENCES + 1
+
+    occurrences = []
+    while len(occurrences) < limit:
+        occurrence = local_start + step * len(occurrences)
+        if until and occurrence.date() > until:
+            break
+        occurrences.append(occurrence)
+    return occurrences
+
+def find_occurrence_conflicts(hairdresser_id, customer_id, service_duration, start_times):
+    """
+    Checks a batch of start times for one service against the hairdresser's
+    working hours and bookings and the customer's other reservations.
+
+    The working calendar, the occupancy bitmaps of the days involved, the customer's
+    reservations and the other customers' slot holds over the batch window are
+    read with one query each.
+    Agenda is only queried, once for the whole batch, for occurrences whose
+    edge cells are shared with a booking.
+
+    Returns:
+        A dict mapping each start time that cannot be booked to the reason:
+        'in_past', 'overlaps_occurrence', 'outside_working_hours', 'customer_unavailable',
+        'held' (by another customer) or 'hairdresser_unavailable'.
+    """
+    duration = timedelta(minutes=int(service_duration))
+    spans = [(start_time, start_time + duration) for start_time in sorted(set(start_times))]
+    day_masks = {span: dict(span_masks(*span)) for span in spans}
+
+    busy_days = {day for masks in day_masks.values() for day in masks}
+    hairdresser_calendar = compile_calendar(hairdresser_id, min(busy_days), max(busy_days))
+    working_masks = {}
+    for day in busy_days:
+        hours = hairdresser_calendar.hours_on(day)
+        working_masks[day] = working_mask(*hours) if hours else 0
+    busy_masks = load_day_masks(hairdresser_id, busy_days)
+    customer_spans = list(Reserve.objects.filter(
+        customer_id=customer_id,
+        start_time__lt=spans[-1][1],
+        end_time__gt=spans[0][0]
+    ).values_list('start_time', 'end_time'))
+    holds = held_spans(
+        [hairdresser_id], spans[0][0], spans[-1][1], exclude_holder=customer_holder(customer_id)
+    ).get(hairdresser_id, [])
+
+    now = timezone.now()
+    conflicts = {}
+    needs_exact_check = []
+    accepted_end = None
+    for start, end in spans:
+        masks = day_masks[(start, end)]
+        inner_masks = dict(span_masks(start, end, inner=True))
+        if start < now:
+            conflicts[start] = 'in_past'
+        elif accepted_end and start < accepted_end:
+            conflicts[start] = 'overlaps_occurrence'
+        elif any(mask & ~working_masks[day] for day, mask in masks.items()):
+            conflicts[start] = 'outside_working_hours'
+        elif any(existing_start < end and start < existing_end for existing_start, existing_end in customer_spans):
+            conflicts[start] = 'customer_unavailable'
+        elif any(held_start < end and start < held_end for held_start, held_end in holds):
+            conflicts[start] = 'held'
+        elif any(busy_masks.get(day, 0) & inner_masks[day] for day in masks):
+            conflicts[start] = 'hairdresser_unavailable'
+        else:
+            if any(busy_masks.get(day, 0) & mask for day, mask in masks.items()):
+                needs_exact_check.append((start, end))
+            accepted_end = end
+
+    if needs_exact_check:
+        bookings = list(Agenda.objects.filter(
+            reduce(operator.or_, (Q(start_time__lt=end, end_time__gt=start) for start, end in needs_exact_check)),
+            hairdresser_id=hairdresser_id
+        ).values_list('start_time', 'end_time'))
+        for start, end in needs_exact_check:
+            if any(booked_start < end and start < booked_end for booked_start, booked_end in bookings):
+                conflicts[start] = 'hairdresser_unavailable'
+
+    return conflicts
+
+def get_available_slots(hairdresser_id, service_id, date_str, holder=None):
+    """
+    Lists the free 'HH:MM' slots of a hairdresser on a day for the chatbot.
+    Listing holds nothing; the holds of `holder` do not count as busy.
+    hold_chosen_slot holds the slot the customer picks.
+    """
     try:
         hairdresser = Hairdresser.objects.get(id=hairdresser_id)
         service = Service.objects.get(id=service_id)
@@ -290,37 +836,36 @@ def get_available_slots(hairdresser_id, service_id, date_str):
     except ValueError:
         return {'error': 'Invalid date format', 'status': 400}
 
-    weekday_name = calendar.day_name[selected_date.weekday()]
-
-    availability = Availability.objects.filter(
-        hairdresser=hairdresser,
-        weekday=weekday_name.lower()
-    ).first()
-
-    if not availability:
-        return {'available_slots': []}
-
-    start_of_day = timezone.make_aware(datetime.combine(selected_date, datetime.min.time()))
-    end_of_day = timezone.make_aware(datetime.combine(selected_date, datetime.max.time()))
-
-    bookings = Agenda.objects.filter(
-        hairdresser=hairdresser,
-        start_time__lt=end_of_day,
-        end_time__gt=start_of_day
-    ).order_by('start_time')
-
-    # Generate time slots
-    available_slots = generate_time_slots(
-        selected_date,
-        availability.start_time,
-        availability.end_time,
-        bookings,
-        service.duration,
-        availability.break_start,
-        availability.break_end
-    )
+    slots_by_day = generate_slots_for_range(hairdresser, service.duration, selected_date, selected_date, holder=holder)
+    return {'available_slots' : slots_by_day[selected_date]}
+
+def hold_chosen_slot(customer_id, service_id, hairdresser_id, start_time_dt):
+    """
+    Holds the slot picked in the chatbot for HOLD_TTL while the customer
+    confirms it, like HoldSlot does for the app.
+    """
+    try:
+        customer_instance = Customer.objects.get(id=customer_id)
+        service_instance = Service.objects.get(id=service_id)
+        hairdresser_instance = Hairdresser.objects.get(id=hairdresser_id)
+    except Customer.DoesNotExist:
+        return {'error': 'Customer not found'}
+    except Service.DoesNotExist:
+        return {'error': 'Service not found'}
+    except Hairdresser.DoesNotExist:
+        return {'error': 'Hairdresser not found'}
 
-    return {'available_slots' : available_slots}
+    end_time_dt = calculate_end_time(start_time_dt, service_instance.duration)
+    if start_time_dt < timezone.now() or not is_hairdresser_free(hairdresser_instance.id, start_time_dt, end_time_dt):
+        return {'error': 'Desculpe, este horário não está disponível. Por favor, escolha outro.'}
+
+    with transaction.atomic():
+        holds = place_holds(
+            customer_holder(customer_instance.id), hairdresser_instance.id, service_instance, [start_time_dt]
+        )
+    if not holds:
+        return {'error': 'Desculpe, este horário está sendo reservado por outra pessoa. Por favor, escolha outro.'}
+    return {'success': True, 'hold': holds[0]}
 
 def create_new_reserve(customer_id, service_id, hairdresser_id, start_time_dt):
     try:
@@ -329,26 +874,28 @@ def create_new_reserve(customer_id, service_id, hairdresser_id, start_time_dt):
         hairdresser_instance = Hairdresser.objects.get(id=hairdresser_id)
 
         end_time_dt = start_time_dt + timedelta(minutes=service_instance.duration)
-
-        # Checking for overlapping appointments in the Agenda
-        if Agenda.objects.filter(
-            hairdresser=hairdresser_instance,
-            start_time__lt=end_time_dt,
-            end_time__gt=start_time_dt
-        ).exists():
-            return {'error': 'Desculpe, este horário foi agendado por outra pessoa. Por favor, escolha outro.'}
-        
-        reserve = Reserve.objects.create(
-            start_time=start_time_dt,
-            customer=customer_instance,
-            service=service_instance
-        )
-        Agenda.objects.create(
-            start_time=start_time_dt,
-            end_time=end_time_dt,
-            hairdresser=hairdresser_instance,
-            service=service_instance
-        )
+        holder = customer_holder(customer_instance.id)
+
+        # Overlapping appointments are rejected by the agenda exclusion constraint
+        with transaction.atomic():
+            if is_held_by_others(hairdresser_instance.id, start_time_dt, end_time_dt, holder):
+                return {'error': 'Desculpe, este horário está sendo reservado por outra pessoa. Por favor, escolha outro.'}
+
+            reserve = Reserve.objects.create(
+                start_time=start_time_dt,
+                end_time=end_time_dt,
+                customer=customer_instance,
+                service=service_instance
+            )
+            Agenda.objects.create(
+                start_time=start_time_dt,
+                end_time=end_time_dt,
+                hairdresser=hairdresser_instance,
+                service=service_instance,
+                reserve=reserve
+            )
+            # The booking consumes the hold of the picked slot
+            release_holds(holder)
             
         return {'success': True, 'reserve': reserve}
     except Customer.DoesNotExist:
@@ -357,6 +904,11 @@ def create_new_reserve(customer_id, service_id, hairdresser_id, start_time_dt):
         return {'error': 'Service not found'}
     except Hairdresser.DoesNotExist:
         return {'error': 'Hairdresser not found'}
+    except IntegrityError as e:
+        if is_agenda_overlap_error(e):
+            return {'error': 'Desculpe, este horário foi agendado por outra pessoa. Por favor, escolha outro.'}
+        print(f"An integrity error occurred in create_new_reserve: {e}")
+        return {'error': 'Ocorreu um erro inesperado ao tentar criar a reserva.'}
     except Exception as e:
         # Catch any other unexpected errors
         print(f"An unexpected error occurred in create_new_reserve: {e}")
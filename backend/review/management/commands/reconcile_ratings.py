@@ -0,0 +1,23 @@
+import time as timer
+
+from django.core.management.base import BaseCommand
+
+from review.ratings import reconcile
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the review aggregates of every hairdresser (review.ratings)
+    with one GROUP BY over the reviews and fixes the ones that drifted, e.g.
+    after reviews were deleted outside the review views. Schedule it nightly.
+    """
+
+    help = "Recomputes the review rating aggregates of the hairdressers"
+
+    def handle(self, *args, **options):
+        started_at = timer.perf_counter()
+        fixed, hairdressers = reconcile()
+        elapsed = timer.perf_counter() - started_at
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled the ratings of {hairdressers} hairdressers, fixed {fixed}, in {elapsed * 1000:.0f}ms"
+        ))
@@ -0,0 +1,82 @@
+"""
+Review aggregates of each hairdresser: Hairdresser.rating_sum, rating_count
+and rating_avg.
+
+The review views update them in the transaction of the review write, with one
+UPDATE adding the change to the sum and the count, so rankings read a column
+instead of aggregating the reviews. The average is computed by the same
+UPDATE from the new totals, and is NULL while the hairdresser has no reviews.
+Reviews deleted without the views (cascades, the admin) are caught up by the
+reconcile_ratings command, which recomputes every total with one GROUP BY.
+
+Rankings use rating_expression(): the review average, and the profile rating
+(User.rating) of the hairdressers nobody reviewed yet.
+"""
+import math
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, NullIf
+
+
+def rating_expression(average='rating_avg', profile='user__rating'):
+    """
+    Ranking rating of a hairdresser, given the paths to its review average
+    and to its user's profile rating.
+    """
+    return Coalesce(average, profile, output_field=FloatField())
+
+def _apply(hairdresser_id, rating_sum, rating_count):
+    from users.models import Hairdresser
+
+    # Clamped for reviews the totals never counted (see reconcile), a
+    # hairdresser left without reviews gets an exact zero sum
+    new_count = Greatest(F('rating_count') + rating_count, 0)
+    new_sum = Case(
+        When(rating_count__lte=-rating_count, then=Value(0.0)),
+        default=F('rating_sum') + rating_sum,
+    )
+    Hairdresser.objects.filter(id=hairdresser_id).update(
+        rating_sum=new_sum,
+        rating_count=new_count,
+        rating_avg=new_sum / NullIf(new_count, 0),
+    )
+
+def add_review(hairdresser_id, rating):
+    _apply(hairdresser_id, rating, 1)
+
+def remove_review(hairdresser_id, rating):
+    _apply(hairdresser_id, -rating, -1)
+
+def change_rating(hairdresser_id, old_rating, new_rating):
+    _apply(hairdresser_id, new_rating - old_rating, 0)
+
+def reconcile():
+    """
+    Recomputes the totals of every hairdresser from its reviews and stores
+    the ones that drifted. Returns (hairdressers fixed, hairdressers).
+    """
+    from review.models import Review
+    from users.models import Hairdresser
+
+    with transaction.atomic():
+        # Locked before the reviews are read: a review write waits for the
+        # reconcile to commit, then applies its change on the new totals
+        hairdressers = list(Hairdresser.objects.select_for_update().only('rating_sum', 'rating_count', 'rating_avg'))
+        totals = {
+            hairdresser_id: (rating_sum, rating_count)
+            for hairdresser_id, rating_sum, rating_count in Review.objects
+            .values_list('hairdresser_id')
+            .annotate(rating_sum=Sum('rating'), rating_count=Count('id'))
+            .order_by()
+        }
+
+        drifted = []
+        for hairdresser in hairdressers:
+            rating_sum, rating_count = totals.get(hairdresser.id, (0, 0))
+            if hairdresser.rating_count != rating_count or not math.isclose(hairdresser.rating_sum, rating_sum, abs_tol=1e-9):
+                hairdresser.rating_sum, hairdresser.rating_count = rating_sum, rating_count
+                hairdresser.rating_avg = rating_sum / rating_count if rating_count else None
+                drifted.append(hairdresser)
+        Hairdresser.objects.bulk_update(drifted, ['rating_sum', 'rating_count', 'rating_avg'], batch_size=1000)
+    return len(drifted), len(hairdressers)
@@ -6,6 +6,7 @@ from users.models import User, Customer, Hairdresser
 from .models import Review
 from reserve.models import Reserve
 from service.models import Service
+from review.ratings import reconcile
 import jwt
 import json
 
@@ -502,4 +503,37 @@ class RemoveAdminDeleteReview(ReviewsTestCase):
         invalid_url = reverse('remove_review_admin', args=[9999])
         response = self.client.delete(invalid_url)
 
-        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class RatingAggregatesTest(ReviewsTestCase):
+    def aggregates(self):
+        self.hairdresser.refresh_from_db()
+        return self.hairdresser.rating_sum, self.hairdresser.rating_count, self.hairdresser.rating_avg
+
+    def test_review_writes_maintain_aggregates(self):
+        """Test creating, updating and deleting reviews keeps the hairdresser totals"""
+        self.login_as_customer()
+        for reserve, rating in ((self.reserve, 5), (self.reserve2, 2)):
+            self.client.post(self.create_url, data={'rating': rating, 'hairdresser': self.hairdresser.id, 'reserve': reserve.id})
+        self.assertEqual(self.aggregates(), (7, 2, 3.5))
+
+        first, second = Review.objects.order_by('id')
+        self.client.put(reverse('update_review', args=[second.id]), data=json.dumps({'rating': 4}), content_type='application/json')
+        self.assertEqual(self.aggregates(), (9, 2, 4.5))
+
+        self.client.delete(reverse('remove_review', args=[first.id]))
+        self.assertEqual(self.aggregates(), (4, 1, 4))
+        # The admin endpoint leaves reservations pointing to the review
+        Reserve.objects.filter(review=second).update(review=None)
+        self.client.delete(reverse('remove_review_admin', args=[second.id]))
+        self.assertEqual(self.aggregates(), (0, 0, None))
+
+    def test_reconcile_recomputes_drifted_totals(self):
+        """Test the reconcile catches up with reviews written outside the views"""
+        for rating in (3, 4):
+            Review.objects.create(rating=rating, customer=self.customer, hairdresser=self.hairdresser)
+        self.assertEqual(self.aggregates(), (0, 0, None))
+
+        self.assertEqual(reconcile(), (1, 1))
+        self.assertEqual(self.aggregates(), (7, 2, 3.5))
+        self.assertEqual(reconcile(), (0, 1))
@@ -10,6 +10,7 @@ from django.http import JsonResponse
 from rest_framework.parsers import MultiPartParser, FormParser
 import jwt, datetime
 from django.db import transaction
+from review import ratings
 
 # 2 - Cookie-based views (usuário autenticado)
 class CreateReview(APIView):
@@ -76,6 +77,7 @@ class CreateReview(APIView):
                 )
                 reserve.review = new_review
                 reserve.save()
+                ratings.add_review(new_review.hairdresser_id, new_review.rating)
             
             return JsonResponse({'message': "Review registered successfully"}, status=201)
         except Exception as error:
@@ -114,15 +116,19 @@ class UpdateReview(APIView):
             if user.role != 'customer':
                 return JsonResponse({'error': 'User is not a customer'}, status=403)
 
-            review = Review.objects.filter(id=id, customer_id=customer.id).first()
-            if not review:
-                return JsonResponse({'error': 'Review not found'}, status=404)
-            if 'rating' not in data:
-                return JsonResponse({'error': 'Missing required fields: rating'}, status=400)
-            review.rating = data['rating']
-            review.comment = data.get('comment', review.comment)
-            review.picture = data.get('picture', review.picture)
-            review.save()
+            with transaction.atomic():
+                # Locked so concurrent writes apply their rating changes in turn
+                review = Review.objects.select_for_update().filter(id=id, customer_id=customer.id).first()
+                if not review:
+                    return JsonResponse({'error': 'Review not found'}, status=404)
+                if 'rating' not in data:
+                    return JsonResponse({'error': 'Missing required fields: rating'}, status=400)
+                previous_rating = review.rating
+                review.rating = data['rating']
+                review.comment = data.get('comment', review.comment)
+                review.picture = data.get('picture', review.picture)
+                review.save()
+                ratings.change_rating(review.hairdresser_id, previous_rating, float(review.rating))
             serializer = ReviewSerializer(review)
             return JsonResponse({'message': "Review updated successfully"}, status=200)
         except Exception as e:
@@ -148,18 +154,19 @@ class RemoveReview(APIView):
             if user.role != 'customer':
                 return JsonResponse({'error': 'User is not a customer'}, status=403)
 
-            review = Review.objects.filter(id=id, customer_id=customer.id).first()
-            if not review:
-                return JsonResponse({'error': 'Review not found'}, status=404)
-            
             try:
                 with transaction.atomic():
+                    review = Review.objects.select_for_update().filter(id=id, customer_id=customer.id).first()
+                    if not review:
+                        return JsonResponse({'error': 'Review not found'}, status=404)
+
                     reserve = Reserve.objects.filter(review=review).first()
                     if reserve:
                         reserve.review = None
                         reserve.save()
 
                     review.delete()
+                    ratings.remove_review(review.hairdresser_id, review.rating)
             except Reserve.DoesNotExist:
                 return JsonResponse({'error': 'Related reserve not found'}, status=404)
             return JsonResponse({'message': "Review deleted successfully"}, status=200)
@@ -169,10 +176,12 @@ class RemoveReview(APIView):
 class RemoveReviewAdmin(APIView):
     def delete(self, request, id): # Id da review
         try:
-            review = Review.objects.filter(id=id).first()
-            if not review:
-                return JsonResponse({'error': 'Review not found'}, status=404)
-            review.delete()
+            with transaction.atomic():
+                review = Review.objects.select_for_update().filter(id=id).first()
+                if not review:
+                    return JsonResponse({'error': 'Review not found'}, status=404)
+                review.delete()
+                ratings.remove_review(review.hairdresser_id, review.rating)
             return JsonResponse({'message': "Review deleted successfully"}, status=200)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
@@ -0,0 +1,31 @@
+import django_filters
+from django.db.models import Exists, OuterRef
+
+from preferences.models import Preferences
+from .models import Service
+
+class ServiceFilter(django_filters.FilterSet):
+    min_price = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
+    max_duration = django_filters.NumberFilter(field_name='duration', lookup_expr='lte')
+    neighborhood = django_filters.CharFilter(field_name='hairdresser__user__neighborhood')
+    preference = django_filters.NumberFilter(
+        method='filter_preference',
+        label="Services tagged with the preference (category) id, or of hairdressers having it"
+    )
+
+    class Meta:
+        model = Service
+        fields = []
+
+    def filter_preference(self, queryset, name, value):
+        # Matches the service's own category like EarliestSlots does, as well
+        # as the hairdresser's. Exists keeps one row per service, however many
+        # preferences match
+        return queryset.filter(
+            Exists(Preferences.services.through.objects.filter(service_id=OuterRef('pk'), preferences_id=value))
+            | Exists(Preferences.users.through.objects.filter(
+                user_id=OuterRef('hairdresser__user_id'),
+                preferences_id=value,
+            ))
+        )
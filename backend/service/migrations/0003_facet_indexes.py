@@ -0,0 +1,21 @@
+# Generated by Django 4.2.20 on 2026-10-18 14:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0002_service_description'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['hairdresser', 'price'], name='service_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['hairdresser', 'duration'], name='service_duration_idx'),
+        ),
+    ]
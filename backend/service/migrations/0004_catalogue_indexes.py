@@ -0,0 +1,21 @@
+# Generated by Django 4.2.20 on 2026-10-18 14:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0003_facet_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['price', 'id'], name='service_price_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['duration', 'id'], name='service_duration_order_idx'),
+        ),
+    ]
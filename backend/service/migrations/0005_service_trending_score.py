@@ -0,0 +1,22 @@
+# Generated by Django 4.2.20 on 2026-10-18 15:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0004_catalogue_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['trending_score', 'id'], name='service_trending_order_idx'),
+        ),
+    ]
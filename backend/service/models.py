@@ -8,3 +8,16 @@ class Service(models.Model):
     price = models.DecimalField(max_digits=6, decimal_places=2, blank=False, null=False)
     duration = models.PositiveSmallIntegerField(blank=False, null=False)
     hairdresser = models.ForeignKey(Hairdresser, on_delete=models.DO_NOTHING,null=False, blank=False)
+    # Maintained by reserve.trending, relative to its epoch
+    trending_score = models.FloatField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Price band and duration facet filters of the global search
+            models.Index(fields=['hairdresser', 'price'], name='service_price_idx'),
+            models.Index(fields=['hairdresser', 'duration'], name='service_duration_idx'),
+            # Catalogue filters and keyset pagination, see service.views.keyset_page
+            models.Index(fields=['price', 'id'], name='service_price_order_idx'),
+            models.Index(fields=['duration', 'id'], name='service_duration_order_idx'),
+            models.Index(fields=['trending_score', 'id'], name='service_trending_order_idx'),
+        ]
@@ -5,16 +5,16 @@ from rest_framework import serializers
 class ServiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Service
-        fields = '__all__'
+        exclude = ['trending_score']
 
 class ServiceWithHairdresserSerializer(serializers.ModelSerializer):
     hairdresser = HairdresserNameSerializer(read_only=True)
     class Meta:
         model = Service
-        fields = '__all__'
+        exclude = ['trending_score']
 
 class ServiceWithHairdresserFullInfoSerializer(serializers.ModelSerializer):
     hairdresser = HairdresserSerializer(read_only=True)
     class Meta:
         model = Service
-        fields = '__all__'
\ No newline at end of file
+        exclude = ['trending_score']
\ No newline at end of file
@@ -203,6 +203,86 @@ class ListServiceTest(ServiceTestCase):
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
         self.assertEqual(response.json()['error'], 'Service not found')
 
+class ListServiceCatalogueTest(ServiceTestCase):
+    def setUp(self):
+        super().setUp()
+        from preferences.models import Preferences
+
+        self.corte = Preferences.objects.create(name='Corte')
+        self.corte.users.add(self.hairdresser_user)
+        self.hairdresser_user2.neighborhood = 'Adrianópolis'
+        self.hairdresser_user2.save()
+
+        self.beard = Service.objects.create(name='Beard', price=Decimal('30.00'), duration=30, hairdresser=self.hairdresser)
+        self.fringe = Service.objects.create(name='Fringe', price=Decimal('30.00'), duration=15, hairdresser=self.hairdresser2)
+        self.braids = Service.objects.create(name='Braids', price=Decimal('250.00'), duration=240, hairdresser=self.hairdresser2)
+        Service.objects.filter(id__in=[self.fringe.id, self.braids.id]).update(trending_score=2.5)
+        Service.objects.filter(id=self.beard.id).update(trending_score=0.1)
+
+    def names(self, params):
+        response = self.client.get(self.list_url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [service['name'] for service in response.json()['data']]
+
+    def test_filters_by_price_duration_preference_and_neighborhood(self):
+        """Test the catalogue filters combine"""
+        self.assertEqual(self.names({'max_price': 50}), ['Beard', 'Fringe', 'Haircut'])
+        self.assertEqual(self.names({'min_price': 100, 'max_price': 200}), ['Hair Coloring'])
+        self.assertEqual(self.names({'max_duration': 60}), ['Beard', 'Fringe', 'Haircut'])
+        # "Cortes ate R$50"
+        self.assertEqual(self.names({'preference': self.corte.id, 'max_price': 50}), ['Beard', 'Haircut'])
+        self.assertEqual(self.names({'neighborhood': 'Adrianópolis'}), ['Fringe', 'Hair Coloring', 'Braids'])
+
+    def test_preference_matches_services_tagged_with_it(self):
+        """Test a service of the category is listed even when its hairdresser lacks the preference"""
+        self.corte.services.add(self.fringe)
+        # Beard matches both ways and is still listed once
+        self.corte.services.add(self.beard)
+
+        self.assertEqual(self.names({'preference': self.corte.id}), ['Beard', 'Fringe', 'Haircut'])
+
+    def test_sorts_by_price_duration_and_rating(self):
+        """Test services are sorted by price by default, ties broken by id"""
+        self.assertEqual(self.names({}), ['Beard', 'Fringe', 'Haircut', 'Hair Coloring', 'Braids'])
+        self.assertEqual(self.names({'sort': '-price'}), ['Braids', 'Hair Coloring', 'Haircut', 'Fringe', 'Beard'])
+        self.assertEqual(self.names({'sort': 'duration'}), ['Fringe', 'Beard', 'Haircut', 'Hair Coloring', 'Braids'])
+        # Descending sorts break ties by descending id
+        self.assertEqual(self.names({'sort': '-rating'}), ['Beard', 'Haircut', 'Braids', 'Fringe', 'Hair Coloring'])
+        self.assertEqual(self.names({'sort': '-trending'})[:3], ['Braids', 'Fringe', 'Beard'])
+
+    def test_keyset_pagination_walks_every_service_once(self):
+        """Test following next_cursor returns each service once, in order"""
+        for sort in ['price', '-price', 'duration', '-rating', '-trending']:
+            names, cursor = [], None
+            while True:
+                params = {'sort': sort, 'limit': 2, **({'cursor': cursor} if cursor else {})}
+                response = self.client.get(self.list_url, params).json()
+                names.extend(service['name'] for service in response['data'])
+                cursor = response['next_cursor']
+                if cursor is None:
+                    break
+            self.assertEqual(names, self.names({'sort': sort}), sort)
+
+    def test_lists_every_service_without_paging_parameters(self):
+        """Test clients that send no limit or cursor still get the full list"""
+        Service.objects.bulk_create(
+            Service(name=f'Extra {i}', price=Decimal('70.00'), duration=45, hairdresser=self.hairdresser) for i in range(25)
+        )
+        response = self.client.get(self.list_url).json()
+        self.assertEqual(len(response['data']), 30)
+        self.assertIsNone(response['next_cursor'])
+        self.assertEqual(len(self.client.get(self.list_url, {'limit': 20}).json()['data']), 20)
+
+    def test_rejects_invalid_parameters(self):
+        """Test invalid filters, sorts, limits and cursors are rejected"""
+        for params in [
+            {'max_price': 'cheap'}, {'preference': 'corte'}, {'sort': 'name'},
+            {'limit': 0}, {'limit': 101}, {'cursor': 'not-a-cursor'},
+        ]:
+            response = self.client.get(self.list_url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+            self.assertIn('error', response.json())
+
 class ListServiceHairdresserTest(TestCase):
     def setUp(self):
         """
@@ -512,7 +592,7 @@ class RemoveServiceViewTest(TestCase):
         base_time = timezone.now() + timedelta(days=1)
         
         for i in range(3):
-            start_time = base_time + timedelta(hours=i)
+            start_time = base_time + timedelta(minutes=i * self.service_2.duration)
             end_time = start_time + timedelta(minutes=self.service_2.duration)
             
             Agenda.objects.create(
@@ -2,12 +2,30 @@ from django.shortcuts import render
 from users.models import User, Hairdresser
 from service.models import Service
 from service.serializers import ServiceSerializer, ServiceWithHairdresserSerializer
+from service.filters import ServiceFilter
 from rest_framework.views import APIView
 from django.http import JsonResponse
+from django.db.models import Q
+from django.db.models.functions import Coalesce
 from agenda.models import Agenda
+from review.ratings import rating_expression
+from decimal import Decimal, InvalidOperation
+import base64
 import json
 # Create your views here.
 
+SERVICE_PAGE_SIZE = 20
+MAX_SERVICE_PAGE_SIZE = 100
+# Sort parameter -> field the services are ordered by, then by id
+SERVICE_SORTS = {
+    'price': 'price',
+    'duration': 'duration',
+    'rating': 'hairdresser_rating',
+    'trending': 'trending_score',
+}
+# Sort field -> type of its cursor values, int otherwise
+SERVICE_SORT_TYPES = {'price': Decimal, 'hairdresser_rating': float, 'trending_score': float}
+
 class CreateService(APIView):
     def post(self, request):
         data = json.loads(request.body)
@@ -29,6 +47,40 @@ class CreateService(APIView):
 
         return JsonResponse({'message': 'Service created successfully'}, status=201)
 
+def encode_service_cursor(sort_value, service_id):
+    return base64.urlsafe_b64encode(json.dumps([str(sort_value), service_id]).encode()).decode()
+
+def decode_service_cursor(cursor, sort_field):
+    """
+    (sort value, id) of the last service of the previous page. Raises
+    ValueError on tampered cursors.
+    """
+    if not cursor:
+        return None
+    try:
+        sort_value, service_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        sort_value = SERVICE_SORT_TYPES.get(sort_field, int)(sort_value)
+        return sort_value, int(service_id)
+    except (TypeError, ValueError, UnicodeError, InvalidOperation):
+        raise ValueError('Invalid cursor')
+
+def keyset_page(queryset, sort_field, descending, after, limit):
+    """
+    The `limit` services (all of them when None) following `after` in
+    (sort field, id) order. The bound is written
+    `field >= value AND (field > value OR id > last id)` so the (field, id)
+    indexes are scanned from the cursor on.
+    """
+    direction, after_lookup, bound_lookup = ('-', 'lt', 'lte') if descending else ('', 'gt', 'gte')
+    queryset = queryset.order_by(f'{direction}{sort_field}', f'{direction}id')
+    if after is not None:
+        sort_value, service_id = after
+        queryset = queryset.filter(
+            Q(**{f'{sort_field}__{bound_lookup}': sort_value}),
+            Q(**{f'{sort_field}__{after_lookup}': sort_value}) | Q(**{f'id__{after_lookup}': service_id}),
+        )
+    return list(queryset[:limit])
+
 class ListService(APIView):
     def get(self, request, service_id=None):
         
@@ -41,9 +93,40 @@ class ListService(APIView):
             result = ServiceSerializer(service).data
             return JsonResponse({'data': result}, status=200)
         
-        services = Service.objects.all()
-        result = ServiceSerializer(services, many=True).data 
-        return JsonResponse({'data': result}, status=200)
+        service_filter = ServiceFilter(request.query_params, queryset=Service.objects.all())
+        if not service_filter.is_valid():
+            return JsonResponse({'error': f"Invalid filters: {', '.join(service_filter.errors)}"}, status=400)
+
+        sort = request.query_params.get('sort', 'price')
+        sort_field = SERVICE_SORTS.get(sort.lstrip('-'))
+        if sort_field is None:
+            return JsonResponse({'error': f"sort must be one of {', '.join(SERVICE_SORTS)}, optionally prefixed by -"}, status=400)
+        # Pages are opt-in, clients sending neither parameter get every service
+        paged = 'limit' in request.query_params or 'cursor' in request.query_params
+        try:
+            limit = int(request.query_params.get('limit', SERVICE_PAGE_SIZE))
+            after = decode_service_cursor(request.query_params.get('cursor'), sort_field)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid limit or cursor'}, status=400)
+        if not 1 <= limit <= MAX_SERVICE_PAGE_SIZE:
+            return JsonResponse({'error': f'limit must be between 1 and {MAX_SERVICE_PAGE_SIZE}'}, status=400)
+
+        services = service_filter.qs
+        if sort_field == 'hairdresser_rating':
+            services = services.annotate(hairdresser_rating=Coalesce(rating_expression('hairdresser__rating_avg', 'hairdresser__user__rating'), 0.0))
+        if not paged:
+            result = ServiceSerializer(keyset_page(services, sort_field, sort.startswith('-'), None, None), many=True).data
+            return JsonResponse({'data': result, 'next_cursor': None}, status=200)
+        page = keyset_page(services, sort_field, sort.startswith('-'), after, limit + 1)
+
+        next_cursor = None
+        if len(page) > limit:
+            last = page[limit - 1]
+            next_cursor = encode_service_cursor(getattr(last, sort_field), last.id)
+            page = page[:limit]
+
+        result = ServiceSerializer(page, many=True).data 
+        return JsonResponse({'data': result, 'next_cursor': next_cursor}, status=200)
 
 class ListServiceHairdresser(APIView):
     def get(self, request, hairdresser_id):
@@ -0,0 +1,236 @@
+"""
+Facet counts and facet filters of the global search.
+
+The results of a search (hairdressers and services) are counted by
+neighborhood, city, preference, price band and duration bucket of the
+services. A hairdresser counts in the bands of each of its services, a service
+in the neighborhood, city and preferences of its hairdresser.
+
+Every facet is counted in a single statement: the candidate rows of both result
+types are built with the ORM, one row per result and facet value, and
+grouped by GROUPING SETS, one set per facet. The same pass lists the results
+left by the facet selections, which are applied to the rows as filters on
+indexed columns. Only the MAX_FACET_CANDIDATES best ranked results take part
+(see candidate_window).
+"""
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import CharField, Case, Exists, F, IntegerField, OuterRef, Q, Value, When
+
+from users.search_index import HAIRDRESSER_RESULT, RESULT_TYPES, SERVICE_RESULT, ranked_page
+
+# (key, lowest value included, highest value excluded)
+PRICE_BANDS = (
+    ('under-50', None, Decimal(50)),
+    ('50-100', Decimal(50), Decimal(100)),
+    ('100-200', Decimal(100), Decimal(200)),
+    ('over-200', Decimal(200), None),
+)
+# In minutes
+DURATION_BUCKETS = (
+    ('under-30', None, 30),
+    ('30-60', 30, 60),
+    ('60-120', 60, 120),
+    ('over-120', 120, None),
+)
+
+FACETS = ('neighborhood', 'city', 'preference', 'price_band', 'duration')
+
+# Facets count, and selections filter, the best ranked results only, so a
+# broad query costs the same as a narrow one
+MAX_FACET_CANDIDATES = 500
+
+_FACET_SQL = """
+SELECT
+    {by_result},
+    GROUPING(neighborhood) = 0,
+    GROUPING(city) = 0,
+    GROUPING(preference_id, preference_name) = 0,
+    GROUPING(price_band) = 0,
+    GROUPING(duration_band) = 0,
+    {result_columns}, neighborhood, city, preference_id, preference_name, price_band, duration_band,
+    COUNT(DISTINCT (result_type, result_id))
+FROM ({rows}) AS candidates
+GROUP BY GROUPING SETS ({sets})
+"""
+
+
+def _band_range(field, bands, key):
+    for band_key, lowest, highest in bands:
+        if band_key == key:
+            condition = Q()
+            if lowest is not None:
+                condition &= Q(**{f'{field}__gte': lowest})
+            if highest is not None:
+                condition &= Q(**{f'{field}__lt': highest})
+            return condition
+    raise ValueError(f'Unknown band {key}')
+
+def _band_expression(field, bands):
+    return Case(
+        *(When(_band_range(field, bands, key), then=Value(key)) for key, _, _ in bands),
+        default=None,
+        output_field=CharField(),
+    )
+
+def parse_selections(params):
+    """
+    {facet: value} selected in the query parameters. Raises ValueError on
+    unknown bands and non numeric preferences.
+    """
+    selections = {facet: params.get(facet) for facet in FACETS if params.get(facet)}
+    if 'preference' in selections:
+        selections['preference'] = int(selections['preference'])
+    if 'price_band' in selections:
+        _band_range('price', PRICE_BANDS, selections['price_band'])
+    if 'duration' in selections:
+        _band_range('duration', DURATION_BUCKETS, selections['duration'])
+    return selections
+
+def _selection_filter(selections, user_path, services_of_hairdresser):
+    """
+    Q applying the selections to one result type. `services_of_hairdresser` is
+    the queryset of services of the row's hairdresser for hairdresser rows, and
+    None for service rows, which are filtered on their own columns.
+    """
+    from preferences.models import Preferences
+
+    condition = Q()
+    if 'neighborhood' in selections:
+        condition &= Q(**{f'{user_path}neighborhood': selections['neighborhood']})
+    if 'city' in selections:
+        condition &= Q(**{f'{user_path}city': selections['city']})
+    if 'preference' in selections:
+        condition &= Exists(Preferences.users.through.objects.filter(
+            user_id=OuterRef(f'{user_path}id'), preferences_id=selections['preference'],
+        ))
+
+    service_condition = Q()
+    if 'price_band' in selections:
+        service_condition &= _band_range('price', PRICE_BANDS, selections['price_band'])
+    if 'duration' in selections:
+        service_condition &= _band_range('duration', DURATION_BUCKETS, selections['duration'])
+    if service_condition:
+        if services_of_hairdresser is None:
+            condition &= service_condition
+        else:
+            condition &= Exists(services_of_hairdresser.filter(service_condition))
+    return condition
+
+def candidate_rows(hairdresser_ids, service_ids, selections):
+    """
+    Union of the rows of the candidate hairdressers and services left by the
+    selections, with the values of the facets. Each result has one row with
+    its location (and, for services, their bands), one per preference and, for
+    hairdressers, one per service, the facets a row does not carry being NULL.
+    """
+    from service.models import Service
+    from users.models import Hairdresser
+
+    nothing = {
+        'neighborhood': Value(None, output_field=CharField()),
+        'city': Value(None, output_field=CharField()),
+        'preference_id': Value(None, output_field=IntegerField()),
+        'preference_name': Value(None, output_field=CharField()),
+        'price_band': Value(None, output_field=CharField()),
+        'duration_band': Value(None, output_field=CharField()),
+    }
+
+    def row(result_type, **facets):
+        return {
+            'result_type': Value(result_type, output_field=CharField()),
+            'result_id': F('id'),
+            **nothing,
+            **facets,
+        }
+
+    def location(user_path):
+        return {'neighborhood': F(f'{user_path}neighborhood'), 'city': F(f'{user_path}city')}
+
+    def preference(user_path):
+        return {'preference_id': F(f'{user_path}preferences'), 'preference_name': F(f'{user_path}preferences__name')}
+
+    def bands(service_path):
+        return {
+            'price_band': _band_expression(f'{service_path}price', PRICE_BANDS),
+            'duration_band': _band_expression(f'{service_path}duration', DURATION_BUCKETS),
+        }
+
+    hairdressers = Hairdresser.objects.filter(id__in=hairdresser_ids).filter(
+        _selection_filter(selections, 'user__', Service.objects.filter(hairdresser_id=OuterRef('id')))
+    )
+    services = Service.objects.filter(id__in=service_ids).filter(
+        _selection_filter(selections, 'hairdresser__user__', None)
+    )
+    return hairdressers.values(**row(HAIRDRESSER_RESULT, **location('user__'))).union(
+        hairdressers.filter(user__preferences__isnull=False).values(**row(HAIRDRESSER_RESULT, **preference('user__'))),
+        hairdressers.filter(service__isnull=False).values(**row(HAIRDRESSER_RESULT, **bands('service__'))),
+        services.values(**row(SERVICE_RESULT, **location('hairdresser__user__'), **bands(''))),
+        services.filter(hairdresser__user__preferences__isnull=False).values(
+            **row(SERVICE_RESULT, **preference('hairdresser__user__'))
+        ),
+        all=True,
+    )
+
+def candidate_window(scores):
+    """
+    The ids of the MAX_FACET_CANDIDATES best ranked results of a search, as
+    ({hairdresser ids}, {service ids}).
+    """
+    window = {HAIRDRESSER_RESULT: set(), SERVICE_RESULT: set()}
+    for _, type_rank, result_id in ranked_page(scores, MAX_FACET_CANDIDATES):
+        window[RESULT_TYPES[type_rank]].add(result_id)
+    return window[HAIRDRESSER_RESULT], window[SERVICE_RESULT]
+
+def count_facets(hairdresser_ids, service_ids, selections=None, list_results=False):
+    """
+    Counts the results of each facet value in one query. Returns the counts as
+    {facet: [{'value', 'label', 'count'}]}, most results first, and, with
+    `list_results`, the {result_type: ids} left by the selections (None
+    otherwise).
+    """
+    selections = selections or {}
+    hairdresser_ids, service_ids = list(hairdresser_ids), list(service_ids)
+    facets = {facet: [] for facet in FACETS}
+    results = {HAIRDRESSER_RESULT: set(), SERVICE_RESULT: set()} if list_results else None
+    if not hairdresser_ids and not service_ids:
+        return facets, results
+
+    sets = ['(neighborhood)', '(city)', '(preference_id, preference_name)', '(price_band)', '(duration_band)']
+    if list_results:
+        sets.append('(result_type, result_id)')
+        by_result, result_columns = 'GROUPING(result_type, result_id) = 0', 'result_type, result_id'
+    else:
+        # Only grouped columns can be selected
+        by_result, result_columns = 'FALSE', 'NULL, NULL'
+    rows_sql, params = candidate_rows(hairdresser_ids, service_ids, selections).query.sql_with_params()
+    sql = _FACET_SQL.format(by_result=by_result, result_columns=result_columns, rows=rows_sql, sets=', '.join(sets))
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for (
+            by_result, by_neighborhood, by_city, by_preference, by_price_band, by_duration,
+            result_type, result_id, neighborhood, city, preference_id, preference_name, price_band, duration_band,
+            count,
+        ) in cursor.fetchall():
+            if by_result:
+                results[result_type].add(result_id)
+            elif by_neighborhood and neighborhood:
+                facets['neighborhood'].append({'value': neighborhood, 'label': neighborhood, 'count': count})
+            elif by_city and city:
+                facets['city'].append({'value': city, 'label': city, 'count': count})
+            elif by_preference and preference_id is not None:
+                facets['preference'].append({'value': preference_id, 'label': preference_name, 'count': count})
+            elif by_price_band and price_band:
+                facets['price_band'].append({'value': price_band, 'label': price_band, 'count': count})
+            elif by_duration and duration_band:
+                facets['duration'].append({'value': duration_band, 'label': duration_band, 'count': count})
+
+    for facet in ('neighborhood', 'city', 'preference'):
+        facets[facet].sort(key=lambda value: (-value['count'], value['label']))
+    # Bands keep their order
+    for facet, bands in (('price_band', PRICE_BANDS), ('duration', DURATION_BUCKETS)):
+        order = [key for key, _, _ in bands]
+        facets[facet].sort(key=lambda value: order.index(value['value']))
+    return facets, results
@@ -0,0 +1,162 @@
+"""
+Scored "for you" ranking of CustomerHomeView.
+
+Hairdressers sharing at least one preference with the customer are ranked by a
+weighted sum (WEIGHTS) of:
+- overlap: the share of the customer's preferences the hairdresser has;
+- rating: the review average, out of 5 (review.ratings);
+- popularity: the bookings of the hairdresser's services, log scaled against
+  the most booked hairdresser;
+- neighborhood: 1 when the hairdresser is in the customer's neighborhood.
+
+Scores are computed with NumPy over a ForYouMatrix, which holds the
+hairdresser x preference incidence matrix and one array per hairdresser
+signal. The matrix is built from two queries and cached per process, like the
+search index. Hairdresser and preference writes drop it once their transaction
+commits (users signals). Bookings and reviews only age it: it is rebuilt MAX_AGE seconds
+after it was built.
+"""
+import threading
+import time
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count
+
+from review.ratings import rating_expression
+from users.search import fold_accents
+
+MAX_AGE = 300
+WEIGHTS = {'overlap': 0.5, 'rating': 0.2, 'popularity': 0.2, 'neighborhood': 0.1}
+MAX_RATING = 5
+
+_matrix = None
+_lock = threading.Lock()
+
+
+class ForYouMatrix:
+    def __init__(self, rows, memberships):
+        """
+        `rows` are (hairdresser id, user id, rating, neighborhood, bookings),
+        `memberships` (user id, preference id) pairs.
+        """
+        rows = sorted(rows)
+        self.built_at = time.time()
+        self.hairdresser_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+
+        row_of_user = {row[1]: position for position, row in enumerate(rows)}
+        self.columns = {}
+        cells = []
+        for user_id, preference_id in memberships:
+            if user_id in row_of_user:
+                column = self.columns.setdefault(preference_id, len(self.columns))
+                cells.append((row_of_user[user_id], column))
+        self.incidence = np.zeros((len(rows), len(self.columns)), dtype=np.float32)
+        if cells:
+            cell_rows, cell_columns = zip(*cells)
+            self.incidence[list(cell_rows), list(cell_columns)] = 1
+
+        ratings = np.fromiter((row[2] or 0 for row in rows), dtype=np.float64, count=len(rows))
+        self.rating = np.clip(ratings / MAX_RATING, 0, 1)
+        bookings = np.log1p(np.fromiter((row[4] for row in rows), dtype=np.float64, count=len(rows)))
+        self.popularity = bookings / bookings.max() if len(rows) and bookings.max() > 0 else bookings
+
+        self.neighborhood_codes = {}
+        self.neighborhoods = np.fromiter(
+            (self._neighborhood_code(row[3], create=True) for row in rows), dtype=np.int32, count=len(rows),
+        )
+
+    def _neighborhood_code(self, neighborhood, create=False):
+        # -1 for hairdressers without neighborhood, -2 for customers whose
+        # neighborhood no hairdresser has: neither matches anything
+        key = fold_accents(neighborhood or '')
+        if create:
+            return self.neighborhood_codes.setdefault(key, len(self.neighborhood_codes)) if key else -1
+        return self.neighborhood_codes.get(key, -2)
+
+    def scores(self, preference_ids, neighborhood):
+        """
+        (score of every hairdresser, mask of the hairdressers sharing a
+        preference with the customer).
+        """
+        wanted = np.zeros(len(self.columns), dtype=np.float32)
+        for preference_id in preference_ids:
+            if preference_id in self.columns:
+                wanted[self.columns[preference_id]] = 1
+        overlap = self.incidence @ wanted
+        candidates = overlap > 0
+        same_neighborhood = self.neighborhoods == self._neighborhood_code(neighborhood)
+
+        scores = (
+            WEIGHTS['overlap'] * overlap.astype(np.float64) / max(len(preference_ids), 1)
+            + WEIGHTS['rating'] * self.rating
+            + WEIGHTS['popularity'] * self.popularity
+            + WEIGHTS['neighborhood'] * same_neighborhood
+        )
+        return scores, candidates
+
+    def ranked_page(self, preference_ids, neighborhood, limit, after=None):
+        """
+        [(score, hairdresser id)] of the best `limit` candidates, best first
+        and by id on ties, after the (score, hairdresser id) position of the
+        previous page.
+        """
+        scores, candidates = self.scores(preference_ids, neighborhood)
+        if after is not None:
+            after_score, after_id = after
+            candidates &= (scores < after_score) | ((scores == after_score) & (self.hairdresser_ids > after_id))
+        positions = np.flatnonzero(candidates)
+        page_scores = scores[positions]
+
+        if len(positions) > limit:
+            # Keep the scores tied with the last one, ids decide between them
+            threshold = np.partition(page_scores, len(positions) - limit)[len(positions) - limit]
+            kept = page_scores >= threshold
+            positions, page_scores = positions[kept], page_scores[kept]
+        order = np.lexsort((self.hairdresser_ids[positions], -page_scores))[:limit]
+        return [(float(page_scores[i]), int(self.hairdresser_ids[positions[i]])) for i in order]
+
+    def memory_usage(self):
+        return sum(array.nbytes for array in (
+            self.hairdresser_ids, self.incidence, self.rating, self.popularity, self.neighborhoods,
+        ))
+
+
+def build_matrix():
+    from preferences.models import Preferences
+    from users.models import Hairdresser
+
+    rows = (
+        Hairdresser.objects
+        .filter(user__role='hairdresser')
+        .annotate(bookings=Count('service__reserve'), rating=rating_expression())
+        .values_list('id', 'user_id', 'rating', 'user__neighborhood', 'bookings')
+    )
+    memberships = (
+        Preferences.users.through.objects
+        .filter(user__role='hairdresser')
+        .values_list('user_id', 'preferences_id')
+    )
+    return ForYouMatrix(list(rows), memberships)
+
+def get_matrix():
+    """
+    The matrix of this process, built on first use and rebuilt after MAX_AGE
+    seconds or a relevant write.
+    """
+    global _matrix
+    with _lock:
+        if _matrix is None or time.time() - _matrix.built_at > MAX_AGE:
+            _matrix = build_matrix()
+        return _matrix
+
+def reset():
+    """
+    Drops the matrix of this process, the next ranking rebuilds it.
+    """
+    global _matrix
+    with _lock:
+        _matrix = None
+
+def reset_on_commit():
+    transaction.on_commit(reset)
@@ -0,0 +1,122 @@
+"""
+Coordinates of users and distance search.
+
+Users get coordinates from their CEP (postal_code) through the
+PostalCodeLocation table, which the load_postal_codes command fills from a
+CSV file (users/data/postal_codes.csv by default). The longest known prefix of
+a CEP wins, so a file with full CEPs refines a file with ranges.
+
+The nearby search first keeps the users inside the bounding box of the search
+radius, which the (latitude, longitude) index answers, then computes the exact
+haversine distance of those candidates only.
+"""
+import math
+import re
+
+from django.db.models import F, FloatField, Func, OuterRef, Q, Subquery, TextField, Value
+from django.db.models.functions import ASin, Cos, Left, Least, Length, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+CEP_LENGTH = 8
+MIN_PREFIX_LENGTH = 2
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_postal_code(postal_code):
+    """
+    The digits of a CEP ("69050-750" -> "69050750").
+    """
+    return _NON_DIGITS.sub('', postal_code or '')[:CEP_LENGTH]
+
+def _digits(expression):
+    return Func(expression, Value(r'\D'), Value(''), Value('g'), function='regexp_replace', output_field=TextField())
+
+def _prefixes(cep):
+    return [cep[:length] for length in range(min(len(cep), CEP_LENGTH), MIN_PREFIX_LENGTH - 1, -1)]
+
+def resolve_coordinates(postal_code):
+    """
+    (latitude, longitude) of the longest known prefix of a CEP, or None.
+    """
+    from users.models import PostalCodeLocation
+
+    prefixes = _prefixes(normalize_postal_code(postal_code))
+    if not prefixes:
+        return None
+    return (
+        PostalCodeLocation.objects
+        .filter(prefix__in=prefixes)
+        .order_by(Length('prefix').desc())
+        .values_list('latitude', 'longitude')
+        .first()
+    )
+
+def geocode_users(queryset=None):
+    """
+    Recomputes the coordinates of users (all of them by default) in a single
+    UPDATE, after the postal code table changed. Returns the number of users
+    updated.
+    """
+    from users.models import PostalCodeLocation, User
+
+    if queryset is None:
+        queryset = User.objects.all()
+
+    # The CEP digits are at most 8 characters, its prefixes are looked up by
+    # primary key rather than comparing every row of the table
+    prefixes = Q()
+    for length in range(CEP_LENGTH, MIN_PREFIX_LENGTH - 1, -1):
+        prefixes |= Q(prefix=Left(_digits(OuterRef('postal_code')), length))
+    best_location = PostalCodeLocation.objects.filter(prefixes).order_by(Length('prefix').desc())
+    return queryset.update(
+        latitude=Subquery(best_location.values('latitude')[:1]),
+        longitude=Subquery(best_location.values('longitude')[:1]),
+    )
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    (min_latitude, max_latitude, min_longitude, max_longitude) enclosing the
+    circle of the radius around a point.
+    """
+    latitude_delta = radius_km / KM_PER_DEGREE
+    # Degrees of longitude shrink towards the poles
+    longitude_scale = max(math.cos(math.radians(latitude)), 0.01)
+    longitude_delta = min(radius_km / (KM_PER_DEGREE * longitude_scale), 180)
+    return (
+        latitude - latitude_delta, latitude + latitude_delta,
+        longitude - longitude_delta, longitude + longitude_delta,
+    )
+
+def haversine_km(latitude, longitude, latitude_field, longitude_field):
+    """
+    Expression of the great-circle distance in km between a point and the
+    coordinates stored in two fields.
+    """
+    latitude_rad = math.radians(latitude)
+    half_latitude_delta = (Radians(F(latitude_field)) - Value(latitude_rad)) / Value(2.0)
+    half_longitude_delta = (Radians(F(longitude_field)) - Value(math.radians(longitude))) / Value(2.0)
+    chord = (
+        Power(Sin(half_latitude_delta), 2)
+        + Value(math.cos(latitude_rad)) * Cos(Radians(F(latitude_field))) * Power(Sin(half_longitude_delta), 2)
+    )
+    # Rounding can push the chord slightly above 1 for antipodal points
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(Least(chord, Value(1.0))), output_field=FloatField())
+
+def nearby_hairdressers(queryset, latitude, longitude, radius_km):
+    """
+    Hairdressers of the queryset within the radius of a point, annotated with
+    their `distance_km` and closest first.
+    """
+    min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(latitude, longitude, radius_km)
+    return (
+        queryset
+        .filter(
+            user__latitude__range=(min_latitude, max_latitude),
+            user__longitude__range=(min_longitude, max_longitude),
+        )
+        .annotate(distance_km=haversine_km(latitude, longitude, 'user__latitude', 'user__longitude'))
+        .filter(distance_km__lte=radius_km)
+        .order_by('distance_km', 'id')
+    )
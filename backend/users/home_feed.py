@@ -0,0 +1,197 @@
+"""
+Home feed rails of CustomerHomeView.
+
+A rail lists the hairdressers of one preference, for each preference named in
+settings.HOME_FEED_RAILS, and the "em alta" rail the RAIL_SIZE hairdressers
+with the best trending score (reserve.trending). Rails are the same for every
+customer, so they are serialized once into a snapshot kept in the Django
+cache and the home screen only reads it; the personalized "for you" list is
+the only part built per request.
+
+The snapshot is rebuilt:
+- once the transaction of a write that changes a rail commits (users signals);
+- in a background thread when a request finds it older than
+  settings.HOME_FEED_MAX_AGE seconds, the stale rails are served meanwhile;
+- by the refresh_home_feed command, which servers sharing the Django cache see.
+Only a cold cache builds it on the request path. Trending scores change with
+every booking without a signal, the "em alta" rail follows them as the
+snapshot ages.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from review.ratings import rating_expression
+from users.search import fold_accents
+
+SNAPSHOT_KEY = 'home_feed:rails'
+RAIL_SIZE = 10
+
+_refreshing = threading.Lock()
+
+
+def rail_key(name):
+    """
+    Response key of the rail of a preference ("Coloração" -> "coloracao").
+    """
+    return fold_accents(name).replace(' ', '_')
+
+def _projection():
+    """
+    (hairdresser fields, user fields) of HairdresserSerializer, which the rails
+    mirror.
+    """
+    from users.serializers import HairdresserSerializer
+
+    fields = HairdresserSerializer().fields
+    return [name for name in fields if name != 'user'], list(fields['user'].fields)
+
+def build_rails():
+    """
+    {rail key: serialized hairdressers} of the configured preferences, in
+    configuration order, best rated first. Unknown preferences get an empty
+    rail.
+
+    Every rail comes from one query: the preference memberships of
+    hairdressers are numbered by ROW_NUMBER() within each preference and the
+    first RAIL_SIZE of each are projected with values(), then grouped here.
+    """
+    from preferences.models import Preferences
+
+    names = list(settings.HOME_FEED_RAILS)
+    hairdresser_fields, user_fields = _projection()
+    rows = (
+        Preferences.users.through.objects
+        .filter(preferences__name__in=names, user__role='hairdresser', user__hairdresser__isnull=False)
+        .annotate(rail_rank=Window(
+            RowNumber(),
+            partition_by=F('preferences__name'),
+            order_by=[
+                rating_expression('user__hairdresser__rating_avg', 'user__rating').desc(nulls_last=True),
+                F('user_id').asc(),
+            ],
+        ))
+        .filter(rail_rank__lte=RAIL_SIZE)
+        .order_by('rail_rank')
+        .values(
+            'preferences__name',
+            *(f'user__hairdresser__{field}' for field in hairdresser_fields),
+            *(f'user__{field}' for field in user_fields),
+        )
+    )
+
+    rails = {rail_key(name): [] for name in names}
+    for row in rows:
+        rails[rail_key(row['preferences__name'])].append(
+            _hairdresser(row, 'user__hairdresser__', hairdresser_fields, user_fields),
+        )
+    return rails
+
+def build_trending():
+    """
+    The serialized RAIL_SIZE hairdressers with the best trending score, in one
+    query read from the trending index.
+    """
+    from users.models import Hairdresser
+
+    hairdresser_fields, user_fields = _projection()
+    rows = (
+        Hairdresser.objects
+        .filter(user__role='hairdresser', trending_score__gt=0)
+        .order_by('-trending_score', '-id')
+        .values(*hairdresser_fields, *(f'user__{field}' for field in user_fields))
+    )
+    return [_hairdresser(row, '', hairdresser_fields, user_fields) for row in rows[:RAIL_SIZE]]
+
+def _hairdresser(row, prefix, hairdresser_fields, user_fields):
+    """
+    The serializer representation of a hairdresser projected with values(),
+    its fields prefixed by `prefix`.
+    """
+    from users.models import User
+
+    user = {field: row[f'user__{field}'] for field in user_fields}
+    # As the ImageField of the serializer renders it without a request
+    picture = user['profile_picture']
+    user['profile_picture'] = User._meta.get_field('profile_picture').storage.url(picture) if picture else None
+    hairdresser = {field: row[f'{prefix}{field}'] for field in hairdresser_fields}
+    hairdresser['user'] = user
+    return hairdresser
+
+def refresh():
+    """
+    Rebuilds the snapshot and stores it. Returns the snapshot.
+    """
+    # Stamped before reading, a write committed during the build is not
+    # considered covered by it
+    built_at = time.time()
+    snapshot = {'rails': build_rails(), 'trending': build_trending(), 'built_at': built_at}
+    cache.set(SNAPSHOT_KEY, snapshot, timeout=None)
+    return snapshot
+
+def refresh_on_commit():
+    """
+    Rebuilds the snapshot once the current transaction commits. The writes of
+    one transaction share a single rebuild.
+    """
+    requested_at = time.time()
+
+    def apply():
+        snapshot = cache.get(SNAPSHOT_KEY)
+        # Nothing to refresh until someone reads it, then it is built anyway
+        if snapshot is not None and snapshot['built_at'] < requested_at:
+            refresh()
+    transaction.on_commit(apply)
+
+def _refresh_in_background():
+    if not _refreshing.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            refresh()
+        except DatabaseError as e:
+            print(f"Home feed rails not refreshed: {e}")
+        finally:
+            connections.close_all()
+            _refreshing.release()
+    threading.Thread(target=run, daemon=True).start()
+
+def get_snapshot():
+    """
+    The current snapshot, built when the cache is cold.
+    """
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot is None:
+        return refresh()
+    if time.time() - snapshot['built_at'] > settings.HOME_FEED_MAX_AGE:
+        _refresh_in_background()
+    return snapshot
+
+def get_rails():
+    """
+    The rails of the current snapshot.
+    """
+    return get_snapshot()['rails']
+
+def reset():
+    """
+    Drops the snapshot, the next read rebuilds it.
+    """
+    cache.delete(SNAPSHOT_KEY)
+
+def warm():
+    """
+    Builds the snapshot ahead of the first home screen. Called by the
+    WSGI/ASGI entry points; a database that is not reachable yet only delays
+    the build.
+    """
+    try:
+        get_rails()
+    except DatabaseError as e:
+        print(f"Home feed rails not built at startup: {e}")
@@ -0,0 +1,171 @@
+import random
+import statistics
+import time as timer
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from faker import Faker
+
+from preferences.models import Preferences
+from reserve.models import Reserve
+from service.models import Service
+from users import for_you, home_feed
+from users.models import Customer, Hairdresser, User
+from users.serializers import HairdresserSerializer
+from users.views import CustomerHomeView, with_any_preference
+
+
+class Command(BaseCommand):
+    """
+    Seeds a throwaway catalogue inside a transaction that is rolled back at the
+    end and compares the "for you" list built by the database (every
+    hairdresser sharing a preference, serialized in full, as before the
+    scorer) with the NumPy scorer. "score" is the ranking alone, "endpoint"
+    the home screen with the rails snapshot warm.
+    """
+
+    help = "Benchmarks the scored \"for you\" ranking of the customer home screen"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hairdressers", type=int, default=20000)
+        parser.add_argument("--preferences", type=int, default=50)
+        parser.add_argument("--bookings", type=int, default=50000)
+        parser.add_argument("--customers", type=int, default=100)
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options["seed"])
+        fake = Faker("pt_BR")
+        fake.seed_instance(options["seed"])
+
+        with transaction.atomic():
+            self.stdout.write(
+                f"Seeding {options['hairdressers']} hairdressers x {options['preferences']} preferences..."
+            )
+            customers = self.seed(fake, options)
+            self.analyze()
+
+            for_you.reset()
+            started_at = timer.perf_counter()
+            matrix = for_you.get_matrix()
+            self.stdout.write(
+                f"Built the matrix in {(timer.perf_counter() - started_at) * 1000:.0f}ms "
+                f"({matrix.incidence.shape[0]}x{matrix.incidence.shape[1]}, {matrix.memory_usage() / 1024:.0f} KiB)"
+            )
+
+            preference_ids = {
+                customer.id: list(customer.preferences.values_list("id", flat=True)) for customer in customers
+            }
+            self.report("database", customers, lambda customer: self.database_for_you(preference_ids[customer.id]))
+            self.report(
+                "score", customers,
+                lambda customer: len(matrix.ranked_page(preference_ids[customer.id], customer.neighborhood, options["limit"] + 1)),
+            )
+
+            home_feed.refresh()
+            view = CustomerHomeView.as_view()
+            factory = RequestFactory()
+            self.report(
+                "endpoint", customers,
+                lambda customer: view(factory.get("/", {"limit": options["limit"]}), email=customer.email),
+            )
+
+            for_you.reset()
+            home_feed.reset()
+            transaction.set_rollback(True)
+
+    def analyze(self):
+        # Refresh the planner statistics so the seeded rows are planned like production data
+        with connection.cursor() as cursor:
+            for model in (User, Hairdresser, Service, Reserve, Preferences, Preferences.users.through):
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+    def seed(self, fake, options):
+        neighborhoods = sorted({fake.bairro() for _ in range(500)})
+        users = User.objects.bulk_create(
+            (
+                User(
+                    email=f"benchmark-{i}@hairmatch.test",
+                    first_name=fake.first_name(),
+                    last_name=fake.last_name(),
+                    phone=f"55929{i:08d}",
+                    neighborhood=random.choice(neighborhoods),
+                    city="Manaus",
+                    state="AM",
+                    address=fake.street_name(),
+                    postal_code="69000000",
+                    rating=random.randint(1, 5),
+                    role="hairdresser",
+                )
+                for i in range(options["hairdressers"])
+            ),
+            batch_size=5000,
+        )
+        hairdressers = Hairdresser.objects.bulk_create(
+            (Hairdresser(user=user, cnpj="00000000000000") for user in users),
+            batch_size=5000,
+        )
+
+        preferences = Preferences.objects.bulk_create(
+            Preferences(name=f"Benchmark {i}") for i in range(options["preferences"])
+        )
+        Preferences.users.through.objects.bulk_create(
+            (
+                Preferences.users.through(preferences_id=preference.id, user_id=user.id)
+                for user in users
+                for preference in random.sample(preferences, random.randint(1, 5))
+            ),
+            batch_size=5000,
+        )
+
+        services = Service.objects.bulk_create(
+            (Service(name="Corte", price=random.randint(40, 200), duration=60, hairdresser=hairdresser) for hairdresser in hairdressers),
+            batch_size=5000,
+        )
+
+        customer_users = User.objects.bulk_create(
+            User(
+                email=f"benchmark-customer-{i}@hairmatch.test",
+                phone=f"55920{i:08d}",
+                neighborhood=random.choice(neighborhoods),
+                postal_code="69000000",
+                role="customer",
+            )
+            for i in range(options["customers"])
+        )
+        customers = Customer.objects.bulk_create(Customer(user=user) for user in customer_users)
+        Preferences.users.through.objects.bulk_create(
+            Preferences.users.through(preferences_id=preference.id, user_id=user.id)
+            for user in customer_users
+            for preference in random.sample(preferences, random.randint(1, 4))
+        )
+        # A few hairdressers get most of the bookings
+        popularity = [1 / (rank + 1) for rank in range(len(services))]
+        Reserve.objects.bulk_create(
+            (
+                Reserve(customer=random.choice(customers), service=service)
+                for service in random.choices(services, popularity, k=options["bookings"])
+            ),
+            batch_size=5000,
+        )
+        return customer_users
+
+    def database_for_you(self, preference_ids):
+        hairdressers = with_any_preference(Hairdresser.objects.select_related("user").filter(user__role="hairdresser"), preference_ids)
+        return len(HairdresserSerializer(hairdressers, many=True).data)
+
+    def report(self, label, items, run):
+        timings = []
+        for item in items:
+            started_at = timer.perf_counter()
+            run(item)
+            timings.append(timer.perf_counter() - started_at)
+
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) >= 20 else timings[-1]
+        self.stdout.write(
+            f"{label:>9}: {len(items)} runs | median {statistics.median(timings) * 1000:.2f}ms | "
+            f"p95 {p95 * 1000:.2f}ms | max {timings[-1] * 1000:.2f}ms"
+        )
@@ -0,0 +1,132 @@
+import random
+import statistics
+import time as timer
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from faker import Faker
+
+from users.models import Hairdresser, User
+from users.search import fold_accents, match_hairdresser_names, refresh_search_documents
+
+
+class Command(BaseCommand):
+    """
+    Seeds a throwaway user base inside a transaction that is rolled back at the
+    end and compares the trigram name matching with the icontains lookup it
+    replaced, on names typed the way customers type them: in full, without
+    accents, with typos or first name only.
+    """
+
+    help = "Benchmarks the fuzzy hairdresser name search"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100000)
+        parser.add_argument("--hairdresser-ratio", type=float, default=0.2)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options["seed"])
+        fake = Faker("pt_BR")
+        fake.seed_instance(options["seed"])
+
+        with transaction.atomic():
+            self.stdout.write(f"Seeding {options['users']} users...")
+            hairdressers = self.seed(fake, options["users"], options["hairdresser_ratio"])
+            self.analyze()
+
+            targets = random.sample(hairdressers, min(options["queries"], len(hairdressers)))
+            queries = [(hairdresser.id, self.typed_name(hairdresser.user)) for hairdresser in targets]
+
+            self.report_plan(queries[0][1])
+            self.report("icontains", queries, self.icontains_search)
+            self.report("trigram", queries, self.trigram_search)
+
+            transaction.set_rollback(True)
+
+    def analyze(self):
+        # Refresh the planner statistics so the seeded rows are planned like production data
+        with connection.cursor() as cursor:
+            for model in (User, Hairdresser):
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+    def seed(self, fake, user_count, hairdresser_ratio):
+        users = User.objects.bulk_create(
+            (
+                User(
+                    email=f"benchmark-{i}@hairmatch.test",
+                    first_name=fake.first_name(),
+                    last_name=" ".join(fake.last_name() for _ in range(random.choice([1, 2]))),
+                    phone=f"55929{i:08d}",
+                    neighborhood="Centro",
+                    city="Manaus",
+                    state="AM",
+                    address="Rua do Benchmark",
+                    postal_code="69000000",
+                    role="customer",
+                )
+                for i in range(user_count)
+            ),
+            batch_size=5000,
+        )
+        hairdresser_users = random.sample(users, int(user_count * hairdresser_ratio))
+        User.objects.filter(id__in=[user.id for user in hairdresser_users]).update(role="hairdresser")
+
+        hairdressers = Hairdresser.objects.bulk_create(
+            (Hairdresser(user=user, cnpj="00000000000000") for user in hairdresser_users),
+            batch_size=5000,
+        )
+        # bulk_create skips the users signals, so the search fields are built in one go
+        refresh_search_documents()
+        return hairdressers
+
+    def typed_name(self, user):
+        full_name = f"{user.first_name} {user.last_name}"
+        style = random.choice(["full", "unaccented", "typo", "first"])
+        if style == "unaccented":
+            return fold_accents(full_name)
+        if style == "typo":
+            position = random.randrange(1, len(full_name) - 1)
+            return full_name[:position] + full_name[position + 1:]
+        if style == "first":
+            return user.first_name
+        return full_name
+
+    def icontains_search(self, name):
+        return list(
+            User.objects
+            .filter(role="hairdresser", hairdresser__isnull=False)
+            .filter(Q(first_name__icontains=name) | Q(last_name__icontains=name))
+            .values_list("hairdresser__id", flat=True)
+        )
+
+    def trigram_search(self, name):
+        return [hairdresser.id for hairdresser in match_hairdresser_names(Hairdresser.objects.all(), name)]
+
+    def report_plan(self, name):
+        sql, params = match_hairdresser_names(Hairdresser.objects.all(), name).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN {sql}", params)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        if "hairdresser_name_trgm_idx" in plan:
+            self.stdout.write(self.style.SUCCESS("The trigram query uses hairdresser_name_trgm_idx."))
+        else:
+            self.stdout.write(self.style.WARNING(f"The trigram query does not use the index:\n{plan}"))
+
+    def report(self, label, queries, search):
+        timings = []
+        found = 0
+        for hairdresser_id, name in queries:
+            started_at = timer.perf_counter()
+            results = search(name)
+            timings.append(timer.perf_counter() - started_at)
+            found += hairdresser_id in results
+
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) >= 20 else timings[-1]
+        self.stdout.write(
+            f"{label:>9}: found {found}/{len(queries)} | median {statistics.median(timings) * 1000:.1f}ms | "
+            f"p95 {p95 * 1000:.1f}ms | max {timings[-1] * 1000:.1f}ms"
+        )
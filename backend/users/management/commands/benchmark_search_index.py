@@ -0,0 +1,152 @@
+import random
+import statistics
+import time as timer
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from faker import Faker
+
+from preferences.models import Preferences
+from service.models import Service
+from users import search_index
+from users.filters import HairdresserFilter
+from users.models import Hairdresser, User
+from users.search import refresh_search_documents
+
+
+class Command(BaseCommand):
+    """
+    Seeds a throwaway catalogue inside a transaction that is rolled back at the
+    end and compares the global search answered by the in-memory index with the
+    Postgres path (HairdresserFilter and service icontains). The database path
+    fetches every match, the index path ranks the matches and fetches the
+    first page only, like the view. "lookup" is the index scoring alone.
+    """
+
+    help = "Benchmarks the in-memory global search index against the database search"
+
+    PREFERENCE_NAMES = ["Coloração", "Cachos", "Corte", "Tranças", "Alisamento", "Penteados", "Mechas", "Barba"]
+    SERVICE_NAMES = ["Corte de Cabelo", "Coloração", "Box Braids", "Hidratação", "Escova", "Luzes", "Progressiva"]
+    CITIES = ["Manaus", "Itacoatiara", "Parintins", "Manacapuru", "Coari"]
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hairdressers", type=int, default=5000)
+        parser.add_argument("--queries", type=int, default=300)
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options["seed"])
+        fake = Faker("pt_BR")
+        fake.seed_instance(options["seed"])
+
+        with transaction.atomic():
+            self.stdout.write(f"Seeding {options['hairdressers']} hairdressers...")
+            users = self.seed(fake, options["hairdressers"])
+            self.analyze()
+
+            started_at = timer.perf_counter()
+            index = search_index.build_index()
+            self.stdout.write(f"Built the index in {(timer.perf_counter() - started_at) * 1000:.0f}ms")
+            for line in search_index.format_memory_report(index):
+                self.stdout.write(line)
+
+            queries = [self.typed_query(random.choice(users)) for _ in range(options["queries"])]
+            self.report("database", queries, self.database_search)
+            self.report("index", queries, lambda query: self.index_search(index, query, options["limit"]))
+            self.report("lookup", queries, lambda query: sum(map(len, index.scores(query).values())))
+
+            # A single letter matches most of the catalogue
+            matches = sum(map(len, index.scores("c").values()))
+            self.report(f"'c' page ({matches} matches)", ["c"] * 20, lambda query: self.index_search(index, query, options["limit"]))
+
+            transaction.set_rollback(True)
+
+    def analyze(self):
+        # Refresh the planner statistics so the seeded rows are planned like production data
+        with connection.cursor() as cursor:
+            for model in (User, Hairdresser, Service, Preferences, Preferences.users.through):
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+    def seed(self, fake, hairdresser_count):
+        users = User.objects.bulk_create(
+            (
+                User(
+                    email=f"benchmark-{i}@hairmatch.test",
+                    first_name=fake.first_name(),
+                    last_name=fake.last_name(),
+                    phone=f"55929{i:08d}",
+                    neighborhood=fake.bairro(),
+                    city=random.choice(self.CITIES),
+                    state="AM",
+                    address=fake.street_name(),
+                    postal_code="69000000",
+                    role="hairdresser",
+                )
+                for i in range(hairdresser_count)
+            ),
+            batch_size=5000,
+        )
+        hairdressers = Hairdresser.objects.bulk_create(
+            (Hairdresser(user=user, cnpj="00000000000000", resume=fake.paragraph()) for user in users),
+            batch_size=5000,
+        )
+
+        preferences = [Preferences.objects.create(name=name) for name in self.PREFERENCE_NAMES]
+        Preferences.users.through.objects.bulk_create(
+            (
+                Preferences.users.through(preferences_id=preference.id, user_id=user.id)
+                for user in users
+                for preference in random.sample(preferences, random.randint(1, 3))
+            ),
+            batch_size=5000,
+        )
+
+        Service.objects.bulk_create(
+            (
+                Service(name=name, price=random.randint(40, 200), duration=60, hairdresser=hairdresser)
+                for hairdresser in hairdressers
+                for name in random.sample(self.SERVICE_NAMES, 3)
+            ),
+            batch_size=5000,
+        )
+        # bulk_create skips the users signals, so the search documents are built in one go
+        refresh_search_documents()
+        return users
+
+    def typed_query(self, user):
+        return random.choice([
+            user.first_name,
+            f"{user.first_name} {user.last_name}",
+            user.last_name[:4],
+            user.city,
+            random.choice(self.PREFERENCE_NAMES),
+            random.choice(self.SERVICE_NAMES).split()[0][:5],
+            f"{random.choice(self.PREFERENCE_NAMES)} {user.city}",
+        ])
+
+    def database_search(self, query):
+        hairdressers = list(HairdresserFilter({"search": query}, queryset=Hairdresser.objects.select_related("user")).qs)
+        services = list(Service.objects.select_related("hairdresser__user").filter(name__icontains=query))
+        return len(hairdressers) + len(services)
+
+    def index_search(self, index, query, limit):
+        page = search_index.ranked_page(index.scores(query), limit)
+        hairdressers = Hairdresser.objects.select_related("user").in_bulk([hit[2] for hit in page if hit[1] == 0])
+        services = Service.objects.select_related("hairdresser__user").in_bulk([hit[2] for hit in page if hit[1] == 1])
+        return len(hairdressers) + len(services)
+
+    def report(self, label, queries, search):
+        timings = []
+        results = 0
+        for query in queries:
+            started_at = timer.perf_counter()
+            results += search(query)
+            timings.append(timer.perf_counter() - started_at)
+
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) >= 20 else timings[-1]
+        self.stdout.write(
+            f"{label:>9}: {results / len(queries):.0f} rows per query | "
+            f"median {statistics.median(timings) * 1000:.1f}ms | p95 {p95 * 1000:.1f}ms | max {timings[-1] * 1000:.1f}ms"
+        )
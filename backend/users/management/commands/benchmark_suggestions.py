@@ -0,0 +1,161 @@
+import random
+import statistics
+import time as timer
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from faker import Faker
+
+from preferences.models import Preferences
+from reserve.models import Reserve
+from service.models import Service
+from users import search_index, suggest
+from users.models import Customer, Hairdresser, User
+from users.views import SearchSuggestionView
+
+TARGET_P99_MS = 5
+
+
+class Command(BaseCommand):
+    """
+    Seeds a throwaway catalogue with bookings inside a transaction that is
+    rolled back at the end and times the autocomplete endpoint on prefixes
+    typed one letter at a time, as the search box sends them. Also times the
+    in-place updates applied when a booking is made.
+    """
+
+    help = "Benchmarks the autocomplete suggestions"
+
+    PREFERENCE_NAMES = ["Coloração", "Cachos", "Corte", "Tranças", "Alisamento", "Penteados", "Mechas", "Barba"]
+    SERVICE_NAMES = ["Corte de Cabelo", "Coloração", "Box Braids", "Hidratação", "Escova", "Luzes", "Progressiva"]
+
+    def add_arguments(self, parser):
+        parser.add_argument("--entries", type=int, default=50000, help="Approximate number of suggestions")
+        parser.add_argument("--bookings", type=int, default=100000)
+        parser.add_argument("--queries", type=int, default=2000)
+        parser.add_argument("--updates", type=int, default=500)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options["seed"])
+        fake = Faker("pt_BR")
+        fake.seed_instance(options["seed"])
+
+        with transaction.atomic():
+            self.stdout.write(f"Seeding {options['entries']} suggestions and {options['bookings']} bookings...")
+            labels, hairdresser_ids = self.seed(fake, options["entries"], options["bookings"])
+            self.analyze()
+
+            search_index.reset()
+            started_at = timer.perf_counter()
+            index = search_index.get_index()
+            self.stdout.write(f"Built the index in {(timer.perf_counter() - started_at) * 1000:.0f}ms")
+            for line in search_index.format_memory_report(index):
+                self.stdout.write(line)
+
+            queries = []
+            while len(queries) < options["queries"]:
+                label = random.choice(labels)
+                queries.extend(label[:length] for length in range(1, min(len(label), 12) + 1))
+            queries = queries[:options["queries"]]
+
+            view = SearchSuggestionView.as_view()
+            factory = RequestFactory()
+            self.report("lookup", queries, lambda query: index.suggestions.suggest(query, 8))
+            p99 = self.report("endpoint", queries, lambda query: view(factory.get("/api/user/search/suggest", {"search": query})))
+            rows = suggest.load_hairdresser_rows(hairdresser_ids=random.sample(hairdresser_ids, options["updates"]))
+            self.report("update", list(rows.items()), self.book)
+
+            if p99 < TARGET_P99_MS:
+                self.stdout.write(self.style.SUCCESS(f"Endpoint p99 {p99:.2f}ms is under {TARGET_P99_MS}ms."))
+            else:
+                self.stdout.write(self.style.WARNING(f"Endpoint p99 {p99:.2f}ms is over {TARGET_P99_MS}ms."))
+
+            search_index.reset()
+            transaction.set_rollback(True)
+
+    def analyze(self):
+        # Refresh the planner statistics so the seeded rows are planned like production data
+        with connection.cursor() as cursor:
+            for model in (User, Hairdresser, Service, Reserve, Preferences, Preferences.users.through):
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+    def seed(self, fake, entry_count, booking_count):
+        # Neighborhoods repeat, each one is a single suggestion
+        neighborhoods = sorted({fake.bairro() for _ in range(2000)})[:500]
+        users = User.objects.bulk_create(
+            (
+                User(
+                    email=f"benchmark-{i}@hairmatch.test",
+                    first_name=fake.first_name(),
+                    last_name=fake.last_name(),
+                    phone=f"55929{i:08d}",
+                    neighborhood=random.choice(neighborhoods),
+                    city="Manaus",
+                    state="AM",
+                    address=fake.street_name(),
+                    postal_code="69000000",
+                    role="hairdresser",
+                )
+                for i in range(entry_count - len(neighborhoods))
+            ),
+            batch_size=5000,
+        )
+        hairdressers = Hairdresser.objects.bulk_create(
+            (Hairdresser(user=user, cnpj="00000000000000") for user in users),
+            batch_size=5000,
+        )
+
+        preferences = [Preferences.objects.create(name=name) for name in self.PREFERENCE_NAMES]
+        Preferences.users.through.objects.bulk_create(
+            (
+                Preferences.users.through(preferences_id=preference.id, user_id=user.id)
+                for user in users
+                for preference in random.sample(preferences, random.randint(1, 3))
+            ),
+            batch_size=5000,
+        )
+
+        services = Service.objects.bulk_create(
+            (
+                Service(name=name, price=random.randint(40, 200), duration=60, hairdresser=hairdresser)
+                for hairdresser in hairdressers
+                for name in random.sample(self.SERVICE_NAMES, 2)
+            ),
+            batch_size=5000,
+        )
+
+        customer_user = User.objects.create(
+            email="benchmark-customer@hairmatch.test", phone="55920000000000", postal_code="69000000", role="customer",
+        )
+        customer = Customer.objects.create(user=customer_user)
+        # A few services get most of the bookings
+        popularity = [1 / (rank + 1) for rank in range(len(services))]
+        Reserve.objects.bulk_create(
+            (Reserve(customer=customer, service=service) for service in random.choices(services, popularity, k=booking_count)),
+            batch_size=5000,
+        )
+        labels = [f"{user.first_name} {user.last_name}" for user in users] + self.SERVICE_NAMES + self.PREFERENCE_NAMES
+        return labels, [hairdresser.id for hairdresser in hairdressers]
+
+    def book(self, item):
+        # The row a booking re-reads, with one more booking
+        hairdresser_id, (name, neighborhood, preference_ids, bookings) = item
+        search_index.get_index().suggestions.set_hairdresser(hairdresser_id, (name, neighborhood, preference_ids, bookings + 1))
+
+    def report(self, label, items, run):
+        timings = []
+        for item in items:
+            started_at = timer.perf_counter()
+            run(item)
+            timings.append(timer.perf_counter() - started_at)
+
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) >= 20 else timings[-1]
+        p99 = timings[int(len(timings) * 0.99) - 1] if len(timings) >= 100 else timings[-1]
+        self.stdout.write(
+            f"{label:>9}: {len(items)} runs | median {statistics.median(timings) * 1000:.2f}ms | "
+            f"p95 {p95 * 1000:.2f}ms | p99 {p99 * 1000:.2f}ms | max {timings[-1] * 1000:.2f}ms"
+        )
+        return p99 * 1000
@@ -0,0 +1,61 @@
+import csv
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from users.geo import geocode_users, normalize_postal_code
+from users.models import PostalCodeLocation
+
+DEFAULT_FILE = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'postal_codes.csv')
+
+
+class Command(BaseCommand):
+    """
+    Loads CEP coordinates from a CSV file with prefix, latitude, longitude and
+    (optionally) city columns, then recomputes the coordinates of every user.
+    The bundled file locates the neighbourhoods of Manaus by their 5 digit CEP
+    prefixes and the other capitals by their CEP ranges; a file with full CEPs
+    can be loaded on top of it for street level distances.
+    """
+
+    help = "Loads the CEP to coordinates table and geocodes the users"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", default=DEFAULT_FILE, help="CSV file to load")
+        parser.add_argument(
+            "--replace", action="store_true",
+            help="Delete the loaded postal codes before loading the file",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["file"], newline="", encoding="utf-8") as csv_file:
+                locations = [self.parse(row) for row in csv.DictReader(csv_file)]
+        except OSError as e:
+            raise CommandError(f"Could not read {options['file']}: {e}")
+        except (KeyError, ValueError) as e:
+            raise CommandError(f"Invalid row in {options['file']}: {e}")
+
+        with transaction.atomic():
+            if options["replace"]:
+                PostalCodeLocation.objects.all().delete()
+            PostalCodeLocation.objects.bulk_create(
+                locations,
+                batch_size=5000,
+                update_conflicts=True,
+                unique_fields=["prefix"],
+                update_fields=["latitude", "longitude", "city"],
+            )
+            users = geocode_users()
+
+        self.stdout.write(self.style.SUCCESS(f"Loaded {len(locations)} postal codes and located {users} users"))
+
+    def parse(self, row):
+        prefix = normalize_postal_code(row["prefix"])
+        if not prefix:
+            raise ValueError(f"empty prefix {row['prefix']!r}")
+        latitude, longitude = float(row["latitude"]), float(row["longitude"])
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError(f"coordinates out of range for {prefix}")
+        return PostalCodeLocation(prefix=prefix, latitude=latitude, longitude=longitude, city=row.get("city") or "")
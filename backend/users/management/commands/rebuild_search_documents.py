@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from users.search import refresh_search_documents
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the full-text search documents of the hairdressers.
+    Meant for repair after bulk imports or manual edits made outside the ORM.
+    """
+
+    help = "Rebuilds the hairdresser full-text search documents"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hairdresser", type=int, action="append", dest="hairdressers",
+            help="Only rebuild this hairdresser (can be repeated)",
+        )
+
+    def handle(self, *args, **options):
+        updated = refresh_search_documents(hairdresser_ids=options["hairdressers"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt search documents for {updated} hairdressers"))
@@ -0,0 +1,27 @@
+import time as timer
+
+from django.core.management.base import BaseCommand
+
+from users import search_index
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the in-memory global search index and reports its footprint.
+    Running servers rebuild their own copy within
+    search_index.VERSION_CHECK_INTERVAL seconds.
+    """
+
+    help = "Rebuilds the in-memory global search index and reports its memory footprint"
+
+    def handle(self, *args, **options):
+        search_index.request_rebuild()
+
+        started_at = timer.perf_counter()
+        index = search_index.build_index()
+        elapsed = timer.perf_counter() - started_at
+
+        self.stdout.write(self.style.SUCCESS(f"Built the search index in {elapsed * 1000:.0f}ms"))
+        for line in search_index.format_memory_report(index):
+            self.stdout.write(line)
+
@@ -0,0 +1,24 @@
+import time as timer
+
+from django.core.management.base import BaseCommand
+
+from users import home_feed
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the home feed rails snapshot. Writes already refresh it, schedule
+    this every few minutes to catch the ones that skip the signals (bulk
+    updates, raw SQL).
+    """
+
+    help = "Rebuilds the home feed rails snapshot"
+
+    def handle(self, *args, **options):
+        started_at = timer.perf_counter()
+        snapshot = home_feed.refresh()
+        elapsed = timer.perf_counter() - started_at
+
+        rails = {**snapshot['rails'], 'em alta': snapshot['trending']}
+        rails = ", ".join(f"{key} ({len(hairdressers)})" for key, hairdressers in rails.items())
+        self.stdout.write(self.style.SUCCESS(f"Built the home feed rails in {elapsed * 1000:.0f}ms: {rails}"))
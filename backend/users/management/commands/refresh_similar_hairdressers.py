@@ -0,0 +1,27 @@
+import time as timer
+
+from django.core.management.base import BaseCommand
+
+from users.similar import refresh_similar_hairdressers
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the stored "similar hairdressers" of the hairdressers whose
+    preferences, services or neighborhood changed, and of the ones those
+    changes affect. Schedule it every few hours; --full recomputes everyone,
+    after changing the weights.
+    """
+
+    help = "Refreshes the similar hairdressers table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Recompute every hairdresser")
+
+    def handle(self, *args, **options):
+        started_at = timer.perf_counter()
+        refreshed, total = refresh_similar_hairdressers(full=options["full"])
+        elapsed = timer.perf_counter() - started_at
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshed the similar hairdressers of {refreshed} of {total} hairdressers in {elapsed * 1000:.0f}ms"
+        ))
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.20 on 2026-10-18 13:49
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+from users.search import search_document_expression
+
+
+def build_search_documents(apps, schema_editor):
+    Hairdresser = apps.get_model('users', 'Hairdresser')
+    User = apps.get_model('users', 'User')
+    Preferences = apps.get_model('preferences', 'Preferences')
+
+    Hairdresser.objects.update(search_document=search_document_expression(User, Preferences))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_profile_picture'),
+        ('preferences', '0003_preferences_services'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hairdresser',
+            name='search_document',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='hairdresser',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='hairdresser_search_idx'),
+        ),
+        migrations.RunPython(build_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.20 on 2026-10-18 13:58
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension, UnaccentExtension
+from django.db import migrations, models
+
+from users.search import search_name_expression
+
+
+def build_search_names(apps, schema_editor):
+    Hairdresser = apps.get_model('users', 'Hairdresser')
+    User = apps.get_model('users', 'User')
+
+    Hairdresser.objects.update(search_name=search_name_expression(User))
+
+
+# pg_trgm declares its functions with the default cost of 1, so for long search
+# texts the planner prefers computing similarities over the whole table to the
+# trigram index. A realistic cost keeps the index in use.
+TRIGRAM_FUNCTIONS = ['similarity', 'similarity_op', 'word_similarity', 'word_similarity_commutator_op']
+
+def set_trigram_cost(cost):
+    return ' '.join(f'ALTER FUNCTION {function}(text, text) COST {cost};' for function in TRIGRAM_FUNCTIONS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_hairdresser_search_document'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        UnaccentExtension(),
+        migrations.RunSQL(set_trigram_cost(100), set_trigram_cost(1)),
+        migrations.AddField(
+            model_name='hairdresser',
+            name='search_name',
+            field=models.TextField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='hairdresser',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass('search_name', name='gin_trgm_ops'), name='hairdresser_name_trgm_idx'),
+        ),
+        migrations.RunPython(build_search_names, migrations.RunPython.noop),
+    ]
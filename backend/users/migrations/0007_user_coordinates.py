@@ -0,0 +1,36 @@
+# Generated by Django 4.2.20 on 2026-10-18 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_hairdresser_search_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostalCodeLocation',
+            fields=[
+                ('prefix', models.CharField(max_length=8, primary_key=True, serialize=False)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('city', models.CharField(blank=True, default='', max_length=150)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['latitude', 'longitude'], name='user_coordinates_idx'),
+        ),
+    ]
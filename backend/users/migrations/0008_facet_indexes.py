@@ -0,0 +1,21 @@
+# Generated by Django 4.2.20 on 2026-10-18 14:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_user_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['city'], name='user_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['neighborhood'], name='user_neighborhood_idx'),
+        ),
+    ]
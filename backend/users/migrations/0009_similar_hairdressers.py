@@ -0,0 +1,36 @@
+# Generated by Django 4.2.20 on 2026-10-18 14:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_facet_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityInputs',
+            fields=[
+                ('hairdresser', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='users.hairdresser')),
+                ('signature', models.CharField(max_length=32)),
+                ('neighbours', models.PositiveSmallIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SimilarHairdresser',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('hairdresser', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_hairdressers', to='users.hairdresser')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.hairdresser')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='similarhairdresser',
+            constraint=models.UniqueConstraint(fields=('hairdresser', 'rank'), name='similar_hairdresser_rank_unique'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.20 on 2026-10-18 15:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_similar_hairdressers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hairdresser',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='hairdresser',
+            index=models.Index(fields=['trending_score', 'id'], name='hairdresser_trending_idx'),
+        ),
+    ]
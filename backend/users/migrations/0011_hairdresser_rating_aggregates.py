@@ -0,0 +1,43 @@
+# Generated by Django 4.2.20 on 2026-10-18 15:17
+
+from django.db import migrations, models
+from django.db.models import Count, Exists, F, OuterRef, Subquery, Sum
+
+
+def build_rating_aggregates(apps, schema_editor):
+    Hairdresser = apps.get_model('users', 'Hairdresser')
+    Review = apps.get_model('review', 'Review')
+
+    totals = Review.objects.filter(hairdresser=OuterRef('pk')).values('hairdresser').order_by()
+    Hairdresser.objects.filter(Exists(totals)).update(
+        rating_sum=Subquery(totals.annotate(total=Sum('rating')).values('total')),
+        rating_count=Subquery(totals.annotate(total=Count('id')).values('total')),
+    )
+    Hairdresser.objects.filter(rating_count__gt=0).update(rating_avg=F('rating_sum') / F('rating_count'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_hairdresser_trending_score'),
+        ('review', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hairdresser',
+            name='rating_avg',
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='hairdresser',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hairdresser',
+            name='rating_sum',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(build_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,8 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 
 class User(AbstractUser):
     first_name = models.CharField(max_length=100, blank=False, null=False)
@@ -33,6 +35,19 @@ class User(AbstractUser):
     profile_picture = models.ImageField(upload_to='profile_pics/', null=True, blank=True)
     role = models.CharField(max_length=12, choices=ROLES_CHOICES, default='CUSTOMER')
 
+    # Resolved from postal_code on save, see users.geo
+    latitude = models.FloatField(blank=True, null=True, editable=False)
+    longitude = models.FloatField(blank=True, null=True, editable=False)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Bounding box prefilter of the nearby search
+            models.Index(fields=['latitude', 'longitude'], name='user_coordinates_idx'),
+            # Facet filters of the global search
+            models.Index(fields=['city'], name='user_city_idx'),
+            models.Index(fields=['neighborhood'], name='user_neighborhood_idx'),
+        ]
+
     def __str__(self):
         return self.email
 
@@ -49,4 +64,62 @@ class Hairdresser(models.Model):
     cnpj = models.CharField(max_length=14, blank=False, null=False)
     experience_time = models.CharField(max_length=255, blank=True, null=True)
     experiences = models.CharField(max_length=255, blank=True, null=True)
-    products = models.CharField(max_length=255, blank=True, null=True)
\ No newline at end of file
+    products = models.CharField(max_length=255, blank=True, null=True)
+
+    # Maintained by users.search, see the users signals
+    search_document = SearchVectorField(null=True, editable=False)
+    search_name = models.TextField(null=True, editable=False)
+    # Maintained by reserve.trending, relative to its epoch
+    trending_score = models.FloatField(default=0, editable=False)
+    # Review aggregates, maintained by review.ratings
+    rating_sum = models.FloatField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_avg = models.FloatField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_document'], name='hairdresser_search_idx'),
+            GinIndex(OpClass('search_name', name='gin_trgm_ops'), name='hairdresser_name_trgm_idx'),
+            # Top-K "em alta" reads, see reserve.trending
+            models.Index(fields=['trending_score', 'id'], name='hairdresser_trending_idx'),
+        ]
+
+
+class PostalCodeLocation(models.Model):
+    """
+    Coordinates of a CEP prefix, loaded by the load_postal_codes command. A
+    prefix can be a full 8 digit CEP or a shorter range; the longest prefix of
+    a CEP wins.
+    """
+    prefix = models.CharField(max_length=8, primary_key=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    city = models.CharField(max_length=150, blank=True, default='')
+
+
+class SimilarHairdresser(models.Model):
+    """
+    One of the nearest neighbours of a hairdresser, computed offline by the
+    refresh_similar_hairdressers command (users.similar). `rank` 1 is the most
+    similar.
+    """
+    hairdresser = models.ForeignKey(Hairdresser, on_delete=models.CASCADE, related_name='similar_hairdressers')
+    similar = models.ForeignKey(Hairdresser, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hairdresser', 'rank'], name='similar_hairdresser_rank_unique'),
+        ]
+
+
+class SimilarityInputs(models.Model):
+    """
+    Signature of the inputs the neighbours of a hairdresser were computed
+    from, and how many neighbours were stored, so a refresh only recomputes
+    the hairdressers whose inputs changed or who lost a neighbour.
+    """
+    hairdresser = models.OneToOneField(Hairdresser, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    signature = models.CharField(max_length=32)
+    neighbours = models.PositiveSmallIntegerField()
@@ -0,0 +1,164 @@
+"""
+Full-text search over hairdressers.
+
+Every hairdresser keeps a weighted tsvector document (Hairdresser.search_document)
+built with the Portuguese configuration from:
+
+- A: first and last name
+- B: the names of the user's preferences
+- C: city, neighborhood and address
+- D: resume
+
+The document is refreshed by the users signals whenever one of those sources
+changes, and can be rebuilt with the rebuild_search_documents command.
+
+Names are also matched fuzzily with pg_trgm, against the lowercased, unaccented
+full name kept next to the document (Hairdresser.search_name, "joao da silva"),
+so typos and full names typed in a single message still find the hairdresser.
+Both fields are refreshed together.
+"""
+import re
+import unicodedata
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, TrigramSimilarity, TrigramWordSimilarity
+)
+from django.db.models import F, Func, OuterRef, Q, Subquery, TextField, Value
+from django.db.models.functions import Concat, Greatest, Lower
+
+SEARCH_CONFIG = 'portuguese'
+
+# Lowest trigram score for a name to count as a match, and how many of the best
+# matches are returned
+NAME_MATCH_MIN_SCORE = 0.3
+MAX_NAME_MATCHES = 5
+
+_TERM_PATTERN = re.compile(r'[^\W_]+')
+
+
+class Unaccent(Func):
+    function = 'unaccent'
+    arity = 1
+    output_field = TextField()
+
+
+def fold_accents(value):
+    """
+    Python counterpart of search_name for search input: lowercases, strips
+    accents and collapses whitespace ("  JOÃO  Silva" -> "joao silva").
+    """
+    decomposed = unicodedata.normalize('NFKD', value.lower())
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.split())
+
+def _user_field(user_model, field):
+    return Subquery(user_model.objects.filter(id=OuterRef('user_id')).values(field)[:1])
+
+def search_document_expression(user_model, preferences_model):
+    """
+    Expression computing the search document of the hairdresser rows of an
+    UPDATE. Models are parameters so migrations can pass their historical ones.
+    """
+    def user_field(field):
+        return _user_field(user_model, field)
+
+    preference_names = Subquery(
+        preferences_model.objects
+        .filter(users=OuterRef('user_id'))
+        .values('users')
+        .annotate(names=StringAgg('name', delimiter=' '))
+        .values('names')[:1]
+    )
+
+    return (
+        SearchVector(user_field('first_name'), user_field('last_name'), weight='A', config=SEARCH_CONFIG)
+        + SearchVector(preference_names, weight='B', config=SEARCH_CONFIG)
+        + SearchVector(
+            user_field('city'), user_field('neighborhood'), user_field('address'),
+            weight='C', config=SEARCH_CONFIG
+        )
+        + SearchVector('resume', weight='D', config=SEARCH_CONFIG)
+    )
+
+def search_name_expression(user_model):
+    """
+    Expression computing the search name of the hairdresser rows of an UPDATE.
+    """
+    full_name = Concat(
+        _user_field(user_model, 'first_name'), Value(' '), _user_field(user_model, 'last_name'),
+        output_field=TextField(),
+    )
+    return Lower(Unaccent(full_name))
+
+def refresh_search_documents(hairdresser_ids=None, user_ids=None):
+    """
+    Recomputes the documents and names of the given hairdressers (or of the hairdressers
+    of the given users) in a single UPDATE. With no ids, recomputes them all.
+    Returns the number of hairdressers updated.
+    """
+    from preferences.models import Preferences
+    from users.models import Hairdresser, User
+
+    hairdressers = Hairdresser.objects.all()
+    if hairdresser_ids is not None:
+        hairdressers = hairdressers.filter(id__in=hairdresser_ids)
+    if user_ids is not None:
+        hairdressers = hairdressers.filter(user_id__in=user_ids)
+
+    return hairdressers.update(
+        search_document=search_document_expression(User, Preferences),
+        search_name=search_name_expression(User),
+    )
+
+def build_search_query(value):
+    """
+    Turns free text into a prefix tsquery that requires every term, so partially
+    typed words still match ("ali manau" finds Alice in Manaus). Returns None
+    when the text has nothing searchable.
+    """
+    terms = _TERM_PATTERN.findall(value)
+    if not terms:
+        return None
+    raw_query = ' & '.join(f'{term}:*' for term in terms)
+    return SearchQuery(raw_query, search_type='raw', config=SEARCH_CONFIG)
+
+def search_hairdressers(queryset, value):
+    """
+    Filters a hairdresser queryset by free text and orders it by relevance.
+    """
+    query = build_search_query(value)
+    if query is None:
+        return queryset.none()
+
+    return (
+        queryset
+        .filter(search_document=query)
+        .annotate(search_rank=SearchRank(F('search_document'), query))
+        .order_by('-search_rank', 'id')
+    )
+
+def match_hairdresser_names(queryset, value, limit=MAX_NAME_MATCHES, min_score=NAME_MATCH_MIN_SCORE):
+    """
+    Fuzzy matches free text against the full names of a hairdresser queryset.
+    A name matches when it is similar to the text as a whole ("Ana Paula Souza"
+    for Ana Souza) or contains words similar to it ("joao" for João da Silva).
+    Returns at most `limit` hairdressers, best scores first, annotated with
+    their `name_score` between 0 and 1.
+    """
+    name = fold_accents(value)
+    if not name:
+        return queryset.none()
+
+    # The trigram operators let Postgres use the index with its default
+    # thresholds; the score filter then applies ours
+    return (
+        queryset
+        .filter(Q(search_name__trigram_similar=name) | Q(search_name__trigram_word_similar=name))
+        .annotate(name_score=Greatest(
+            TrigramSimilarity('search_name', name),
+            TrigramWordSimilarity(name, 'search_name'),
+        ))
+        .filter(name_score__gte=min_score)
+        .order_by('-name_score', 'id')[:limit]
+    )
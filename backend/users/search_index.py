@@ -0,0 +1,445 @@
+"""
+In-process inverted index answering the global search without Postgres.
+
+Hairdressers and services each get an InvertedIndex. Text is accent folded
+(users.search.fold_accents), so "coloracao" finds "Coloração", and split in
+tokens. Every prefix of every token (up to MAX_PREFIX_LENGTH characters) maps to
+a posting list, so partially typed words are answered with one dict lookup.
+
+Posting lists are sorted array('I') of `document id << FIELD_BITS | field`,
+where field is the rank of the field the token came from (0 is the most
+relevant, the hairdresser name). Entries of one document sit next to each
+other, best field first, which gives both the matching documents and the field
+to score them by.
+
+The autocomplete suggestions (users.suggest) are built and kept current with
+the index.
+
+The index is built from the database on first use (and warmed by the WSGI/ASGI
+entry points), then kept current by the users signals once the writing
+transaction commits. Each process holds its own copy: the rebuild_search_index
+command bumps a version kept in the database (reserve.versions), and every
+process compares it with the version of its copy at most every
+VERSION_CHECK_INTERVAL seconds, rebuilding when it moved. Searches in between
+do not touch the database.
+"""
+import heapq
+import re
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from django.db import DatabaseError, transaction
+
+from users import suggest
+from users.search import fold_accents
+
+MAX_PREFIX_LENGTH = 15
+FIELD_BITS = 2
+VERSION_NAME = 'search_index'
+VERSION_CHECK_INTERVAL = 30
+
+# Weight of a term found in each field, by field rank (ts_rank's defaults)
+HAIRDRESSER_FIELD_WEIGHTS = (1.0, 0.4, 0.2, 0.1)
+SERVICE_FIELD_WEIGHTS = (1.0,)
+
+# Result types of the global search, in the order that breaks score ties
+HAIRDRESSER_RESULT = 'hairdresser'
+SERVICE_RESULT = 'service'
+RESULT_TYPES = (HAIRDRESSER_RESULT, SERVICE_RESULT)
+
+_TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+_lock = threading.RLock()
+_index = None
+
+
+def tokenize(text):
+    """
+    Folded tokens of a text, without duplicates, in order of appearance.
+    Tokens are interned, documents share the strings of their common words.
+    """
+    return tuple(sys.intern(token) for token in dict.fromkeys(_TOKEN_PATTERN.findall(fold_accents(text or ''))))
+
+
+class InvertedIndex:
+    """
+    Prefix postings of one document type. Documents are tuples of token tuples,
+    one list per field, in decreasing order of relevance.
+    """
+
+    def __init__(self, field_weights):
+        self.field_weights = field_weights
+        self._postings = {}
+        self._documents = {}
+
+    def __len__(self):
+        return len(self._documents)
+
+    @staticmethod
+    def _prefixes(token):
+        return (token[:length] for length in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1))
+
+    def _entries(self, document_id, fields):
+        entries = {}
+        for rank, tokens in enumerate(fields):
+            for token in tokens:
+                for prefix in self._prefixes(token):
+                    entries.setdefault(prefix, rank)
+        return {prefix: document_id << FIELD_BITS | rank for prefix, rank in entries.items()}
+
+    @classmethod
+    def build(cls, field_weights, documents):
+        """
+        Builds an index from a {document_id: fields} mapping in one pass.
+        """
+        index = cls(field_weights)
+        postings = {}
+        for document_id, fields in documents.items():
+            index._documents[document_id] = fields
+            for prefix, entry in index._entries(document_id, fields).items():
+                postings.setdefault(prefix, []).append(entry)
+        index._postings = {prefix: array('I', sorted(entries)) for prefix, entries in postings.items()}
+        return index
+
+    def add(self, document_id, fields):
+        self.remove(document_id)
+        self._documents[document_id] = fields
+        for prefix, entry in self._entries(document_id, fields).items():
+            posting = self._postings.setdefault(prefix, array('I'))
+            posting.insert(bisect_left(posting, entry), entry)
+
+    def remove(self, document_id):
+        fields = self._documents.pop(document_id, None)
+        if fields is None:
+            return
+        first_entry = document_id << FIELD_BITS
+        for prefix in self._entries(document_id, fields):
+            posting = self._postings[prefix]
+            start = bisect_left(posting, first_entry)
+            end = bisect_left(posting, first_entry + (1 << FIELD_BITS), start)
+            del posting[start:end]
+            if not posting:
+                del self._postings[prefix]
+
+    def _term_ranks(self, term):
+        """
+        {document_id: best field rank} of the documents having a token that
+        starts with the term.
+        """
+        ranks = {}
+        for entry in self._postings.get(term[:MAX_PREFIX_LENGTH], ()):
+            ranks.setdefault(entry >> FIELD_BITS, entry & ((1 << FIELD_BITS) - 1))
+
+        if len(term) > MAX_PREFIX_LENGTH:
+            candidates = ranks
+            # Postings stop at MAX_PREFIX_LENGTH, longer terms are checked on the tokens
+            ranks = {}
+            for document_id in candidates:
+                rank = self._token_rank(document_id, term)
+                if rank is not None:
+                    ranks[document_id] = rank
+        return ranks
+
+    def _token_rank(self, document_id, term):
+        for rank, tokens in enumerate(self._documents[document_id]):
+            if any(token.startswith(term) for token in tokens):
+                return rank
+        return None
+
+    def scores(self, terms):
+        """
+        {document_id: score} of the documents having every term as a token
+        prefix. Scores are the mean weight of the fields the terms were found
+        in, between 0 and 1 whatever the document type.
+        """
+        if not terms:
+            return {}
+
+        term_ranks = sorted((self._term_ranks(term) for term in terms), key=len)
+        scores = {}
+        for document_id, rank in term_ranks[0].items():
+            score = self.field_weights[rank]
+            for ranks in term_ranks[1:]:
+                other_rank = ranks.get(document_id)
+                if other_rank is None:
+                    break
+                score += self.field_weights[other_rank]
+            else:
+                scores[document_id] = score / len(terms)
+        return scores
+
+    def search(self, terms):
+        """
+        Scored documents having every term as a token prefix, as a list of
+        (score, document_id), best first.
+        """
+        return sorted(((score, document_id) for document_id, score in self.scores(terms).items()), key=lambda hit: (-hit[0], hit[1]))
+
+    def memory_usage(self):
+        """
+        Approximate footprint in bytes of the postings and of the documents
+        kept to update them.
+        """
+        postings = sys.getsizeof(self._postings) + sum(
+            sys.getsizeof(prefix) + sys.getsizeof(posting) for prefix, posting in self._postings.items()
+        )
+        vocabulary = {token for fields in self._documents.values() for tokens in fields for token in tokens}
+        documents = sys.getsizeof(self._documents) + sum(map(sys.getsizeof, vocabulary)) + sum(
+            sys.getsizeof(fields) + sum(map(sys.getsizeof, fields))
+            for fields in self._documents.values()
+        )
+        return {
+            'documents': len(self._documents),
+            'prefixes': len(self._postings),
+            'postings': sum(len(posting) for posting in self._postings.values()),
+            'postings_bytes': postings,
+            'documents_bytes': documents,
+        }
+
+
+class SearchIndex:
+    """
+    The hairdresser and service indexes and the suggestions, built together.
+    """
+
+    def __init__(self, hairdressers, services, suggestions, version):
+        self.hairdressers = hairdressers
+        self.services = services
+        self.suggestions = suggestions
+        self.version = version
+        self.checked_at = time.time()
+
+    def scores(self, query):
+        """
+        {result_type: {id: score}} of the hairdressers and services matching free text.
+        """
+        terms = tokenize(query)
+        return {
+            HAIRDRESSER_RESULT: self.hairdressers.scores(terms),
+            SERVICE_RESULT: self.services.scores(terms),
+        }
+
+    def memory_report(self):
+        return {
+            'hairdressers': self.hairdressers.memory_usage(),
+            'services': self.services.memory_usage(),
+        }
+
+
+def ranked_page(scores_by_type, limit, after=None):
+    """
+    Merges {result_type: {id: score}} in a single stream ordered by score, then
+    result type, then id, and returns the first `limit` entries after the
+    `after` position. Entries are positions themselves, (-score, type rank, id),
+    so the last one of a page is where the next page starts. Only a heap of
+    `limit` entries is kept, however many documents matched.
+    """
+    positions = (
+        (-score, type_rank, document_id)
+        for type_rank, result_type in enumerate(RESULT_TYPES)
+        for document_id, score in scores_by_type.get(result_type, {}).items()
+    )
+    if after is not None:
+        positions = (position for position in positions if position > after)
+    return heapq.nsmallest(limit, positions)
+
+def format_memory_report(index):
+    """
+    One line per document type of the index memory report, for the commands.
+    """
+    lines = []
+    for name, usage in index.memory_report().items():
+        total = usage['postings_bytes'] + usage['documents_bytes']
+        lines.append(
+            f"{name:>12}: {usage['documents']} documents | {usage['prefixes']} prefixes | "
+            f"{usage['postings']} postings | postings {usage['postings_bytes'] / 1024:.0f}KiB | "
+            f"documents {usage['documents_bytes'] / 1024:.0f}KiB | total {total / 1024 / 1024:.1f}MiB"
+        )
+    usage = index.suggestions.memory_usage()
+    lines.append(
+        f"{'suggestions':>12}: {usage['suggestions']} suggestions | {usage['keys']} keys | "
+        f"{usage['cached_prefixes']} cached prefixes | total {usage['bytes'] / 1024 / 1024:.1f}MiB"
+    )
+    return lines
+
+def load_hairdresser_documents(hairdresser_ids=None, user_ids=None):
+    """
+    {hairdresser_id: fields} read from the database: name, preference names,
+    location and resume, in the order of the search document weights.
+    """
+    from preferences.models import Preferences
+    from users.models import Hairdresser
+
+    hairdressers = Hairdresser.objects.all()
+    if hairdresser_ids is not None:
+        hairdressers = hairdressers.filter(id__in=hairdresser_ids)
+    if user_ids is not None:
+        hairdressers = hairdressers.filter(user_id__in=user_ids)
+    rows = list(hairdressers.values_list(
+        'id', 'user_id', 'user__first_name', 'user__last_name',
+        'user__city', 'user__neighborhood', 'user__address', 'resume',
+    ))
+
+    preference_names = {}
+    memberships = Preferences.users.through.objects.values_list('user_id', 'preferences__name')
+    if hairdresser_ids is not None or user_ids is not None:
+        memberships = memberships.filter(user_id__in=[row[1] for row in rows])
+    for user_id, name in memberships:
+        preference_names.setdefault(user_id, []).append(name)
+
+    return {
+        hairdresser_id: (
+            tokenize(f'{first_name} {last_name}'),
+            tokenize(' '.join(preference_names.get(user_id, []))),
+            tokenize(f'{city} {neighborhood} {address}'),
+            tokenize(resume),
+        )
+        for hairdresser_id, user_id, first_name, last_name, city, neighborhood, address, resume in rows
+    }
+
+def load_service_documents(service_ids=None):
+    from service.models import Service
+
+    services = Service.objects.all()
+    if service_ids is not None:
+        services = services.filter(id__in=service_ids)
+    return {service_id: (tokenize(name),) for service_id, name in services.values_list('id', 'name')}
+
+def _current_version():
+    from reserve.versions import get_version
+
+    return get_version(VERSION_NAME)
+
+def build_index(version=None):
+    if version is None:
+        version = _current_version()
+    return SearchIndex(
+        InvertedIndex.build(HAIRDRESSER_FIELD_WEIGHTS, load_hairdresser_documents()),
+        InvertedIndex.build(SERVICE_FIELD_WEIGHTS, load_service_documents()),
+        suggest.build_suggestion_index(),
+        version,
+    )
+
+def get_index():
+    """
+    The index of this process, built on first use and rebuilt when the
+    rebuild_search_index command ran since, which is checked at most every
+    VERSION_CHECK_INTERVAL seconds.
+    """
+    global _index
+    with _lock:
+        if _index is not None and time.time() - _index.checked_at < VERSION_CHECK_INTERVAL:
+            return _index
+
+    version = _current_version()
+    with _lock:
+        if _index is None or _index.version != version:
+            _index = build_index(version)
+        else:
+            _index.checked_at = time.time()
+        return _index
+
+def reset():
+    """
+    Drops the index of this process, the next search rebuilds it.
+    """
+    global _index
+    with _lock:
+        _index = None
+
+def request_rebuild():
+    """
+    Makes every process rebuild its index within VERSION_CHECK_INTERVAL seconds.
+    """
+    from reserve.versions import bump_version
+
+    bump_version(VERSION_NAME)
+
+def _apply(update):
+    def apply_when_built():
+        with _lock:
+            if _index is not None:
+                update(_index)
+    transaction.on_commit(apply_when_built)
+
+def refresh_hairdressers(hairdresser_ids=None, user_ids=None):
+    """
+    Re-reads the given hairdressers (or the hairdressers of the given users)
+    into the index once the current transaction commits.
+    """
+    def update(index):
+        documents = load_hairdresser_documents(hairdresser_ids, user_ids)
+        for hairdresser_id in set(hairdresser_ids or ()) - set(documents):
+            index.hairdressers.remove(hairdresser_id)
+        for hairdresser_id, fields in documents.items():
+            index.hairdressers.add(hairdresser_id, fields)
+        _refresh_hairdresser_suggestions(index, hairdresser_ids, user_ids)
+    _apply(update)
+
+def _refresh_hairdresser_suggestions(index, hairdresser_ids=None, user_ids=None):
+    rows = suggest.load_hairdresser_rows(hairdresser_ids, user_ids)
+    for hairdresser_id in set(hairdresser_ids or ()) - set(rows):
+        index.suggestions.set_hairdresser(hairdresser_id, None)
+    for hairdresser_id, row in rows.items():
+        index.suggestions.set_hairdresser(hairdresser_id, row)
+
+def _refresh_service_suggestion(index, service_id):
+    index.suggestions.set_service(service_id, suggest.load_service_rows([service_id]).get(service_id))
+
+def remove_hairdresser(hairdresser_id):
+    def update(index):
+        index.hairdressers.remove(hairdresser_id)
+        index.suggestions.set_hairdresser(hairdresser_id, None)
+    _apply(update)
+
+def refresh_service(service_id):
+    def update(index):
+        documents = load_service_documents([service_id])
+        if service_id in documents:
+            index.services.add(service_id, documents[service_id])
+        else:
+            index.services.remove(service_id)
+        _refresh_service_suggestion(index, service_id)
+    _apply(update)
+
+def remove_service(service_id):
+    def update(index):
+        index.services.remove(service_id)
+        index.suggestions.set_service(service_id, None)
+    _apply(update)
+
+def refresh_preference(preference_id):
+    """
+    Re-reads the name of a preference into the suggestions (its hairdressers
+    are refreshed on their own) once the current transaction commits.
+    """
+    def update(index):
+        index.suggestions.set_preference(preference_id, suggest.load_preference_rows([preference_id]).get(preference_id))
+    _apply(update)
+
+def refresh_bookings(service_id):
+    """
+    Re-reads the booking counts of a service and of its hairdresser into the
+    suggestions once the current transaction commits.
+    """
+    def update(index):
+        from service.models import Service
+
+        _refresh_service_suggestion(index, service_id)
+        hairdresser_id = Service.objects.filter(id=service_id).values_list('hairdresser_id', flat=True).first()
+        if hairdresser_id is not None:
+            _refresh_hairdresser_suggestions(index, hairdresser_ids=[hairdresser_id])
+    _apply(update)
+
+def warm():
+    """
+    Builds the index ahead of the first search. Called by the WSGI/ASGI entry
+    points; a database that is not reachable yet only delays the build.
+    """
+    try:
+        get_index()
+    except DatabaseError as e:
+        print(f"Search index not built at startup: {e}")
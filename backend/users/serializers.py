@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import User, Hairdresser, Customer
+from .models import User, Hairdresser, Customer, SimilarHairdresser
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -23,13 +23,20 @@ class HairdresserSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     class Meta:
         model = Hairdresser
-        exclude = ('experience_time', 'products', 'experiences', 'experience_years') 
+        exclude = ('experience_time', 'products', 'experiences', 'experience_years', 'search_document', 'search_name', 'trending_score', 'rating_sum')
 
 class HairdresserFullInfoSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     class Meta:
         model = Hairdresser
-        exclude = ['cnpj']
+        exclude = ['cnpj', 'search_document', 'search_name', 'trending_score', 'rating_sum']
+
+class SimilarHairdresserSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='similar.id', read_only=True)
+    user = UserSerializer(source='similar.user', read_only=True)
+    class Meta:
+        model = SimilarHairdresser
+        fields = ['id', 'user', 'score']
 
 class HairdresserNameSerializer(serializers.ModelSerializer):
     user = UserNameSerializer(read_only=True)
@@ -59,7 +66,6 @@ class CustomerNameSerializer(serializers.ModelSerializer):
 
 from .models import Hairdresser # Make sure models are imported
 from service.models import Service
-from service.serializers import ServiceWithHairdresserSerializer
 
 class SearchResultSerializer(serializers.BaseSerializer):
     """
@@ -80,6 +86,8 @@ class SearchResultSerializer(serializers.BaseSerializer):
         
         # Check if the instance is a Service model
         elif isinstance(instance, Service):
+            # Imported here because service.serializers depends on this module
+            from service.serializers import ServiceWithHairdresserSerializer
             # Use the ServiceSerializer to serialize the object
             serializer = ServiceWithHairdresserSerializer(instance, context=self.context)
             data = serializer.data
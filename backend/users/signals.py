@@ -0,0 +1,102 @@
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from preferences.models import Preferences
+from service.models import Service
+from users import for_you, home_feed, search_index
+from users.geo import resolve_coordinates
+from users.models import Hairdresser, User
+from users.search import refresh_search_documents
+
+
+def _refresh_users(user_ids):
+    user_ids = list(user_ids)
+    refresh_search_documents(user_ids=user_ids)
+    search_index.refresh_hairdressers(user_ids=user_ids)
+
+def _refresh_home_screen():
+    home_feed.refresh_on_commit()
+    for_you.reset_on_commit()
+
+@receiver(post_init, sender=User)
+def remember_located_postal_code(sender, instance, **kwargs):
+    # Read from __dict__ so a deferred postal code is not loaded
+    instance._located_postal_code = instance.__dict__.get('postal_code')
+
+@receiver(pre_save, sender=User)
+def locate_user(sender, instance, **kwargs):
+    # The postal code table is only read for a new postal code or missing coordinates
+    if instance.postal_code == instance._located_postal_code and instance.__dict__.get('latitude') is not None:
+        return
+    instance.latitude, instance.longitude = resolve_coordinates(instance.postal_code) or (None, None)
+    instance._located_postal_code = instance.postal_code
+
+@receiver(post_save, sender=User)
+def refresh_search_on_user_save(sender, instance, **kwargs):
+    _refresh_users([instance.pk])
+    if instance.role == 'hairdresser':
+        _refresh_home_screen()
+
+@receiver(post_save, sender=Hairdresser)
+def refresh_search_on_hairdresser_save(sender, instance, **kwargs):
+    refresh_search_documents(hairdresser_ids=[instance.pk])
+    search_index.refresh_hairdressers(hairdresser_ids=[instance.pk])
+    _refresh_home_screen()
+
+@receiver(post_delete, sender=Hairdresser)
+def remove_hairdresser_from_search(sender, instance, **kwargs):
+    search_index.remove_hairdresser(instance.pk)
+    _refresh_home_screen()
+
+@receiver(post_save, sender=Service)
+def refresh_search_on_service_save(sender, instance, **kwargs):
+    search_index.refresh_service(instance.pk)
+
+@receiver(post_delete, sender=Service)
+def remove_service_from_search(sender, instance, **kwargs):
+    search_index.remove_service(instance.pk)
+
+@receiver(m2m_changed, sender=Preferences.users.through)
+def refresh_search_on_preferences_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        # Clearing from the preference side does not tell who was affected
+        instance._cleared_user_ids = list(instance.users.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if reverse:
+        user_ids = [instance.pk]
+    elif action == 'post_clear':
+        user_ids = getattr(instance, '_cleared_user_ids', [])
+    else:
+        user_ids = pk_set or []
+    if user_ids:
+        _refresh_users(user_ids)
+        # The home screen only lists hairdressers
+        if reverse:
+            affects_home_screen = instance.role == 'hairdresser'
+        else:
+            affects_home_screen = User.objects.filter(id__in=user_ids, role='hairdresser').exists()
+        if affects_home_screen:
+            _refresh_home_screen()
+
+@receiver(post_save, sender=Preferences)
+def refresh_search_on_preference_rename(sender, instance, created, **kwargs):
+    search_index.refresh_preference(instance.pk)
+    if not created:
+        _refresh_users(instance.users.values_list('id', flat=True))
+        # A renamed preference can enter or leave the configured rails
+        home_feed.refresh_on_commit()
+
+@receiver(pre_delete, sender=Preferences)
+def remember_preference_users(sender, instance, **kwargs):
+    instance._deleted_user_ids = list(instance.users.values_list('id', flat=True))
+
+@receiver(post_delete, sender=Preferences)
+def refresh_search_on_preference_delete(sender, instance, **kwargs):
+    search_index.refresh_preference(instance.pk)
+    user_ids = getattr(instance, '_deleted_user_ids', [])
+    if user_ids:
+        _refresh_users(user_ids)
+        _refresh_home_screen()
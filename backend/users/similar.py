@@ -0,0 +1,210 @@
+"""
+"Similar hairdressers" of the hairdresser profile.
+
+Two hairdressers are similar by a weighted sum (WEIGHTS) of:
+- preferences: Jaccard similarity of their preference sets;
+- services: cosine similarity of the (accent folded) names of their services;
+- neighborhood: 1 when they are in the same neighborhood.
+
+The NEIGHBOURS most similar hairdressers of each one are stored in the
+SimilarHairdresser table by the refresh_similar_hairdressers command, so the
+profile reads them with one indexed query.
+
+Similarities are computed with NumPy from inverted lists: the hairdressers
+sharing a preference (or a service name) with one hairdresser are counted
+with a bincount of the lists of its preferences, which avoids building the
+hairdresser x hairdresser matrix.
+
+A refresh only recomputes the hairdressers whose inputs changed (their
+SimilarityInputs signature differs), who lost a stored neighbour, or whose
+stored neighbours a changed hairdresser now enters or leaves. Similarity is
+symmetric, so the scores of a changed hairdresser against everyone tell
+which lists it affects.
+"""
+import hashlib
+
+import numpy as np
+from django.db import transaction
+
+from users.search import fold_accents
+
+NEIGHBOURS = 20
+WEIGHTS = {'preferences': 0.5, 'services': 0.3, 'neighborhood': 0.2}
+
+
+class SimilarityModel:
+    def __init__(self, hairdresser_ids, preference_sets, service_sets, neighborhoods):
+        """
+        Features of each hairdresser, in the order of `hairdresser_ids`:
+        preference ids, folded service names and folded neighborhood.
+        """
+        self.hairdresser_ids = np.asarray(hairdresser_ids, dtype=np.int64)
+        self.position = {hairdresser_id: position for position, hairdresser_id in enumerate(hairdresser_ids)}
+        self.preference_sets, self.service_sets = preference_sets, service_sets
+        self.preference_postings, self.preference_sizes = self._postings(preference_sets)
+        self.service_postings, self.service_sizes = self._postings(service_sets)
+
+        codes = {}
+        self.neighborhoods = np.fromiter(
+            (codes.setdefault(neighborhood, len(codes)) if neighborhood else -1 for neighborhood in neighborhoods),
+            dtype=np.int32, count=len(neighborhoods),
+        )
+
+    def _postings(self, feature_sets):
+        positions = {}
+        for position, features in enumerate(feature_sets):
+            for feature in features:
+                positions.setdefault(feature, []).append(position)
+        postings = {feature: np.asarray(members, dtype=np.int64) for feature, members in positions.items()}
+        sizes = np.fromiter(map(len, feature_sets), dtype=np.float64, count=len(feature_sets))
+        return postings, sizes
+
+    def _shared(self, features, postings):
+        # How many of the features every hairdresser shares with them
+        lists = [postings[feature] for feature in features if feature in postings]
+        if not lists:
+            return np.zeros(len(self.hairdresser_ids))
+        return np.bincount(np.concatenate(lists), minlength=len(self.hairdresser_ids)).astype(np.float64)
+
+    def scores(self, position):
+        """
+        Similarity of the hairdresser at `position` with every hairdresser.
+        """
+        preferences, services = self.preference_sets[position], self.service_sets[position]
+
+        shared = self._shared(preferences, self.preference_postings)
+        union = self.preference_sizes + len(preferences) - shared
+        jaccard = np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+
+        shared = self._shared(services, self.service_postings)
+        norms = np.sqrt(self.service_sizes * len(services))
+        cosine = np.divide(shared, norms, out=np.zeros_like(shared), where=norms > 0)
+
+        neighborhood = self.neighborhoods[position]
+        same_neighborhood = (self.neighborhoods == neighborhood) & (neighborhood >= 0)
+
+        return (
+            WEIGHTS['preferences'] * jaccard
+            + WEIGHTS['services'] * cosine
+            + WEIGHTS['neighborhood'] * same_neighborhood
+        )
+
+    def neighbours(self, position, scores=None):
+        """
+        [(hairdresser id, score)] of the NEIGHBOURS most similar hairdressers,
+        most similar first and by id on ties. Hairdressers sharing nothing are
+        left out.
+        """
+        scores = self.scores(position) if scores is None else scores.copy()
+        scores[position] = 0
+        candidates = np.flatnonzero(scores > 0)
+        candidate_scores = scores[candidates]
+        if len(candidates) > NEIGHBOURS:
+            # Keep the scores tied with the last one, ids decide between them
+            threshold = np.partition(candidate_scores, len(candidates) - NEIGHBOURS)[len(candidates) - NEIGHBOURS]
+            kept = candidate_scores >= threshold
+            candidates, candidate_scores = candidates[kept], candidate_scores[kept]
+        order = np.lexsort((self.hairdresser_ids[candidates], -candidate_scores))[:NEIGHBOURS]
+        return [(int(self.hairdresser_ids[candidates[i]]), float(candidate_scores[i])) for i in order]
+
+
+def signature(preferences, services, neighborhood):
+    return hashlib.md5(repr((sorted(preferences), sorted(services), neighborhood)).encode()).hexdigest()
+
+def load_features():
+    """
+    (hairdresser ids, preference sets, service name sets, neighborhoods) of
+    every hairdresser, by id.
+    """
+    from preferences.models import Preferences
+    from service.models import Service
+    from users.models import Hairdresser
+
+    rows = sorted(Hairdresser.objects.values_list('id', 'user_id', 'user__neighborhood'))
+    user_preferences = {}
+    for user_id, preference_id in Preferences.users.through.objects.values_list('user_id', 'preferences_id'):
+        user_preferences.setdefault(user_id, set()).add(preference_id)
+    hairdresser_services = {}
+    for hairdresser_id, name in Service.objects.values_list('hairdresser_id', 'name'):
+        hairdresser_services.setdefault(hairdresser_id, set()).add(fold_accents(name))
+
+    return (
+        [hairdresser_id for hairdresser_id, _, _ in rows],
+        [frozenset(user_preferences.get(user_id, ())) for _, user_id, _ in rows],
+        [frozenset(hairdresser_services.get(hairdresser_id, ())) for hairdresser_id, _, _ in rows],
+        [fold_accents(neighborhood or '') for _, _, neighborhood in rows],
+    )
+
+def refresh_similar_hairdressers(full=False):
+    """
+    Recomputes the stored neighbours of the hairdressers that need it (all of
+    them with `full`). Returns (hairdressers recomputed, hairdressers).
+    """
+    from users.models import SimilarHairdresser, SimilarityInputs
+
+    hairdresser_ids, preference_sets, service_sets, neighborhoods = load_features()
+    model = SimilarityModel(hairdresser_ids, preference_sets, service_sets, neighborhoods)
+    signatures = [signature(*features) for features in zip(preference_sets, service_sets, neighborhoods)]
+
+    stored_inputs = {
+        hairdresser_id: (stored_signature, neighbours)
+        for hairdresser_id, stored_signature, neighbours
+        in SimilarityInputs.objects.values_list('hairdresser_id', 'signature', 'neighbours')
+    }
+    if full:
+        changed = set(range(len(hairdresser_ids)))
+    else:
+        changed = {
+            position for position, hairdresser_id in enumerate(hairdresser_ids)
+            if stored_inputs.get(hairdresser_id, (None,))[0] != signatures[position]
+        }
+    dirty = set(changed)
+    scores_of_changed = {}
+
+    stored = {}
+    if not full:
+        for hairdresser_id, similar_id, score in SimilarHairdresser.objects.values_list('hairdresser_id', 'similar_id', 'score'):
+            stored.setdefault(hairdresser_id, []).append((similar_id, score))
+        # Lists that lost a neighbour to a deleted hairdresser
+        for hairdresser_id, (_, neighbours) in stored_inputs.items():
+            if hairdresser_id in model.position and len(stored.get(hairdresser_id, ())) < neighbours:
+                dirty.add(model.position[hairdresser_id])
+
+    if changed and not full:
+        # Lists a changed hairdresser enters (it scores at least their last
+        # neighbour, or they are not full) or leaves (it was listed)
+        threshold = np.zeros(len(hairdresser_ids))
+        listed_in = {}
+        for hairdresser_id, neighbours in stored.items():
+            position = model.position.get(hairdresser_id)
+            if position is None:
+                continue
+            for similar_id, _ in neighbours:
+                listed_in.setdefault(similar_id, []).append(position)
+            if len(neighbours) >= NEIGHBOURS:
+                threshold[position] = min(score for _, score in neighbours)
+        for position in changed:
+            scores = scores_of_changed[position] = model.scores(position)
+            entered = (scores > threshold) | ((scores == threshold) & (threshold > 0))
+            dirty.update(int(other) for other in np.flatnonzero(entered) if other != position)
+            dirty.update(listed_in.get(hairdresser_ids[position], ()))
+
+    rows, inputs = [], []
+    for position in sorted(dirty):
+        hairdresser_id = hairdresser_ids[position]
+        neighbours = model.neighbours(position, scores_of_changed.get(position))
+        rows.extend(
+            SimilarHairdresser(hairdresser_id=hairdresser_id, similar_id=similar_id, rank=rank, score=score)
+            for rank, (similar_id, score) in enumerate(neighbours, start=1)
+        )
+        inputs.append(SimilarityInputs(hairdresser_id=hairdresser_id, signature=signatures[position], neighbours=len(neighbours)))
+
+    dirty_ids = [hairdresser_ids[position] for position in dirty]
+    with transaction.atomic():
+        SimilarHairdresser.objects.filter(hairdresser_id__in=dirty_ids).delete()
+        SimilarHairdresser.objects.bulk_create(rows, batch_size=5000)
+        SimilarityInputs.objects.bulk_create(
+            inputs, batch_size=5000,
+            update_conflicts=True, unique_fields=['hairdresser'], update_fields=['signature', 'neighbours'],
+        )
+    return len(dirty), len(hairdresser_ids)
@@ -0,0 +1,379 @@
+"""
+In-process autocomplete of the search box.
+
+Suggestions are hairdresser names, service names, neighborhoods and preference
+names, ranked by popularity, the number of bookings behind them:
+
+- a hairdresser, the bookings of its services
+- a service name, the bookings of every service with that name
+- a neighborhood, the bookings of the hairdressers in it
+- a preference, the bookings of the hairdressers having it
+
+Service names and neighborhoods are grouped by their accent folded text
+(users.search.fold_accents), so "Corte" offered by a thousand hairdressers is
+one suggestion.
+
+Every suggestion is keyed by its folded text and by the rest of the text from
+each later word ("joao da silva", "da silva", "silva"), in one sorted list, so
+the keys starting with a prefix are a contiguous slice found by bisection.
+Short prefixes have huge slices; their top suggestions are kept in a cache
+updated in place when popularity changes.
+
+The index lives next to the global search index (users.search_index), which
+builds it and applies the users and reserve signals to it.
+"""
+import heapq
+import re
+import sys
+from bisect import bisect_left, insort
+
+from django.db.models import Count
+
+from users.search import fold_accents
+
+HAIRDRESSER_SUGGESTION = 'hairdresser'
+SERVICE_SUGGESTION = 'service'
+NEIGHBORHOOD_SUGGESTION = 'neighborhood'
+PREFERENCE_SUGGESTION = 'preference'
+SUGGESTION_TYPES = (HAIRDRESSER_SUGGESTION, SERVICE_SUGGESTION, NEIGHBORHOOD_SUGGESTION, PREFERENCE_SUGGESTION)
+_HAIRDRESSER, _SERVICE, _NEIGHBORHOOD, _PREFERENCE = range(len(SUGGESTION_TYPES))
+
+MAX_SUGGESTIONS = 20
+
+# Prefixes up to this length have their top suggestions computed with the
+# index, longer ones are cached once their slice is large
+WARM_PREFIX_LENGTH = 2
+CACHED_SLICE_SIZE = 256
+
+_WORD_PATTERN = re.compile(r'[^\W_]+')
+# Sorts after any character, ends the slice of a prefix
+_LAST_CHARACTER = '\U0010ffff'
+
+
+def normalize(text):
+    """
+    Folded words of a text joined by single spaces, the form keys and
+    prefixes are compared in ("  João-Silva" -> "joao silva").
+    """
+    return ' '.join(_WORD_PATTERN.findall(fold_accents(text or '')))
+
+def suggestion_keys(label):
+    """
+    The folded label and its tail from every later word, one letter words
+    aside ("Maria e Silva" -> "maria e silva", "silva").
+    """
+    words = normalize(label).split(' ')
+    keys = {' '.join(words)}
+    for position in range(1, len(words)):
+        if len(words[position]) > 1:
+            keys.add(' '.join(words[position:]))
+    return tuple(sys.intern(key) for key in keys if key)
+
+
+class SuggestionIndex:
+    """
+    Suggestions built from the rows of the loaders below and kept current one
+    row at a time. Suggestions are identified by (type rank, ref), ref being
+    the id of hairdressers and preferences and the folded text of service
+    names and neighborhoods.
+    """
+
+    def __init__(self):
+        self._hairdressers = {}
+        self._services = {}
+        self._preferences = {}
+        # {(type rank, ref): [label, popularity, members]}
+        self._suggestions = {}
+        # Sorted (key, type rank, ref)
+        self._keys = []
+        # {prefix: [(type rank, ref)]} best first
+        self._top = {}
+        self._changed = {}
+        # Set while building, when keys are sorted once at the end
+        self._building = False
+
+    def __len__(self):
+        return len(self._suggestions)
+
+    @classmethod
+    def build(cls, hairdressers, services, preferences):
+        """
+        Builds an index from the {id: row} mappings of the loaders.
+        """
+        index = cls()
+        index._building = True
+        for preference_id, name in preferences.items():
+            index._preferences[preference_id] = name
+            index._join(_PREFERENCE, preference_id, name, 0)
+        for service_id, row in services.items():
+            index._services[service_id] = row
+            index._join(_SERVICE, normalize(row[0]), row[0], row[1])
+        for hairdresser_id, row in hairdressers.items():
+            index._hairdressers[hairdresser_id] = row
+            index._join_hairdresser(hairdresser_id, row)
+        index._building = False
+
+        index._keys = sorted(
+            (key, type_rank, ref)
+            for (type_rank, ref), (label, _, _) in index._suggestions.items()
+            for key in suggestion_keys(label)
+        )
+        for prefix in {key[:length] for key, _, _ in index._keys for length in range(1, WARM_PREFIX_LENGTH + 1)}:
+            index._top[prefix] = index._compute_top(prefix)
+        return index
+
+    def _rank(self, suggestion):
+        label, popularity, _ = self._suggestions[suggestion]
+        return (-popularity, len(label), label, suggestion)
+
+    def _slice(self, prefix):
+        return bisect_left(self._keys, (prefix,)), bisect_left(self._keys, (prefix + _LAST_CHARACTER,))
+
+    def _compute_top(self, prefix, start=None, end=None):
+        if start is None:
+            start, end = self._slice(prefix)
+        suggestions = {(type_rank, ref) for _, type_rank, ref in self._keys[start:end]}
+        return heapq.nsmallest(MAX_SUGGESTIONS, suggestions, key=self._rank)
+
+    def suggest(self, text, limit=MAX_SUGGESTIONS):
+        """
+        The `limit` most popular suggestions having a key starting with the
+        text, as (type, ref, label, popularity).
+        """
+        prefix = normalize(text)
+        if not prefix:
+            return []
+
+        top = self._top.get(prefix)
+        if top is None:
+            start, end = self._slice(prefix)
+            top = self._compute_top(prefix, start, end)
+            if end - start > CACHED_SLICE_SIZE:
+                self._top[prefix] = top
+
+        results = []
+        for suggestion in top[:limit]:
+            label, popularity, _ = self._suggestions[suggestion]
+            results.append((SUGGESTION_TYPES[suggestion[0]], suggestion[1], label, popularity))
+        return results
+
+    def _mark(self, suggestion):
+        """
+        Remembers the label and popularity of a suggestion before its first
+        change, for _update_top.
+        """
+        if self._building or suggestion in self._changed:
+            return
+        entry = self._suggestions.get(suggestion)
+        self._changed[suggestion] = (entry[0], entry[1]) if entry is not None else None
+
+    def _join(self, type_rank, ref, label, bookings):
+        if not ref:
+            return
+        suggestion = (type_rank, ref)
+        self._mark(suggestion)
+        entry = self._suggestions.get(suggestion)
+        if entry is None:
+            entry = self._suggestions[suggestion] = [label, 0, 0]
+            if not self._building:
+                for key in suggestion_keys(label):
+                    insort(self._keys, (key, type_rank, ref))
+        entry[1] += bookings
+        entry[2] += 1
+
+    def _leave(self, type_rank, ref, bookings):
+        suggestion = (type_rank, ref)
+        entry = self._suggestions.get(suggestion)
+        if entry is None:
+            return
+        self._mark(suggestion)
+        entry[1] -= bookings
+        entry[2] -= 1
+        if entry[2] <= 0:
+            self._drop(suggestion)
+
+    def _drop(self, suggestion):
+        label = self._suggestions.pop(suggestion)[0]
+        for key in suggestion_keys(label):
+            position = bisect_left(self._keys, (key,) + suggestion)
+            if position < len(self._keys) and self._keys[position] == (key,) + suggestion:
+                del self._keys[position]
+
+    def _bump(self, type_rank, ref, bookings):
+        entry = self._suggestions.get((type_rank, ref))
+        if entry is not None and bookings:
+            self._mark((type_rank, ref))
+            entry[1] += bookings
+
+    def _join_hairdresser(self, hairdresser_id, row):
+        name, neighborhood, preference_ids, bookings = row
+        self._join(_HAIRDRESSER, hairdresser_id, name, bookings)
+        self._join(_NEIGHBORHOOD, normalize(neighborhood), neighborhood, bookings)
+        for preference_id in preference_ids:
+            self._bump(_PREFERENCE, preference_id, bookings)
+
+    def _leave_hairdresser(self, hairdresser_id, row):
+        name, neighborhood, preference_ids, bookings = row
+        self._leave(_HAIRDRESSER, hairdresser_id, bookings)
+        self._leave(_NEIGHBORHOOD, normalize(neighborhood), bookings)
+        for preference_id in preference_ids:
+            self._bump(_PREFERENCE, preference_id, -bookings)
+
+    def set_hairdresser(self, hairdresser_id, row):
+        """
+        Replaces the row of a hairdresser, None removes it.
+        """
+        old_row = self._hairdressers.pop(hairdresser_id, None)
+        if old_row is not None:
+            self._leave_hairdresser(hairdresser_id, old_row)
+        if row is not None:
+            self._hairdressers[hairdresser_id] = row
+            self._join_hairdresser(hairdresser_id, row)
+        self._update_top()
+
+    def set_service(self, service_id, row):
+        """
+        Replaces the row of a service, None removes it.
+        """
+        old_row = self._services.pop(service_id, None)
+        if old_row is not None:
+            self._leave(_SERVICE, normalize(old_row[0]), old_row[1])
+        if row is not None:
+            self._services[service_id] = row
+            self._join(_SERVICE, normalize(row[0]), row[0], row[1])
+        self._update_top()
+
+    def set_preference(self, preference_id, name):
+        """
+        Replaces the name of a preference, None removes it.
+        """
+        if self._preferences.pop(preference_id, None) is not None:
+            self._leave(_PREFERENCE, preference_id, 0)
+        if name is not None:
+            self._preferences[preference_id] = name
+            bookings = sum(row[3] for row in self._hairdressers.values() if preference_id in row[2])
+            self._join(_PREFERENCE, preference_id, name, bookings)
+        self._update_top()
+
+    def _update_top(self):
+        """
+        Brings the cached top suggestions of the prefixes of the changed keys
+        up to date. Suggestions that gained bookings are moved in place; a
+        cached suggestion that lost bookings, was renamed or went away makes
+        its prefix computed again, as the next best one is not known.
+        """
+        changed, self._changed = self._changed, {}
+        stale = set()
+        for suggestion, previous in changed.items():
+            entry = self._suggestions.get(suggestion)
+            exists = entry is not None
+            keys = suggestion_keys(entry[0]) if exists else ()
+            worse = False
+            if previous is not None:
+                keys += suggestion_keys(previous[0])
+                worse = not exists or entry[0] != previous[0] or entry[1] < previous[1]
+            elif not exists:
+                continue
+
+            prefixes = {key[:length] for key in keys for length in range(1, len(key) + 1)}
+            for prefix in prefixes:
+                top = self._top.get(prefix)
+                if top is None or prefix in stale:
+                    continue
+                if suggestion in top:
+                    if worse:
+                        stale.add(prefix)
+                    else:
+                        top.sort(key=self._rank)
+                elif exists and any(key.startswith(prefix) for key in suggestion_keys(self._suggestions[suggestion][0])):
+                    top.append(suggestion)
+                    top.sort(key=self._rank)
+                    del top[MAX_SUGGESTIONS:]
+        for prefix in stale:
+            self._top[prefix] = self._compute_top(prefix)
+
+    def memory_usage(self):
+        """
+        Approximate footprint in bytes of the keys, the suggestions and the
+        cached top suggestions.
+        """
+        keys = sys.getsizeof(self._keys) + sum(map(sys.getsizeof, self._keys)) + sum(
+            sys.getsizeof(key) for key in {key for key, _, _ in self._keys}
+        )
+        suggestions = sys.getsizeof(self._suggestions) + sum(
+            sys.getsizeof(suggestion) + sys.getsizeof(entry) + sys.getsizeof(entry[0])
+            for suggestion, entry in self._suggestions.items()
+        )
+        top = sys.getsizeof(self._top) + sum(
+            sys.getsizeof(prefix) + sys.getsizeof(suggestions) for prefix, suggestions in self._top.items()
+        )
+        return {
+            'suggestions': len(self._suggestions),
+            'keys': len(self._keys),
+            'cached_prefixes': len(self._top),
+            'bytes': keys + suggestions + top,
+        }
+
+
+def load_hairdresser_rows(hairdresser_ids=None, user_ids=None):
+    """
+    {hairdresser_id: (name, neighborhood, preference ids, bookings)}.
+    """
+    from preferences.models import Preferences
+    from users.models import Hairdresser
+
+    hairdressers = Hairdresser.objects.all()
+    if hairdresser_ids is not None:
+        hairdressers = hairdressers.filter(id__in=hairdresser_ids)
+    if user_ids is not None:
+        hairdressers = hairdressers.filter(user_id__in=user_ids)
+    rows = list(
+        hairdressers
+        .annotate(bookings=Count('service__reserve'))
+        .values_list('id', 'user_id', 'user__first_name', 'user__last_name', 'user__neighborhood', 'bookings')
+    )
+
+    preference_ids = {}
+    memberships = Preferences.users.through.objects.values_list('user_id', 'preferences_id')
+    if hairdresser_ids is not None or user_ids is not None:
+        memberships = memberships.filter(user_id__in=[row[1] for row in rows])
+    for user_id, preference_id in memberships:
+        preference_ids.setdefault(user_id, []).append(preference_id)
+
+    return {
+        hairdresser_id: (
+            f'{first_name} {last_name}'.strip(),
+            neighborhood or '',
+            tuple(preference_ids.get(user_id, ())),
+            bookings,
+        )
+        for hairdresser_id, user_id, first_name, last_name, neighborhood, bookings in rows
+    }
+
+def load_service_rows(service_ids=None):
+    """
+    {service_id: (name, bookings)}.
+    """
+    from service.models import Service
+
+    services = Service.objects.all()
+    if service_ids is not None:
+        services = services.filter(id__in=service_ids)
+    return {
+        service_id: (name, bookings)
+        for service_id, name, bookings in services.annotate(bookings=Count('reserve')).values_list('id', 'name', 'bookings')
+    }
+
+def load_preference_rows(preference_ids=None):
+    """
+    {preference_id: name}.
+    """
+    from preferences.models import Preferences
+
+    preferences = Preferences.objects.all()
+    if preference_ids is not None:
+        preferences = preferences.filter(id__in=preference_ids)
+    return dict(preferences.values_list('id', 'name'))
+
+def build_suggestion_index():
+    return SuggestionIndex.build(load_hairdresser_rows(), load_service_rows(), load_preference_rows())
@@ -1,4 +1,4 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
@@ -6,7 +6,11 @@ import json
 import jwt
 import datetime
 import bcrypt
-from .models import User, Customer, Hairdresser
+from .models import User, Customer, Hairdresser, PostalCodeLocation, SimilarHairdresser
+from .serializers import HairdresserSerializer
+from reserve.models import CustomerRecommendation
+from .similar import refresh_similar_hairdressers
+from users import for_you, home_feed, search_index
 from preferences.models import Preferences
 from service.models import Service
 from unittest.mock import patch
@@ -760,6 +764,8 @@ class UserInfoViewTest(TestCase):
 class CustomerHomeViewTest(TestCase):
     def setUp(self):
         self.client = APIClient()
+        home_feed.reset()
+        for_you.reset()
         self.register_url = reverse('register')
         
         # Create preferences for testing
@@ -1075,6 +1081,126 @@ class CustomerHomeViewTest(TestCase):
                 self.assertIn('email', hairdresser['user'])
                 self.assertIn('role', hairdresser['user'])
                 self.assertEqual(hairdresser['user']['role'], 'hairdresser')
+
+    def test_customer_home_reads_rails_snapshot(self):
+        url = reverse('customer_home_info', kwargs={'email': 'customer@example.com'})
+        first = self.client.get(url).json()
+
+        # Only the customer, the "for you" page and the stored recommendations are read
+        with self.assertNumQueries(3):
+            second = self.client.get(url).json()
+        self.assertEqual(second['hairdressers_by_preferences'], first['hairdressers_by_preferences'])
+
+    def test_customer_home_rails_refresh_on_writes(self):
+        url = reverse('customer_home_info', kwargs={'email': 'customer@example.com'})
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hairdresser_user_2.preferences.add(self.barbearia_pref)
+        rail = self.client.get(url).json()['hairdressers_by_preferences']['barbearia']
+        self.assertEqual(
+            sorted(hairdresser['user']['email'] for hairdresser in rail),
+            ['hairdresser1@example.com', 'hairdresser2@example.com'],
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hairdresser_user_1.first_name = 'Renamed'
+            self.hairdresser_user_1.save()
+        rail = self.client.get(url).json()['hairdressers_by_preferences']['coloracao']
+        self.assertEqual([hairdresser['user']['first_name'] for hairdresser in rail], ['Renamed'])
+
+    def test_customer_home_trending_rail(self):
+        Hairdresser.objects.filter(user=self.hairdresser_user_2).update(trending_score=3)
+        Hairdresser.objects.filter(user=self.hairdresser_user_1).update(trending_score=1.5)
+        url = reverse('customer_home_info', kwargs={'email': 'customer@example.com'})
+
+        trending = self.client.get(url).json()['trending']
+        self.assertEqual(
+            [hairdresser['user']['email'] for hairdresser in trending],
+            ['hairdresser2@example.com', 'hairdresser1@example.com'],
+        )
+        # Same representation as the serializer
+        self.assertEqual(trending[0], HairdresserSerializer(Hairdresser.objects.get(user=self.hairdresser_user_2)).data)
+
+    @override_settings(HOME_FEED_RAILS=['Corte', 'Tranças'])
+    def test_customer_home_rails_from_settings(self):
+        self.hairdresser_user_1.preferences.add(self.other_pref)
+        url = reverse('customer_home_info', kwargs={'email': 'customer@example.com'})
+        preferences_data = self.client.get(url).json()['hairdressers_by_preferences']
+
+        self.assertEqual(list(preferences_data), ['corte', 'trancas'])
+        self.assertEqual([hairdresser['user']['email'] for hairdresser in preferences_data['corte']], ['hairdresser1@example.com'])
+
+    def test_customer_home_rails_single_query(self):
+        for i in range(12):
+            user = User.objects.create(
+                email=f'ranked{i}@example.com', first_name=f'Ranked{i}', phone=f'55920000{i:04d}',
+                postal_code='69000000', role='hairdresser', rating=i % 6,
+            )
+            Hairdresser.objects.create(user=user, cnpj='00000000000000')
+            user.preferences.add(self.cachos_pref)
+        self.hairdresser_user_2.profile_picture = 'profile_pics/profile.jpg'
+        self.hairdresser_user_2.save()
+
+        with self.assertNumQueries(1):
+            rails = home_feed.build_rails()
+
+        ratings = [hairdresser['user']['rating'] for hairdresser in rails['cachos']]
+        self.assertEqual(len(ratings), home_feed.RAIL_SIZE)
+        self.assertEqual(ratings, sorted(ratings, reverse=True))
+        # Same representation as the serializer
+        hairdresser = Hairdresser.objects.get(user=self.hairdresser_user_2)
+        self.assertEqual(rails['trancas'], [HairdresserSerializer(hairdresser).data])
+
+    def test_customer_home_for_you_ranked_and_paginated(self):
+        user = User.objects.create(
+            email='both@example.com', first_name='Both', phone='5592000000', postal_code='69000000',
+            role='hairdresser', rating=1,
+        )
+        Hairdresser.objects.create(user=user, cnpj='00000000000000')
+        user.preferences.add(self.coloracao_pref, self.cachos_pref)
+
+        url = reverse('customer_home_info', kwargs={'email': 'customer@example.com'})
+        emails, cursor = [], None
+        for _ in range(3):
+            params = {'limit': 1, 'cursor': cursor} if cursor else {'limit': 1}
+            data = self.client.get(url, params).json()
+            self.assertEqual(len(data['for_you']), 1)
+            emails.append(data['for_you'][0]['user']['email'])
+            cursor = data['for_you_next_cursor']
+        self.assertIsNone(cursor)
+
+        # Sharing both preferences beats a better rating, then the rating decides
+        self.assertEqual(emails, ['both@example.com', 'hairdresser2@example.com', 'hairdresser1@example.com'])
+
+        response = self.client.get(url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_customer_home_recommended_from_bookings(self):
+        customer = Customer.objects.get(user=self.customer_user)
+        hairdresser = Hairdresser.objects.get(user=self.hairdresser_user_2)
+        CustomerRecommendation.objects.create(customer=customer, hairdresser=hairdresser, rank=1, score=0.7)
+
+        url = reverse('customer_home_info', kwargs={'email': 'customer@example.com'})
+        recommended = self.client.get(url).json()['recommended']
+        self.assertEqual([(entry['id'], entry['score']) for entry in recommended], [(hairdresser.id, 0.7)])
+
+    def test_for_you_matrix_scores(self):
+        rows = [
+            (1, 11, 5, 'Centro', 0),
+            (2, 12, 5, 'Aleixo', 50),
+            (3, 13, 5, 'Centro', 0),
+            (4, 14, 5, 'Centro', 0),
+        ]
+        memberships = [(11, 100), (12, 100), (13, 100), (14, 200)]
+        matrix = for_you.ForYouMatrix(rows, memberships)
+
+        page = matrix.ranked_page([100], 'centro', limit=10)
+        # Popularity outweighs the neighborhood, ties go to the lowest id, 4 shares nothing
+        self.assertEqual([hairdresser_id for _, hairdresser_id in page], [2, 1, 3])
+        self.assertEqual(matrix.ranked_page([100], 'centro', limit=10, after=page[1]), page[2:])
+
+
 class GlobalSearchViewTest(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -1193,6 +1319,8 @@ class GlobalSearchViewTest(TestCase):
             price=200.00,
             duration=90
         )
+        # Built again from this test's data on the first search
+        search_index.reset()
 
     def test_search_without_query_parameter(self):
         """Test search endpoint without query parameter returns empty list"""
@@ -1429,6 +1557,585 @@ class GlobalSearchViewTest(TestCase):
         response_time = end_time - start_time
         self.assertLess(response_time, 1.0)
 
+    def _hairdresser_names(self, query):
+        response = self.client.get(self.search_url, {'search': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [
+            r['user']['first_name'] for r in response.json()['data']
+            if r.get('result_type') == 'hairdresser'
+        ]
+
+    def test_search_hairdressers_by_preference_name(self):
+        """Test search matches the names of the hairdresser preferences"""
+        self.assertEqual(sorted(self._hairdresser_names('Cachos')), ['Bob', 'Carol'])
+
+    def test_search_matches_word_prefixes_and_requires_every_term(self):
+        """Test partially typed terms match and every term must be found"""
+        self.assertEqual(self._hairdresser_names('ali'), ['Alice'])
+        self.assertEqual(sorted(self._hairdresser_names('cach smi')), ['Bob'])
+
+        from users.search import search_hairdressers
+        self.assertFalse(search_hairdressers(Hairdresser.objects.all(), 'Alice Smith'))
+
+    def test_search_uses_portuguese_stemming(self):
+        """Test inflected Portuguese words match their stem"""
+        self.assertEqual(sorted(self._hairdresser_names('cacho')), ['Bob', 'Carol'])
+
+    def test_search_ranks_name_matches_above_resume_matches(self):
+        """Test hairdressers whose name matches come before resume-only matches"""
+        self._hairdresser_names('styling')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user3.last_name = 'Styling'
+            self.user3.save()
+
+            # Carol has it in her name, Alice only in her resume
+            self.hairdresser1.resume = 'Styling for weddings'
+            self.hairdresser1.save()
+
+        self.assertEqual(self._hairdresser_names('styling'), ['Carol', 'Alice'])
+
+    def test_search_document_follows_user_and_preference_changes(self):
+        """Test the search document and index are refreshed when their sources change"""
+        self._hairdresser_names('manaus')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user1.city = 'Manaus'
+            self.user1.save()
+        self.assertEqual(self._hairdresser_names('manaus'), ['Alice'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user1.preferences.add(self.pref2)
+        self.assertIn('Alice', self._hairdresser_names('cachos'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pref2.users.remove(self.user2)
+        self.assertNotIn('Bob', self._hairdresser_names('cachos'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pref3.name = 'Tranças'
+            self.pref3.save()
+        self.assertEqual(sorted(self._hairdresser_names('trança')), ['Alice', 'Carol'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pref1.delete()
+        # Alice still mentions coloring in her resume
+        self.assertEqual(self._hairdresser_names('coloração'), ['Alice'])
+
+    def test_search_matches_misspelled_and_full_names(self):
+        """Test names with typos, missing accents or extra words still match"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user3.first_name = 'Cárol Ana'
+            self.user3.save()
+
+        self.assertEqual(self._hairdresser_names('Alcie Jonson'), ['Alice'])
+        self.assertEqual(self._hairdresser_names('carol'), ['Cárol Ana'])
+        self.assertEqual(self._hairdresser_names('Carol Ana Davis Pereira'), ['Cárol Ana'])
+
+    def test_match_hairdresser_names_limits_and_orders_by_score(self):
+        """Test fuzzy name matching returns the best matches first, up to the limit"""
+        from users.search import match_hairdresser_names
+
+        self.user2.first_name = 'Alicia'
+        self.user2.save()
+
+        matches = list(match_hairdresser_names(Hairdresser.objects.all(), 'alice'))
+        self.assertEqual([h.id for h in matches], [self.hairdresser1.id, self.hairdresser2.id])
+        self.assertGreater(matches[0].name_score, matches[1].name_score)
+
+        matches = match_hairdresser_names(Hairdresser.objects.all(), 'alice', limit=1)
+        self.assertEqual([h.id for h in matches], [self.hairdresser1.id])
+        self.assertFalse(match_hairdresser_names(Hairdresser.objects.all(), '  '))
+
+    def test_search_folds_accents(self):
+        """Test unaccented queries match accented preferences and vice versa"""
+        self.assertEqual(sorted(self._hairdresser_names('coloracao')), ['Alice', 'Carol'])
+        self.assertEqual(sorted(self._hairdresser_names('ÁLÍCE')), ['Alice'])
+
+    def test_search_serializes_hits_with_one_query_per_type(self):
+        """Test the index answers the search and hits are fetched in bulk"""
+        search_index.get_index()
+        # The facet counts, then one query per result type
+        with self.assertNumQueries(3):
+            response = self.client.get(self.search_url, {'search': 'hair'})
+
+        result_types = [r['result_type'] for r in response.json()['data']]
+        self.assertEqual(result_types.count('hairdresser'), 3)
+        self.assertEqual(result_types.count('service'), 3)
+
+    def test_search_index_follows_service_changes(self):
+        """Test services enter and leave the index as they are saved and deleted"""
+        search_index.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            service = Service.objects.create(name='Hidratação Profunda', hairdresser=self.hairdresser2, price=90, duration=60)
+
+        response = self.client.get(self.search_url, {'search': 'hidrat'})
+        self.assertEqual([r['name'] for r in response.json()['data']], ['Hidratação Profunda'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            service.delete()
+        response = self.client.get(self.search_url, {'search': 'hidrat'})
+        self.assertEqual(response.json()['data'], [])
+
+    def test_inverted_index_updates_and_long_terms(self):
+        """Test the posting lists follow document updates, including terms longer than the prefixes"""
+        index = search_index.InvertedIndex.build((1.0, 0.5), {
+            1: (search_index.tokenize('Maria'), search_index.tokenize('Especialista em cabelos cacheados')),
+            2: (search_index.tokenize('Mariana'), ()),
+        })
+        self.assertEqual(index.search(['mari']), [(1.0, 1), (1.0, 2)])
+        self.assertEqual(index.search(['mari', 'cach']), [(0.75, 1)])
+        self.assertEqual(index.search(['especialistaabc']), [])
+        self.assertEqual(index.search(['especialista']), [(0.5, 1)])
+
+        index.add(2, (search_index.tokenize('Mariana'), search_index.tokenize('Especialistas')))
+        index.remove(1)
+        self.assertEqual(index.search(['especialista']), [(0.5, 2)])
+        self.assertEqual(index.memory_usage()['documents'], 1)
+        self.assertEqual(index.search(['maria']), [(1.0, 2)])
+
+    def test_search_pages_follow_the_cursor(self):
+        """Test results are paginated with an opaque cursor until exhausted"""
+        seen = []
+        cursor = None
+        for _ in range(6):
+            params = {'search': 'hair', 'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get(self.search_url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response_data = response.json()
+
+            self.assertEqual(response_data['counts'], {'hairdresser': 3, 'service': 3})
+            seen += [(r['result_type'], r['id'], r['score']) for r in response_data['data']]
+            cursor = response_data['next_cursor']
+            if cursor is None:
+                break
+
+        self.assertEqual(len(seen), 6)
+        self.assertEqual(len(set(seen)), 6)
+        scores = [score for _, _, score in seen]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_search_ranks_hairdressers_and_services_on_one_scale(self):
+        """Test services and hairdressers are merged in a single score order"""
+        response = self.client.get(self.search_url, {'search': 'curly', 'limit': 1})
+        response_data = response.json()
+
+        # The service matches by name, Bob only through his resume
+        self.assertEqual(response_data['counts'], {'hairdresser': 1, 'service': 1})
+        self.assertEqual(response_data['data'][0]['result_type'], 'service')
+        self.assertEqual(response_data['data'][0]['score'], 1.0)
+        self.assertIsNotNone(response_data['next_cursor'])
+
+        response = self.client.get(self.search_url, {'search': 'curly', 'cursor': response_data['next_cursor']})
+        response_data = response.json()
+        self.assertEqual(response_data['data'][0]['user']['first_name'], 'Bob')
+        self.assertEqual(response_data['data'][0]['score'], 0.1)
+        self.assertIsNone(response_data['next_cursor'])
+
+    def test_search_first_page_cost_does_not_depend_on_matches(self):
+        """Test a query matching many rows only fetches the page"""
+        Service.objects.bulk_create(
+            Service(name=f'Hair Style {i}', hairdresser=self.hairdresser1, price=50, duration=30)
+            for i in range(300)
+        )
+        search_index.reset()
+        search_index.get_index()
+
+        # No hairdresser matches, so the stemmed document and the fuzzy name
+        # match are tried, then the facets are counted and the page is fetched
+        with self.assertNumQueries(4):
+            response = self.client.get(self.search_url, {'search': 'hair style', 'limit': 5})
+        response_data = response.json()
+        self.assertEqual(len(response_data['data']), 5)
+        self.assertEqual(response_data['counts']['service'], 300)
+
+    def test_search_returns_facet_counts(self):
+        """Test the first page counts the results by neighborhood, city, preference, price and duration"""
+        response = self.client.get(self.search_url, {'search': 'hair'})
+        facets = response.json()['facets']
+
+        def counts(facet):
+            return [(value['label'], value['count']) for value in facets[facet]]
+
+        self.assertEqual(counts('neighborhood'), [('Hairdresser Neighborhood', 6)])
+        self.assertEqual(counts('city'), [('Hairdresser City', 6)])
+        self.assertEqual(counts('preference'), [('Coloração', 4), ('Corte', 4), ('Cachos', 3)])
+        self.assertEqual(facets['preference'][0]['value'], self.pref1.id)
+        # Hairdressers count in the band of each of their services
+        self.assertEqual(counts('price_band'), [('50-100', 4), ('100-200', 2), ('over-200', 1)])
+        self.assertEqual(counts('duration'), [('60-120', 3), ('over-120', 4)])
+
+        # Later pages leave the counts out
+        response = self.client.get(self.search_url, {'search': 'hair', 'limit': 2})
+        response = self.client.get(self.search_url, {'search': 'hair', 'limit': 2, 'cursor': response.json()['next_cursor']})
+        self.assertIsNone(response.json()['facets'])
+
+    def test_facets_only_count_the_best_ranked_results(self):
+        """Test broad queries count the facets of a bounded window, one row per facet value"""
+        from users import facets
+
+        with patch.object(facets, 'MAX_FACET_CANDIDATES', 2):
+            response = self.client.get(self.search_url, {'search': 'hair'})
+        self.assertEqual(response.json()['facets']['neighborhood'][0]['count'], 2)
+        self.assertEqual(response.json()['counts'], {'hairdresser': 3, 'service': 3})
+
+        # Preferences and services add rows instead of multiplying them
+        user = self.hairdresser1.user
+        rows = facets.candidate_rows([self.hairdresser1.id], [], {})
+        self.assertEqual(len(rows), 1 + user.preferences.count() + Service.objects.filter(hairdresser=self.hairdresser1).count())
+
+    def test_search_applies_facet_selections(self):
+        """Test facet selections narrow the results, their counts and every page"""
+        def result_names(response):
+            return sorted(
+                r['user']['first_name'] if r['result_type'] == 'hairdresser' else r['name']
+                for r in response.json()['data']
+            )
+
+        response = self.client.get(self.search_url, {'search': 'hair', 'price_band': '50-100'})
+        self.assertEqual(result_names(response), ['Alice', 'Bob', 'Curly Hair Treatment', 'Hair Cut'])
+        self.assertEqual(response.json()['counts'], {'hairdresser': 2, 'service': 2})
+        self.assertEqual(response.json()['facets']['neighborhood'][0]['count'], 4)
+
+        params = {'search': 'hair', 'price_band': '50-100', 'preference': self.pref2.id}
+        response = self.client.get(self.search_url, params)
+        self.assertEqual(result_names(response), ['Bob', 'Curly Hair Treatment'])
+
+        first_page = self.client.get(self.search_url, {**params, 'limit': 1})
+        second_page = self.client.get(self.search_url, {**params, 'limit': 1, 'cursor': first_page.json()['next_cursor']})
+        self.assertEqual(sorted(result_names(first_page) + result_names(second_page)), ['Bob', 'Curly Hair Treatment'])
+        self.assertIsNone(second_page.json()['next_cursor'])
+
+        response = self.client.get(self.search_url, {'search': 'hair', 'duration': 'over-120', 'city': 'Hairdresser City'})
+        self.assertEqual(result_names(response), ['Alice', 'Bob', 'Curly Hair Treatment', 'Hair Coloring'])
+
+        response = self.client.get(self.search_url, {'search': 'hair', 'neighborhood': 'Centro'})
+        self.assertEqual(response.json()['data'], [])
+
+    def test_search_rejects_invalid_facet_selections(self):
+        """Test unknown bands and non numeric preferences are rejected"""
+        for params in [{'price_band': 'cheap'}, {'duration': '45'}, {'preference': 'cachos'}]:
+            response = self.client.get(self.search_url, {'search': 'hair', **params})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('error', response.json())
+
+    def test_search_rejects_invalid_pagination(self):
+        """Test invalid limits and tampered cursors are rejected"""
+        for params in [{'limit': 0}, {'limit': 101}, {'limit': 'ten'}, {'cursor': 'not-a-cursor'}, {'cursor': 'WzEsIDJd'}]:
+            response = self.client.get(self.search_url, {'search': 'hair', **params})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('error', response.json())
+
+    def test_rebuild_requested_elsewhere_reaches_this_process(self):
+        """Test the index is rebuilt once the version bumped by another process is checked"""
+        import time
+        from reserve.versions import bump_version
+
+        index = search_index.get_index()
+        # What rebuild_search_index does from its own process
+        bump_version(search_index.VERSION_NAME)
+
+        self.assertIs(search_index.get_index(), index)
+        with patch('time.time', return_value=time.time() + search_index.VERSION_CHECK_INTERVAL):
+            rebuilt = search_index.get_index()
+        self.assertIsNot(rebuilt, index)
+
+    def test_rebuild_search_index_command_reports_memory(self):
+        """Test the rebuild command reports the footprint of both indexes"""
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('hairdressers: 3 documents', out.getvalue())
+        self.assertIn('services: 4 documents', out.getvalue())
+
+class SearchSuggestionViewTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.suggest_url = reverse('search_suggest')
+        search_index.reset()
+
+        self.cachos = Preferences.objects.create(name='Cachos')
+        self.ana = self.create_hairdresser('Ana', 'Souza', 'ana@example.com', '11900000001', 'Adrianópolis')
+        self.andre = self.create_hairdresser('André', 'Lima', 'andre@example.com', '11900000002', 'Aleixo')
+        self.cachos.users.add(self.ana.user)
+
+        self.corte_ana = Service.objects.create(name='Corte', price=50, duration=60, hairdresser=self.ana)
+        self.corte_andre = Service.objects.create(name='Corte', price=40, duration=30, hairdresser=self.andre)
+        self.coloracao = Service.objects.create(name='Coloração', price=120, duration=90, hairdresser=self.andre)
+
+        customer_user = User.objects.create(
+            first_name='Customer', last_name='User', phone='11900000003', email='customer@example.com',
+            role='customer', neighborhood='Centro', city='Manaus', state='AM', address='Rua A',
+            postal_code='69005000', password='customer_password',
+        )
+        self.customer = Customer.objects.create(user=customer_user)
+        for _ in range(3):
+            self.book(self.corte_andre)
+        self.book(self.corte_ana)
+
+    def create_hairdresser(self, first_name, last_name, email, phone, neighborhood):
+        user = User.objects.create(
+            first_name=first_name, last_name=last_name, phone=phone, email=email, role='hairdresser',
+            neighborhood=neighborhood, city='Manaus', state='AM', address='Rua B',
+            postal_code='69000000', password='hairdresser_password',
+        )
+        return Hairdresser.objects.create(user=user, cnpj='12345678901234')
+
+    def book(self, service):
+        from reserve.models import Reserve
+        return Reserve.objects.create(customer=self.customer, service=service)
+
+    def suggestions(self, search, **params):
+        response = self.client.get(self.suggest_url, {'search': search, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(suggestion['type'], suggestion['label']) for suggestion in response.json()['data']]
+
+    def test_suggestions_are_ranked_by_bookings(self):
+        """Test every kind of suggestion is offered for a prefix, most booked first"""
+        # Equally booked suggestions come shortest first
+        self.assertEqual(self.suggestions('a'), [
+            ('neighborhood', 'Aleixo'),
+            ('hairdresser', 'André Lima'),
+            ('hairdresser', 'Ana Souza'),
+            ('neighborhood', 'Adrianópolis'),
+        ])
+        # Both Corte services are one suggestion with their bookings summed
+        response = self.client.get(self.suggest_url, {'search': 'CO'})
+        self.assertEqual(
+            [(s['type'], s['label'], s['popularity'], s['id']) for s in response.json()['data']],
+            [('service', 'Corte', 4, None), ('service', 'Coloração', 0, None)],
+        )
+
+    def test_suggestions_match_later_words_and_folded_text(self):
+        """Test suggestions are found from any word and without accents"""
+        self.assertEqual(self.suggestions('sou'), [('hairdresser', 'Ana Souza')])
+        self.assertEqual(self.suggestions('andre l'), [('hairdresser', 'André Lima')])
+        self.assertEqual(self.suggestions('coloracao'), [('service', 'Coloração')])
+        self.assertEqual(self.suggestions('cach'), [('preference', 'Cachos')])
+        self.assertEqual(self.suggestions('a', limit=1), [('neighborhood', 'Aleixo')])
+        self.assertEqual(self.suggestions(''), [])
+
+    def test_suggestions_follow_bookings_and_changes(self):
+        """Test new bookings, renames and deletions reach the suggestions"""
+        self.suggestions('a')
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                self.book(self.corte_ana)
+        self.assertEqual(self.suggestions('a')[:2], [('hairdresser', 'Ana Souza'), ('neighborhood', 'Adrianópolis')])
+        self.assertEqual(self.suggestions('cach'), [('preference', 'Cachos')])
+        response = self.client.get(self.suggest_url, {'search': 'cach'})
+        self.assertEqual(response.json()['data'][0]['popularity'], 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.andre.user.first_name = 'Bruno'
+            self.andre.user.save()
+            self.coloracao.name = 'Mechas'
+            self.coloracao.save()
+            Preferences.objects.create(name='Barbearia')
+        self.assertNotIn(('hairdresser', 'André Lima'), self.suggestions('a'))
+        self.assertEqual(self.suggestions('br'), [('hairdresser', 'Bruno Lima')])
+        self.assertEqual(self.suggestions('co'), [('service', 'Corte')])
+        self.assertEqual(self.suggestions('barb'), [('preference', 'Barbearia')])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cachos.delete()
+        self.assertEqual(self.suggestions('cach'), [])
+
+    def test_cached_prefixes_match_a_fresh_build(self):
+        """Test the cached top suggestions kept current in place match a rebuilt index"""
+        import random
+        from users.suggest import SuggestionIndex
+
+        rng = random.Random(7)
+        names = ['Ana', 'Andre', 'Bia', 'Bruno', 'Carla', 'Caio']
+        neighborhoods = ['Aleixo', 'Centro', 'Adrianopolis', '']
+        services = ['Corte', 'Coloracao', 'Barba', 'Cachos']
+        hairdressers = {
+            i: (f'{rng.choice(names)} {rng.choice(names)}', rng.choice(neighborhoods), (1,), rng.randint(0, 5))
+            for i in range(40)
+        }
+        service_rows = {i: (rng.choice(services), rng.randint(0, 5)) for i in range(60)}
+        index = SuggestionIndex.build(hairdressers, service_rows, {1: 'Cachos', 2: 'Coloracao'})
+
+        for _ in range(300):
+            if rng.random() < 0.6:
+                hairdresser_id = rng.randrange(50)
+                row = None if rng.random() < 0.1 else (
+                    f'{rng.choice(names)} {rng.choice(names)}', rng.choice(neighborhoods),
+                    tuple(rng.sample([1, 2], rng.randint(0, 2))), rng.randint(0, 8),
+                )
+                index.set_hairdresser(hairdresser_id, row)
+                hairdressers.pop(hairdresser_id, None)
+                if row is not None:
+                    hairdressers[hairdresser_id] = row
+            else:
+                service_id = rng.randrange(70)
+                row = None if rng.random() < 0.1 else (rng.choice(services), rng.randint(0, 8))
+                index.set_service(service_id, row)
+                service_rows.pop(service_id, None)
+                if row is not None:
+                    service_rows[service_id] = row
+
+        fresh = SuggestionIndex.build(hairdressers, service_rows, {1: 'Cachos', 2: 'Coloracao'})
+        for prefix in ['a', 'b', 'c', 'ca', 'co', 'an', 'ana', 'centro']:
+            self.assertEqual(
+                [suggestion[2:] for suggestion in index.suggest(prefix)],
+                [suggestion[2:] for suggestion in fresh.suggest(prefix)],
+                prefix,
+            )
+
+    def test_suggestions_reject_invalid_limit(self):
+        """Test limits outside 1 to 20 are rejected"""
+        for limit in [0, 21, 'five']:
+            response = self.client.get(self.suggest_url, {'search': 'a', 'limit': limit})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('error', response.json())
+
+class NearbyHairdressersViewTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.nearby_url = reverse('nearby_search')
+
+        PostalCodeLocation.objects.create(prefix='690', latitude=-3.1190, longitude=-60.0217, city='Manaus')
+        PostalCodeLocation.objects.create(prefix='69090', latitude=-3.0500, longitude=-60.0200, city='Manaus')
+        PostalCodeLocation.objects.create(prefix='01', latitude=-23.5505, longitude=-46.6333, city='São Paulo')
+
+        self.cachos = Preferences.objects.create(name='Cachos')
+        self.barbearia = Preferences.objects.create(name='Barbearia')
+
+        self.centro = self.create_hairdresser('Ana', 'ana@example.com', '11900000001', '69050-750', [self.cachos])
+        self.norte = self.create_hairdresser('Bia', 'bia@example.com', '11900000002', '69090-000', [self.barbearia])
+        self.paulista = self.create_hairdresser('Carla', 'carla@example.com', '11900000003', '01310-100', [self.cachos])
+
+        self.customer = User.objects.create(
+            first_name='Customer', last_name='User', phone='11900000004', email='customer@example.com',
+            role='customer', neighborhood='Centro', city='Manaus', state='AM', address='Rua A',
+            postal_code='69005-000', password='customer_password',
+        )
+        self.cachos.users.add(self.customer)
+
+    def create_hairdresser(self, first_name, email, phone, postal_code, preferences):
+        user = User.objects.create(
+            first_name=first_name, last_name='Silva', phone=phone, email=email, role='hairdresser',
+            neighborhood='Centro', city='Cidade', state='AM', address='Rua B',
+            postal_code=postal_code, password='hairdresser_password',
+        )
+        for preference in preferences:
+            preference.users.add(user)
+        return Hairdresser.objects.create(user=user, cnpj='12345678901234')
+
+    def names(self, response):
+        return [result['user']['first_name'] for result in response.json()['data']]
+
+    def test_users_are_located_by_the_longest_known_prefix(self):
+        """Test saving a user resolves its coordinates from the postal code table"""
+        self.assertEqual((self.centro.user.latitude, self.centro.user.longitude), (-3.1190, -60.0217))
+        self.assertEqual((self.norte.user.latitude, self.norte.user.longitude), (-3.05, -60.02))
+
+        user = self.centro.user
+        user.postal_code = '99999-999'
+        user.save()
+        user.refresh_from_db()
+        self.assertIsNone(user.latitude)
+        self.assertIsNone(user.longitude)
+
+    def test_load_postal_codes_locates_existing_users(self):
+        """Test the load command fills the table from the bundled file and geocodes every user"""
+        from io import StringIO
+        from django.core.management import call_command
+
+        PostalCodeLocation.objects.all().delete()
+        User.objects.update(latitude=None, longitude=None)
+
+        out = StringIO()
+        call_command('load_postal_codes', '--replace', stdout=out)
+        self.assertIn('located', out.getvalue())
+        self.assertEqual(PostalCodeLocation.objects.get(prefix='690').city, 'Manaus')
+
+        self.paulista.user.refresh_from_db()
+        self.assertAlmostEqual(self.paulista.user.latitude, -23.5505)
+
+        # Manaus is located by neighbourhood, so its users are not all on one point
+        self.customer.refresh_from_db()
+        self.centro.user.refresh_from_db()
+        self.assertEqual(PostalCodeLocation.objects.get(prefix='69005').city, 'Manaus')
+        self.assertAlmostEqual(self.customer.longitude, -60.0196)
+        self.assertNotEqual(
+            (self.centro.user.latitude, self.centro.user.longitude), (self.customer.latitude, self.customer.longitude)
+        )
+
+    def test_saving_a_user_only_resolves_a_new_postal_code(self):
+        """Test the postal code table is not read again when the postal code did not change"""
+        user = User.objects.get(pk=self.centro.user.pk)
+        with patch('users.signals.resolve_coordinates') as resolve:
+            user.first_name = 'Ana Paula'
+            user.save()
+        resolve.assert_not_called()
+
+        user.postal_code = '69090-000'
+        user.save()
+        self.assertEqual((user.latitude, user.longitude), (-3.05, -60.02))
+
+    def test_nearby_orders_by_distance_within_the_radius(self):
+        """Test hairdressers are returned closest first with their distance"""
+        response = self.client.get(self.nearby_url, {'lat': -3.1190, 'lon': -60.0217})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.names(response), ['Ana', 'Bia'])
+        distances = [result['distance_km'] for result in response.json()['data']]
+        self.assertEqual(distances[0], 0)
+        self.assertAlmostEqual(distances[1], 7.7, delta=0.1)
+
+        response = self.client.get(self.nearby_url, {'lat': -3.1190, 'lon': -60.0217, 'radius_km': 5})
+        self.assertEqual(self.names(response), ['Ana'])
+
+        response = self.client.get(self.nearby_url, {'lat': -3.1190, 'lon': -60.0217, 'limit': 1})
+        self.assertEqual(self.names(response), ['Ana'])
+
+    def test_nearby_from_the_customer_location_and_preferences(self):
+        """Test the customer location is the origin and the results can follow its preferences"""
+        response = self.client.get(self.nearby_url, {'email': 'customer@example.com'})
+        self.assertEqual(self.names(response), ['Ana', 'Bia'])
+        self.assertEqual(response.json()['origin']['latitude'], -3.1190)
+
+        response = self.client.get(self.nearby_url, {'email': 'customer@example.com', 'for_you': 'true'})
+        self.assertEqual(self.names(response), ['Ana'])
+
+        response = self.client.get(self.nearby_url, {'email': 'customer@example.com', 'preferences': f'{self.barbearia.id}'})
+        self.assertEqual(self.names(response), ['Bia'])
+
+        response = self.client.get(self.nearby_url, {'lat': -23.55, 'lon': -46.63, 'preferences': f'{self.cachos.id},{self.barbearia.id}'})
+        self.assertEqual(self.names(response), ['Carla'])
+
+    def test_nearby_rejects_invalid_parameters(self):
+        """Test missing origins and out of range parameters are rejected"""
+        for params in [
+            {},
+            {'lat': -3.1},
+            {'lat': 'north', 'lon': -60},
+            {'lat': 91, 'lon': -60},
+            {'lat': -3.1, 'lon': -60, 'radius_km': 0},
+            {'lat': -3.1, 'lon': -60, 'radius_km': 101},
+            {'lat': -3.1, 'lon': -60, 'limit': 0},
+            {'lat': -3.1, 'lon': -60, 'preferences': 'cachos'},
+            {'lat': -3.1, 'lon': -60, 'for_you': 'true'},
+        ]:
+            response = self.client.get(self.nearby_url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+            self.assertIn('error', response.json())
+
+    def test_nearby_unknown_customer_or_location(self):
+        """Test unknown customers and customers without a location are not found"""
+        response = self.client.get(self.nearby_url, {'email': 'nobody@example.com'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.customer.postal_code = '99999-999'
+        self.customer.save()
+        response = self.client.get(self.nearby_url, {'email': 'customer@example.com'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
 class HairdresserInfoViewTest(TestCase):
     def setUp(self):
         """Set up test data before each test method."""
@@ -1557,6 +2264,64 @@ class HairdresserInfoViewTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response['Content-Type'], 'application/json')
 
+    def create_similar_catalogue(self):
+        coloracao = Preferences.objects.create(name='Coloração')
+        cachos = Preferences.objects.create(name='Cachos')
+        self.hairdresser_user.preferences.add(coloracao, cachos)
+        self.hairdresser_user_2.preferences.add(coloracao)
+        Service.objects.create(name='Corte', price=50, duration=30, hairdresser=self.hairdresser)
+        Service.objects.create(name='Corte', price=60, duration=30, hairdresser=self.hairdresser_2)
+
+        self.others = []
+        for i, neighborhood in enumerate(['Downtown', 'Uptown', 'Downtown']):
+            user = User.objects.create(
+                email=f'similar{i}@test.com', first_name=f'Similar{i}', phone=f'55920000{i:04d}',
+                neighborhood=neighborhood, postal_code='69000000', role='hairdresser',
+            )
+            hairdresser = Hairdresser.objects.create(user=user, cnpj='00000000000000')
+            user.preferences.add(cachos)
+            self.others.append(hairdresser)
+        return coloracao, cachos
+
+    def stored_neighbours(self):
+        return sorted(SimilarHairdresser.objects.values_list('hairdresser_id', 'rank', 'similar_id', 'score'))
+
+    def test_get_hairdresser_info_similar(self):
+        self.create_similar_catalogue()
+        self.assertEqual(refresh_similar_hairdressers(), (5, 5))
+
+        url = reverse('hairdresser_info', kwargs={'hairdresser_id': self.hairdresser.id})
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+
+        similar = response.json()['similar']
+        # Shares a preference and a service beats sharing a preference and the neighborhood
+        self.assertEqual(
+            [hairdresser['id'] for hairdresser in similar],
+            [self.hairdresser_2.id, self.others[0].id, self.others[2].id, self.others[1].id],
+        )
+        self.assertEqual([hairdresser['score'] for hairdresser in similar], sorted((hairdresser['score'] for hairdresser in similar), reverse=True))
+
+    def test_similar_hairdressers_refresh_only_changed(self):
+        coloracao, cachos = self.create_similar_catalogue()
+        refresh_similar_hairdressers()
+        self.assertEqual(refresh_similar_hairdressers(), (0, 5))
+
+        # Only the hairdresser and the lists it enters or leaves are recomputed
+        self.hairdresser_user_2.preferences.add(cachos)
+        refreshed, _ = refresh_similar_hairdressers()
+        self.assertGreaterEqual(refreshed, 1)
+        incremental = self.stored_neighbours()
+        refresh_similar_hairdressers(full=True)
+        self.assertEqual(incremental, self.stored_neighbours())
+
+        # Every list it was in loses the deleted hairdresser
+        self.others[0].delete()
+        self.assertEqual(refresh_similar_hairdressers(), (4, 4))
+        incremental = self.stored_neighbours()
+        refresh_similar_hairdressers(full=True)
+        self.assertEqual(incremental, self.stored_neighbours())
+
     def test_post_method_not_allowed(self):
         """Test that POST method is not allowed."""
         url = reverse('hairdresser_info', kwargs={'hairdresser_id': self.hairdresser.id})
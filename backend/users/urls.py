@@ -4,6 +4,8 @@ from .views import (
     LoginView, 
     LogoutView, 
     GlobalSearchView,
+    NearbyHairdressersView,
+    SearchSuggestionView,
     UserInfoCookieView, 
     UserInfoView, 
     ChangePasswordView, 
@@ -19,6 +21,8 @@ urlpatterns = [
     path('auth/change-password', ChangePasswordView.as_view(), name='password_change'),
     path('auth/logout', LogoutView.as_view(), name='logout'),
     path('user/search', GlobalSearchView.as_view(), name='global_search'), 
+    path('user/search/suggest', SearchSuggestionView.as_view(), name='search_suggest'),
+    path('user/search/nearby', NearbyHairdressersView.as_view(), name='nearby_search'),
     path('user/authenticated', UserInfoCookieView.as_view(), name='user_info_auth'),
     path('user/<str:email>', UserInfoView.as_view(), name='user_info'),
     path('customer/home', CustomerHomeView.as_view(), name='customer_home_info'),
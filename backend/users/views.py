@@ -1,24 +1,37 @@
 from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .models import User, Customer, Hairdresser
+from .models import User, Customer, Hairdresser, SimilarHairdresser
 from preferences.models import Preferences
+import base64
 import json
 import bcrypt
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, Count
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models import Q, Count, Exists, OuterRef, Value
 import jwt, datetime
-from .serializers import UserSerializer, CustomerSerializer, HairdresserSerializer, HairdresserFullInfoSerializer
+from .serializers import UserSerializer, CustomerSerializer, HairdresserSerializer, HairdresserFullInfoSerializer, SimilarHairdresserSerializer
 from hairmatch.ai_clients.gemini_client import hairdresser_profile_ai_completion
-from .filters import HairdresserFilter
 from .serializers import SearchResultSerializer # Import our new serializer
 from .filters import HairdresserFilter
+from . import facets, for_you, home_feed, search_index
+from .suggest import MAX_SUGGESTIONS
+from .search import match_hairdresser_names
+from .geo import nearby_hairdressers
 from service.models import Service
-from itertools import chain
+from reserve.models import CustomerRecommendation
 from rest_framework.parsers import MultiPartParser, FormParser
 from preferences.models import Preferences
 
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+SUGGESTION_PAGE_SIZE = 8
+NEARBY_RADIUS_KM = 10
+MAX_NEARBY_RADIUS_KM = 100
+FOR_YOU_PAGE_SIZE = 20
+MAX_FOR_YOU_PAGE_SIZE = 100
+
 # In this file, there are 3 types of views:
 # 1 - authentication views
 # 2 - user accessible views - cookie managed
@@ -298,6 +311,50 @@ class UserInfoCookieView(APIView):
 # Those views works WITHOUT the presence of cookies in the request
 # Those views should only be used by admin personal or internal functions
 
+def encode_search_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def decode_search_cursor(cursor):
+    """
+    Position of the last result of the previous page, as returned by
+    search_index.ranked_page. Raises ValueError on tampered cursors.
+    """
+    if not cursor:
+        return None
+    try:
+        negative_score, type_rank, result_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (float(negative_score), int(type_rank), int(result_id))
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError('Invalid cursor')
+
+def decode_for_you_cursor(cursor):
+    """
+    (score, hairdresser id) of the last hairdresser of the previous "for you"
+    page. Raises ValueError on tampered cursors.
+    """
+    if not cursor:
+        return None
+    try:
+        score, hairdresser_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (float(score), int(hairdresser_id))
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError('Invalid cursor')
+
+def with_any_preference(hairdressers, preferences):
+    """
+    Hairdressers of the queryset whose user has at least one of the preferences
+    (ids or a Preferences queryset), without the duplicates of a join.
+    """
+    return hairdressers.filter(Exists(
+        Preferences.users.through.objects.filter(user_id=OuterRef('user_id'), preferences_id__in=preferences)
+    ))
+
+def parse_coordinate(value, bound):
+    coordinate = float(value)
+    if not -bound <= coordinate <= bound:
+        raise ValueError('Coordinate out of range')
+    return coordinate
+
 class GlobalSearchView(APIView):
     def get(self, request):
         query = request.query_params.get('search', None)
@@ -305,17 +362,157 @@ class GlobalSearchView(APIView):
         if not query:
             return Response([], status=200)
 
-        hairdresser_queryset = Hairdresser.objects.all()
-        hairdresser_filter = HairdresserFilter({'search': query}, queryset=hairdresser_queryset)
-        hairdresser_results = hairdresser_filter.qs
+        try:
+            limit = int(request.query_params.get('limit', SEARCH_PAGE_SIZE))
+            after = decode_search_cursor(request.query_params.get('cursor'))
+        except ValueError:
+            return JsonResponse({'error': 'Invalid limit or cursor'}, status=400)
+        try:
+            selections = facets.parse_selections(request.query_params)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid facet selection'}, status=400)
+        if not 1 <= limit <= MAX_SEARCH_PAGE_SIZE:
+            return JsonResponse({'error': f'limit must be between 1 and {MAX_SEARCH_PAGE_SIZE}'}, status=400)
+
+        # Matches and their scores come from the in-memory index, the database
+        # is only read to serialize the page, with one query per result type
+        scores = search_index.get_index().scores(query)
+        if not scores[search_index.HAIRDRESSER_RESULT]:
+            # The index only folds accents, words in other inflections
+            # ("coloração" for "colorações") only match the stemmed document
+            hairdresser_filter = HairdresserFilter({'search': query}, queryset=Hairdresser.objects.only('id'))
+            scores[search_index.HAIRDRESSER_RESULT] = {
+                hairdresser.id: hairdresser.search_rank for hairdresser in hairdresser_filter.qs
+            }
+        if not scores[search_index.HAIRDRESSER_RESULT]:
+            # Names typed with typos or in full only match fuzzily
+            scores[search_index.HAIRDRESSER_RESULT] = {
+                hairdresser.id: hairdresser.name_score
+                for hairdresser in match_hairdresser_names(Hairdresser.objects.only('id'), query)
+            }
+
+        # Facet counts are only sent with the first page, later pages only need
+        # the results left by the selections
+        facet_counts = None
+        if selections or after is None:
+            hairdresser_window, service_window = facets.candidate_window(scores)
+            facet_counts, selected = facets.count_facets(
+                hairdresser_window, service_window, selections, list_results=bool(selections),
+            )
+            if selected is not None:
+                scores = {
+                    result_type: {result_id: score for result_id, score in type_scores.items() if result_id in selected[result_type]}
+                    for result_type, type_scores in scores.items()
+                }
+            if after is not None:
+                facet_counts = None
+
+        page = search_index.ranked_page(scores, limit + 1, after)
+        next_cursor = encode_search_cursor(page[limit - 1]) if len(page) > limit else None
+        page = page[:limit]
+
+        querysets = {
+            search_index.HAIRDRESSER_RESULT: Hairdresser.objects.select_related('user'),
+            search_index.SERVICE_RESULT: Service.objects.select_related('hairdresser__user'),
+        }
+        objects = {}
+        for type_rank, result_type in enumerate(search_index.RESULT_TYPES):
+            ids = [result_id for _, rank, result_id in page if rank == type_rank]
+            objects[type_rank] = querysets[result_type].in_bulk(ids) if ids else {}
+
+        results = []
+        for negative_score, type_rank, result_id in page:
+            instance = objects[type_rank].get(result_id)
+            if instance is not None:
+                data = SearchResultSerializer(instance, context={'request': request}).data
+                data['score'] = round(-negative_score, 4)
+                results.append(data)
+
+        counts = {result_type: len(type_scores) for result_type, type_scores in scores.items()}
+        return JsonResponse({'data': results, 'counts': counts, 'facets': facet_counts, 'next_cursor': next_cursor}, status=200)
+
+class SearchSuggestionView(APIView):
+    """
+    Autocomplete of the search box: the most booked hairdresser names, service
+    names, neighborhoods and preferences starting with the typed text, answered
+    from memory without touching the database.
+    """
 
-        service_results = Service.objects.filter(
-            Q(name__icontains=query)
-        ) 
-        combined_results = list(chain(hairdresser_results, service_results))
-        serializer = SearchResultSerializer(combined_results, many=True, context={'request': request})
+    def get(self, request):
+        query = request.query_params.get('search', '')
+        try:
+            limit = int(request.query_params.get('limit', SUGGESTION_PAGE_SIZE))
+        except ValueError:
+            return JsonResponse({'error': 'Invalid limit'}, status=400)
+        if not 1 <= limit <= MAX_SUGGESTIONS:
+            return JsonResponse({'error': f'limit must be between 1 and {MAX_SUGGESTIONS}'}, status=400)
+
+        suggestions = search_index.get_index().suggestions.suggest(query, limit)
+        data = [
+            {
+                'type': suggestion_type,
+                'label': label,
+                # Service names and neighborhoods group several rows
+                'id': ref if isinstance(ref, int) else None,
+                'popularity': popularity,
+            }
+            for suggestion_type, ref, label, popularity in suggestions
+        ]
+        return JsonResponse({'data': data}, status=200)
 
-        return JsonResponse({'data':serializer.data}, status=200)
+class NearbyHairdressersView(APIView):
+    """
+    Hairdressers within `radius_km` of a point, closest first. The point is
+    given as `lat` and `lon` or is the location of the customer of `email`.
+    The results can be narrowed to the `preferences` ids (comma separated) or,
+    with `for_you=true`, to the preferences of that customer.
+    """
+
+    def get(self, request):
+        email = request.query_params.get('email')
+        customer = None
+        if email:
+            customer = User.objects.filter(email=email, role='customer').first()
+            if customer is None:
+                return JsonResponse({'error': 'User not found'}, status=404)
+
+        try:
+            if request.query_params.get('lat') is not None or request.query_params.get('lon') is not None:
+                latitude = parse_coordinate(request.query_params.get('lat'), 90)
+                longitude = parse_coordinate(request.query_params.get('lon'), 180)
+            elif customer is not None:
+                latitude, longitude = customer.latitude, customer.longitude
+            else:
+                return JsonResponse({'error': 'lat and lon or email are required'}, status=400)
+            radius_km = float(request.query_params.get('radius_km', NEARBY_RADIUS_KM))
+            limit = int(request.query_params.get('limit', SEARCH_PAGE_SIZE))
+            preference_ids = [int(id) for id in request.query_params.get('preferences', '').split(',') if id.strip()]
+        except (TypeError, ValueError):
+            return JsonResponse({'error': 'Invalid coordinates, radius, limit or preferences'}, status=400)
+
+        if latitude is None or longitude is None:
+            return JsonResponse({'error': 'The location of this user is unknown'}, status=404)
+        if not 0 < radius_km <= MAX_NEARBY_RADIUS_KM:
+            return JsonResponse({'error': f'radius_km must be between 0 and {MAX_NEARBY_RADIUS_KM}'}, status=400)
+        if not 1 <= limit <= MAX_SEARCH_PAGE_SIZE:
+            return JsonResponse({'error': f'limit must be between 1 and {MAX_SEARCH_PAGE_SIZE}'}, status=400)
+
+        hairdressers = Hairdresser.objects.select_related('user').filter(user__is_active=True)
+        if request.query_params.get('for_you') == 'true':
+            if customer is None:
+                return JsonResponse({'error': 'for_you requires the email of a customer'}, status=400)
+            hairdressers = with_any_preference(hairdressers, customer.preferences.all())
+        if preference_ids:
+            hairdressers = with_any_preference(hairdressers, preference_ids)
+
+        results = []
+        for hairdresser in nearby_hairdressers(hairdressers, latitude, longitude, radius_km)[:limit]:
+            data = HairdresserSerializer(hairdresser).data
+            data['distance_km'] = round(hairdresser.distance_km, 2)
+            results.append(data)
+
+        origin = {'latitude': latitude, 'longitude': longitude, 'radius_km': radius_km}
+        return JsonResponse({'data': results, 'origin': origin}, status=200)
 
 class UserInfoView(APIView):
     def get(self,request,email=None):
@@ -361,54 +558,73 @@ class LogoutView(APIView):
 class CustomerHomeView(APIView):
     """
     API view for customer home page that returns:
-    1. Hairdressers matching customer preferences in 'for_you' object
-    2. 10 hairdressers for each of the specified preference categories
+    1. Hairdressers matching customer preferences in 'for_you' object, a page
+       ranked by users.for_you (limit and cursor parameters)
+    2. Hairdressers recommended from the customer's booking history in
+       'recommended' (reserve.recommendations)
+    3. 10 hairdressers for each of the preference categories configured in
+       settings.HOME_FEED_RAILS, read from the precomputed snapshot (users.home_feed)
+    4. The 10 trending ("em alta") hairdressers in 'trending', from the same
+       snapshot (reserve.trending)
     """
     
     def get(self, request, email=None):
         for_you_data = []
+        next_cursor = None
+        recommended_data = []
         if email:
             try:
-                customer_user = User.objects.get(email=email, role='customer')
-            except User.DoesNotExist:
+                limit = int(request.query_params.get('limit', FOR_YOU_PAGE_SIZE))
+                after = decode_for_you_cursor(request.query_params.get('cursor'))
+            except ValueError:
+                return JsonResponse({'error': 'Invalid limit or cursor'}, status=400)
+            if not 1 <= limit <= MAX_FOR_YOU_PAGE_SIZE:
+                return JsonResponse({'error': f'limit must be between 1 and {MAX_FOR_YOU_PAGE_SIZE}'}, status=400)
+
+            customer = (
+                User.objects
+                .filter(email=email, role='customer')
+                .annotate(preference_ids=ArrayAgg('preferences', filter=Q(preferences__isnull=False), default=Value([])))
+                .values_list('neighborhood', 'preference_ids')
+                .first()
+            )
+            if customer is None:
                 return JsonResponse({'error': 'User not found'}, status=404)
-            customer_preferences = customer_user.preferences.all()
-            
-            # Get hairdressers matching customer preferences
-            hairdressers_users = User.objects.filter(
-                role='hairdresser',
-                preferences__in=customer_preferences
-            ).distinct()
+            neighborhood, preference_ids = customer
+
+            # Hairdressers matching customer preferences, best scored first
+            page = for_you.get_matrix().ranked_page(preference_ids, neighborhood, limit + 1, after) if preference_ids else []
+            hairdressers = Hairdresser.objects.select_related('user').in_bulk([hairdresser_id for _, hairdresser_id in page[:limit]])
+            ranked = [(score, hairdressers[hairdresser_id]) for score, hairdresser_id in page[:limit] if hairdresser_id in hairdressers]
+            for_you_data = [
+                {**hairdresser, 'score': round(score, 4)}
+                for (score, _), hairdresser in zip(ranked, HairdresserSerializer([hairdresser for _, hairdresser in ranked], many=True).data)
+            ]
+            next_cursor = encode_search_cursor(page[limit - 1]) if len(page) > limit else None
+
+            # Booked by customers with the same bookings, stored by the recommend_hairdressers command
+            recommended = list(
+                CustomerRecommendation.objects
+                .filter(customer__user__email=email)
+                .select_related('hairdresser__user')
+                .order_by('rank')
+            )
+            recommended_data = [
+                {**hairdresser, 'score': round(recommendation.score, 4)}
+                for recommendation, hairdresser in zip(
+                    recommended, HairdresserSerializer([recommendation.hairdresser for recommendation in recommended], many=True).data,
+                )
+            ]
 
-            hairdressers_for_you = Hairdresser.objects.filter(user__in=hairdressers_users)
-            
-            # Prepare data for for_you response
-            for_you_data = HairdresserSerializer(hairdressers_for_you, many=True).data
-        
-        # Get hairdressers for specific preferences
-        specific_preferences = ["Coloração", "Cachos", "Barbearia", "Tranças"]
-        formated_preferences_name=["coloracao", "cachos", "barbearia", "trancas"]
-        preference_hairdressers = {}
-        
-        for i in range(len(specific_preferences)):
-            try:
-                preference = Preferences.objects.get(name=specific_preferences[i])
-                hairdressers_users = User.objects.filter(
-                    role='hairdresser',
-                    preferences=preference
-                ).distinct()[:10]
-                
-                hairdressers_per_preference = Hairdresser.objects.filter(user__in=hairdressers_users)
-                hairdressers_data = HairdresserSerializer(hairdressers_per_preference, many=True).data
-                
-                preference_hairdressers[formated_preferences_name[i]] = hairdressers_data
-            except Preferences.DoesNotExist:
-                preference_hairdressers[formated_preferences_name[i]] = []
-        
         # Prepare the final response
+        snapshot = home_feed.get_snapshot()
         response_data = {
             'for_you': for_you_data,
-            'hairdressers_by_preferences': preference_hairdressers
+            'for_you_next_cursor': next_cursor,
+            'recommended': recommended_data,
+            # Snapshots stored before the "em alta" rail have none
+            'trending': snapshot.get('trending', []),
+            'hairdressers_by_preferences': snapshot['rails']
         }     
         return JsonResponse(response_data, status=200)
     
@@ -421,9 +637,17 @@ class GeminiChatView(APIView):
 class HairdresserInfoView(APIView):
     def get(self,request,hairdresser_id=None): 
         try:
-            hairdresser = Hairdresser.objects.get(id=hairdresser_id)
+            hairdresser = Hairdresser.objects.select_related('user').get(id=hairdresser_id)
         except Hairdresser.DoesNotExist:
             return JsonResponse({'error': 'Hairdresser not found'}, status=404)
 
         hairdresser_serialized = HairdresserSerializer(hairdresser).data
-        return JsonResponse({'data': hairdresser_serialized}, status=200)
\ No newline at end of file
+        # "Profissionais parecidos", precomputed by the refresh_similar_hairdressers command
+        similar = (
+            SimilarHairdresser.objects
+            .filter(hairdresser=hairdresser)
+            .select_related('similar__user')
+            .order_by('rank')
+        )
+        similar_serialized = SimilarHairdresserSerializer(similar, many=True).data
+        return JsonResponse({'data': hairdresser_serialized, 'similar': similar_serialized}, status=200)
\ No newline at end of file